@@ -12,25 +12,40 @@ from control_msgs.msg import FollowJointTrajectoryActionResult
 from gauss_commander.move_group_arm import MoveGroupArm
 from gauss_commander.robot_commander_exception import RobotCommanderException
 from gauss_commander.command_status import CommandStatus
+from execution_monitor import ExecutionMonitor
 
 TrajectoryTimeOutMin = 20
 class ArmCommander:
 
 
-    def execute_plan(self, plan , wait=False):
+    # feedback_callback : called during execution with the trajectory tracker and current joints
+    def execute_plan(self, plan , wait=False, feedback_callback=None):
         if plan:
             # reset event
 
             self.traj_finished_event.clear()
             self.current_goal_id = None
             self.current_goal_result = GoalStatus.LOST
+            self.execution_failure = None
             # send traj and wait 
             self.move_group_arm.execute(plan, wait=False)
+            self.execution_monitor.start(plan, feedback_callback, self.callback_execution_failure)
             trajectory_time_out = 1.5 * self.get_plan_time(plan)
             # if trajectory_time_out is less than to seconds, the default value will be 2 seconds 
             if trajectory_time_out < TrajectoryTimeOutMin : 
                 trajectory_time_out = TrajectoryTimeOutMin 
-            if self.traj_finished_event.wait(trajectory_time_out):
+            finished = self.traj_finished_event.wait(trajectory_time_out)
+            self.execution_monitor.stop()
+
+            # Stalled or deviating robot : stop now, don't wait for the controller
+            if self.execution_failure is not None and self.current_goal_result != GoalStatus.SUCCEEDED:
+                plan = None
+                self.stop_current_plan()
+                self.set_position_hold_mode()
+                self.gauss_ros_logger.publish_log_status("WARNING", "ArmCommander Execution failed : " + self.execution_failure)
+                return CommandStatus.CONTROLLER_PROBLEMS, "Execution failed : " + self.execution_failure
+
+            if finished:
                 plan = None
 
                 if self.current_goal_result == GoalStatus.SUCCEEDED:
@@ -119,6 +134,10 @@ class ArmCommander:
         self.current_goal_id = msg.goal_id.id
         rospy.loginfo("Arm commander - Got a goal id : " + str(self.current_goal_id))
 
+    def callback_execution_failure(self, message):
+        self.execution_failure = message
+        self.traj_finished_event.set()
+
     def callback_goal_result(self, msg):
         if msg.status.goal_id.id == self.current_goal_id:
             #rospy.loginfo("Receive result, goal_id matches.")
@@ -134,7 +153,9 @@ class ArmCommander:
         self.traj_finished_event = threading.Event()
         self.current_goal_id = None
         self.current_goal_result = GoalStatus.LOST
+        self.execution_failure = None
         self.gauss_ros_logger = logger 
+        self.execution_monitor = ExecutionMonitor()
 
         rospy.Subscriber('/gauss_follow_joint_trajectory_controller/follow_joint_trajectory/goal',
                 FollowJointTrajectoryActionGoal, self.callback_current_goal)
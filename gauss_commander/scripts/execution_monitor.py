@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+import rospy
+import threading
+
+from gauss_commander.motion.trajectory_analysis import get_trajectory_arrays
+from gauss_commander.motion.trajectory_tracking import TrajectoryTracker
+
+from sensor_msgs.msg import JointState
+
+"""
+Follow the trajectory being executed with /joint_states
+- feedback callback is called with the tracker and measured joints, at most
+  at feedback_rate
+- failure callback is called once, with a message, if the robot stalls or
+  deviates from the planned path, only if ~execution_monitor_abort is set
+"""
+
+class ExecutionMonitor:
+
+    def __init__(self):
+        # Feedback is always sent, aborting the execution is opt in
+        self.abort_enabled = rospy.get_param("~execution_monitor_abort", False)
+        self.max_lag = rospy.get_param("~execution_monitor_max_lag", 0.5)
+        self.max_deviation = rospy.get_param("~execution_monitor_max_deviation", 0.1)
+        self.deviation_samples = rospy.get_param("~execution_monitor_deviation_samples", 3)
+        self.feedback_period = 1.0 / rospy.get_param("~execution_monitor_feedback_rate", 10.0)
+
+        self.lock = threading.Lock()
+        self.tracker = None
+        self.joint_names = []
+        self.start_time = 0.0
+        self.last_feedback_time = 0.0
+        self.feedback_callback = None
+        self.failure_callback = None
+
+        self.joint_states_subscriber = rospy.Subscriber(
+                '/joint_states', JointState, self.callback_joint_states)
+
+    def start(self, plan, feedback_callback, failure_callback):
+        joint_trajectory = plan.joint_trajectory
+        if len(joint_trajectory.points) < 2:
+            return
+        if feedback_callback is None and not self.abort_enabled:
+            return # nothing to do with tracking
+        times, positions = get_trajectory_arrays(joint_trajectory)[0:2]
+        with self.lock:
+            self.tracker = TrajectoryTracker(times, positions,
+                    self.max_lag, self.max_deviation, self.deviation_samples)
+            self.joint_names = list(joint_trajectory.joint_names)
+            self.start_time = rospy.get_time()
+            self.last_feedback_time = 0.0
+            self.feedback_callback = feedback_callback
+            self.failure_callback = failure_callback
+
+    def stop(self):
+        with self.lock:
+            self.tracker = None
+
+    def callback_joint_states(self, msg):
+        with self.lock:
+            tracker = self.tracker
+            if tracker is None:
+                return
+            try:
+                joints = [msg.position[msg.name.index(name)] for name in self.joint_names]
+            except ValueError:
+                return # joint_states from another group (tools)
+
+            now = rospy.get_time()
+            failure = tracker.update(now - self.start_time, joints)
+            if not self.abort_enabled:
+                failure = None
+            if failure is not None:
+                self.tracker = None
+            send_feedback = failure is None and now - self.last_feedback_time >= self.feedback_period
+            if send_feedback:
+                self.last_feedback_time = now
+            feedback_callback = self.feedback_callback
+            failure_callback = self.failure_callback
+
+        if failure is not None:
+            rospy.logwarn("Execution monitor - " + failure)
+            failure_callback(failure)
+        elif send_feedback and feedback_callback is not None:
+            feedback_callback(tracker, joints)
@@ -7,6 +7,7 @@ from gauss_robot_state_publisher import GaussRobotStatePublisher
 from robot_commander import RobotCommander 
 
 from gauss_commander.gauss_ros_logger import RosLogger
+from gauss_commander.database import Database
 
 class GaussCommanderNode(): 
 
@@ -20,12 +21,16 @@ class GaussCommanderNode():
 
         self.simulator_mode = rospy.get_param("~simulator_mode")
 
+        # Optional SQLite storage, positions and trajectories dirs are migrated into it
+        database_path = rospy.get_param("~database_path", "")
+        self.database = Database(database_path) if database_path else None
+
         # Position Manager  
         positions_dir = rospy.get_param("~positions_dir")
-        self.pos_manager = PositionManager(positions_dir, self.gauss_ros_logger)
+        self.pos_manager = PositionManager(positions_dir, self.gauss_ros_logger, self.database)
         #trajectory_manager 
         trajectories_dir = rospy.get_param("~trajectories_dir")
-        self.traj_manager = TrajectoryManager(trajectories_dir, self.gauss_ros_logger)
+        self.traj_manager = TrajectoryManager(trajectories_dir, self.gauss_ros_logger, self.database)
         # robot commander 
         self.robot_commander = RobotCommander(self.simulator_mode, self.pos_manager, self.traj_manager, self.gauss_ros_logger)
         self.robot_commander.start()
@@ -1,11 +1,11 @@
 #!/usr/bin/env python
 
 import rospy
-import tf
-from gauss_commander.moveit_utils import get_rpy_from_quaternion
+from gauss_commander.kinematics.forward_kinematics import solve_fk
 from tf.transformations import quaternion_from_euler
 
 from std_msgs.msg import Float64
+from sensor_msgs.msg import JointState
 from gauss_msgs.msg import RobotState
 from geometry_msgs.msg import Quaternion
 
@@ -22,17 +22,19 @@ class GaussRobotStatePublisher:
         orientation.w = quaternion[3]
         return orientation
 
-    def get_robot_pose(self, event):
+    def callback_joint_states(self, msg):
         try:
-            (pos, rot) = self.tf_listener.lookupTransform('base_link', 'flange', rospy.Time(0))  
-            self.position = pos
-            # self.rpy = get_rpy_from_quaternion(rot)
-            (roll, pitch, yaw) = tf.transformations.euler_from_quaternion(rot)
-            self.rpy[0] = roll
-            self.rpy[1] = pitch
-            self.rpy[2] = yaw
-        except (tf.LookupException, tf.ConnectivityException, tf.ExtrapolationException):
-            rospy.loginfo("catnot get robot pose, TF fail")
+            self.joints = [msg.position[msg.name.index(name)] for name in self.joint_names]
+        except ValueError:
+            pass # joint_states from another group (tools)
+
+    def get_robot_pose(self, event):
+        if self.joints is None:
+            rospy.loginfo("cannot get robot pose, no joint states received yet")
+            return
+        (points, rpy, quaternions) = solve_fk([self.joints])
+        self.position = points[0].tolist()
+        self.rpy = rpy[0].tolist()
 
     def publish_state(self, event):
         msg = RobotState()
@@ -46,10 +48,13 @@ class GaussRobotStatePublisher:
 
     def __init__(self):
             
-        # Tf listener (position + rpy) of end effector tool
+        # Forward kinematics (position + rpy) of end effector tool
         self.position = [0,0,0]
         self.rpy = [0,0,0]
-        self.tf_listener = tf.TransformListener()
+        self.joint_names = ['joint1', 'joint2', 'joint3', 'joint4', 'joint5', 'joint6']
+        self.joints = None
+        self.joint_states_subscriber = rospy.Subscriber(
+                '/joint_states', JointState, self.callback_joint_states)
 
         # State publisher
         self.gauss_robot_state_publisher = rospy.Publisher(
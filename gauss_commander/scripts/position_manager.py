@@ -4,6 +4,8 @@ import rospy
 from gauss_commander.position.position  import Position 
 from gauss_commander.gauss_file_exception import GaussFileException
 from gauss_commander.position.position_file_handler import PositionFileHandler
+from gauss_commander.position.position_database_handler import PositionDatabaseHandler
+from gauss_commander.position.position_repository import PositionRepository
 from gauss_commander.position.position_command_type import PositionCommandType
 from gauss_commander.robot_commander_exception import RobotCommanderException
 from gauss_commander.parameters_validation import ParametersValidation
@@ -19,8 +21,14 @@ from geometry_msgs.msg import Quaternion
 
 class PositionManager:
    
-    def __init__(self, position_dir, logger):
-        self.fh = PositionFileHandler(position_dir)
+    # database : gauss_commander.database.Database, positions are stored in
+    # position_dir files if None
+    def __init__(self, position_dir, logger, database=None):
+        if database is not None:
+            self.fh = PositionDatabaseHandler(database, position_dir)
+        else:
+            self.fh = PositionFileHandler(position_dir)
+        self.positions = PositionRepository(self.fh)
         self.manage_position_server = rospy.Service('/gauss/position/manage_position', ManagePosition, self.callback_manage_position)
         rospy.loginfo("service manage position created") 
         
@@ -31,6 +39,15 @@ class PositionManager:
         self.validation = rospy.get_param("/gauss/robot_command_validation")
         self.parameters_validation = ParametersValidation(self.validation)
         self.gauss_ros_logger = logger
+        # Called with (position_name, cmd_type) after each successful change
+        self.position_change_callbacks = []
+
+    def add_position_change_callback(self, callback):
+        self.position_change_callbacks.append(callback)
+
+    def notify_position_change(self, position_name, cmd_type):
+        for callback in self.position_change_callbacks:
+            callback(position_name, cmd_type)
     
     def create_position_response(self, status, message, position=None):
         position_msg = PositionMessage()
@@ -69,6 +86,7 @@ class PositionManager:
             new_position = self.get_position(new_position_name)
             if new_position == None :
                 return self.create_position_response(400, "Failed to create new position")
+            self.notify_position_change(new_position_name, cmd_type)
             return self.create_position_response(200, msg , new_position)
     
         # UPDATE existing sequence
@@ -79,6 +97,7 @@ class PositionManager:
             (success, update_msg) = self.update_position(pos, position_data)
             if not success:
                 return self.create_position_response(400, update_msg)
+            self.notify_position_change(position_name, cmd_type)
             return self.create_position_response(200, update_msg, pos)
     
         # DELETE sequence
@@ -86,6 +105,7 @@ class PositionManager:
             success = self.delete_position(position_name)
             if not success:
                 return self.create_position_response(400, "Could not delete position with name : " + position_name)
+            self.notify_position_change(position_name, cmd_type)
             return self.create_position_response(200, "Position has been deleted")
         
         # Wrong cmd_type 
@@ -94,7 +114,7 @@ class PositionManager:
     
     def delete_position(self, position_name):
         try:
-            self.fh.remove_position(position_name)
+            self.positions.remove(position_name)
         except GaussFileException as e:
             return False
         return True
@@ -108,19 +128,16 @@ class PositionManager:
         position.joints = position_data.joints
         (position.point, position.rpy, position.quaternion) = get_forward_kinematic(position.joints)                     
         try:
-            self.fh.write_position(position)
+            self.positions.write(position)
         except GaussFileException as e:
             return False , "Could not update position : " + str(e)
         return True , "Position has been updated"
 
     def get_position(self, position_name):
-        try:	
-            return self.fh.read_position(position_name)
-        except GaussFileException as e:
-            return None
+        return self.positions.get(position_name)
 
     def create_new_position(self, position) :     
-        if self.fh.check_position_name(position.name) == False : 
+        if self.positions.contains(position.name) : 
             return None, "Failed to create new position : position " + str(position.name) + " already exists"
         try:
             self.parameters_validation.validate_joints(position.joints)
@@ -129,7 +146,7 @@ class PositionManager:
             return None, "Failed to create new position : " + str(e.message)
         try:   
             (position.point, position.rpy, position.quaternion) = get_forward_kinematic(position.joints)    
-            self.fh.write_position(position)
+            self.positions.create(position)
             return position.name, "Position has been created"
         except  GaussFileException as e:
             return None, "Failed to create new position : "+ str(e) 
@@ -149,17 +166,7 @@ class PositionManager:
         return { 'positions': msg_list }
 
     def get_all_positions(self):
-        filenames = self.fh.get_all_filenames()
-        position_list = []
-        for f in filenames:
-            try:
-                position_name = self.fh.position_name_from_filename(f)
-                pos = self.get_position(position_name)
-                if pos != None:
-                    position_list.append(pos)
-            except GaussFileException as e:
-                pass
-        return position_list
+        return self.positions.get_all()
 
 
 if __name__ == '__main__':
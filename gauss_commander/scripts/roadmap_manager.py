@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+import rospy
+import os
+import threading
+import Queue
+
+from gauss_commander.position.position_command_type import PositionCommandType
+from gauss_commander.robot_commander_exception import RobotCommanderException
+from gauss_commander.motion.roadmap import Roadmap, RoadmapEdge
+from gauss_commander.motion.trajectory_analysis import TrajectoryAnalysis
+from gauss_commander.motion.joint_interpolation import create_robot_trajectory
+
+from gauss_msgs.srv import BuildRoadmap
+
+"""
+Trajectories between saved positions, planned in background.
+- build_roadmap service plans every pair of (a subset of) saved positions
+- when a position changes, only the edges going from/to it are planned again
+"""
+
+class RoadmapManager:
+
+    def __init__(self, position_manager, move_group_arm, parameters_validation, logger):
+        self.pos_manager = position_manager
+        self.move_group_arm = move_group_arm
+        self.parameters_validation = parameters_validation
+        self.gauss_ros_logger = logger
+
+        roadmap_dir = rospy.get_param("~roadmap_dir", "")
+        roadmap_file = None
+        if roadmap_dir:
+            roadmap_file = os.path.join(os.path.expanduser(roadmap_dir), 'roadmap.npz')
+        self.roadmap = Roadmap(roadmap_file)
+        # Saved positions in the roadmap, all of them if empty
+        self.position_names = rospy.get_param("~roadmap_positions", [])
+        # Only keep an existing roadmap up to date
+        self.active = len(self.roadmap.edges) > 0
+
+        self.jobs = Queue.Queue()
+        self.pending_jobs = set()
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(name="roadmap_worker", target=self.process_jobs)
+        self.worker.daemon = True
+        self.worker.start()
+
+        self.pos_manager.add_position_change_callback(self.callback_position_change)
+        self.build_roadmap_server = rospy.Service(
+                'gauss/commander/build_roadmap', BuildRoadmap, self.callback_build_roadmap)
+
+    def get_roadmap_position_names(self):
+        names = [pos.name for pos in self.pos_manager.get_all_positions()]
+        if self.position_names:
+            names = [name for name in names if name in self.position_names]
+        return names
+
+    def add_job(self, from_name, to_name):
+        with self.lock:
+            if (from_name, to_name) in self.pending_jobs:
+                return
+            self.pending_jobs.add((from_name, to_name))
+        self.jobs.put((from_name, to_name))
+
+    def add_node_jobs(self, name, names):
+        for other_name in names:
+            if other_name != name:
+                self.add_job(name, other_name)
+                self.add_job(other_name, name)
+
+    def callback_build_roadmap(self, req):
+        self.position_names = list(req.position_names)
+        names = self.get_roadmap_position_names()
+        if len(names) < 2:
+            return {'status': 400, 'message': "At least 2 saved positions are needed to build a roadmap"}
+        self.active = True
+        # Drop edges of positions no longer in the roadmap
+        for (from_name, to_name) in self.roadmap.edges.keys():
+            if from_name not in names or to_name not in names:
+                self.roadmap.remove_edge(from_name, to_name)
+        for name in names:
+            self.add_node_jobs(name, names)
+        return {'status': 200, 'message': "Roadmap build started : " +
+                str(len(names) * (len(names) - 1)) + " edges to plan"}
+
+    def callback_position_change(self, position_name, cmd_type):
+        if not self.active:
+            return
+        if cmd_type == PositionCommandType.DELETE:
+            self.roadmap.remove_node(position_name)
+            self.roadmap.save()
+            return
+        names = self.get_roadmap_position_names()
+        if position_name in names:
+            self.add_node_jobs(position_name, names)
+
+    def process_jobs(self):
+        while not rospy.is_shutdown():
+            (from_name, to_name) = self.jobs.get()
+            with self.lock:
+                self.pending_jobs.discard((from_name, to_name))
+            try:
+                self.build_edge(from_name, to_name)
+            except Exception as e:
+                rospy.logwarn("Roadmap - could not build edge " + from_name + " -> " + to_name + " : " + str(e))
+            if self.jobs.empty():
+                self.roadmap.save()
+                rospy.loginfo("Roadmap - " + str(len(self.roadmap.edges)) + " edges up to date")
+
+    def build_edge(self, from_name, to_name):
+        # Read positions now, they may have changed since the job was added
+        start = self.pos_manager.get_position(from_name)
+        goal = self.pos_manager.get_position(to_name)
+        if start is None or goal is None:
+            self.roadmap.remove_edge(from_name, to_name)
+            return
+
+        plan = self.move_group_arm.compute_plan_between(start.joints, goal.joints)
+        if plan is None:
+            rospy.logwarn("Roadmap - no stable plan found for edge " + from_name + " -> " + to_name)
+            self.roadmap.remove_edge(from_name, to_name)
+            return
+
+        analysis = TrajectoryAnalysis(plan.joint_trajectory)
+        try:
+            self.parameters_validation.validate_trajectory(None, analysis)
+        except RobotCommanderException as e:
+            rospy.logwarn("Roadmap - invalid trajectory for edge " + from_name + " -> " + to_name + " : " + str(e.message))
+            self.roadmap.remove_edge(from_name, to_name)
+            return
+
+        self.roadmap.joint_names = analysis.joint_names
+        self.roadmap.set_edge(from_name, to_name, RoadmapEdge(start.joints, goal.joints,
+                analysis.times, analysis.positions, analysis.velocities, analysis.accelerations))
+
+    # Precomputed plan to a saved position, if current joints match the
+    # start of one of its edges, else None
+    def get_plan(self, position_name, joint_target, current_joints, tolerance):
+        edge = self.roadmap.find_edge_to(position_name, current_joints, tolerance)
+        if edge is None or not edge.goes_to(joint_target, tolerance):
+            return None
+        return create_robot_trajectory(self.roadmap.joint_names, edge.times,
+                edge.positions, edge.velocities, edge.accelerations)
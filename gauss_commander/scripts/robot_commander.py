@@ -4,6 +4,8 @@ import rospy, sys
 import moveit_commander
 import actionlib
 import threading
+import numpy as np
+from collections import deque, OrderedDict
 # Lib
 from gauss_commander.command_type import CommandType
 from gauss_commander.command_status import CommandStatus
@@ -11,12 +13,14 @@ from gauss_commander.robot_commander_exception import RobotCommanderException
 from gauss_commander.position.position import Position 
 from gauss_commander.position.position_command_type import PositionCommandType
 from position_manager import PositionManager
+from roadmap_manager import RoadmapManager
 # Messages
 from std_msgs.msg import Empty
 from gauss_msgs.msg import RobotMoveCommand
 from gauss_msgs.msg import HardwareStatus
 from std_msgs.msg import Bool
 from std_msgs.msg import String
+from gauss_msgs.msg import CommandMetrics
 
 # Services
 from std_srvs.srv import SetBool
@@ -24,23 +28,78 @@ from gauss_msgs.srv import RobotMove
 from gauss_msgs.srv import ManagePosition 
 from gauss_msgs.srv import GetInt
 from gauss_msgs.srv import SetInt
-from gauss_msgs.srv import CalculateIK
+from gauss_msgs.srv import GetCacheStatistics
+from gauss_msgs.srv import GetCommandLatencies
 # Action msgs
 from gauss_msgs.msg import RobotMoveAction
 from gauss_msgs.msg import RobotMoveGoal
 from gauss_msgs.msg import RobotMoveResult
+from gauss_msgs.msg import RobotMoveFeedback
 # Commanders
 from arm_commander import ArmCommander
 from tool_commander import ToolCommander
 from gauss_commander.move_group_arm import MoveGroupArm
 from gauss_commander.parameters_validation import ParametersValidation
+from gauss_commander.command_metrics import CommandTimer, LatencyStatistics, timed_phase, monotonic
+from gauss_commander.kinematics.inverse_kinematics import solve_ik_branches, select_closest_solutions
+from gauss_commander.kinematics.ik_cache import IKCache
+from gauss_commander.motion.joint_limits import get_joint_limits
+from gauss_commander.motion.joint_interpolation import interpolate_joints, create_robot_trajectory
+from gauss_commander.motion.trajectory_retiming import scale_robot_trajectory, retime_robot_trajectory, retime_path
+from gauss_commander.motion.trajectory_analysis import TrajectoryAnalysis
+from gauss_commander.motion.waypoint_blending import blend_paths
+from gauss_commander.kinematics.kinematics_parameters import get_kinematics_parameters
+from gauss_commander.kinematics.forward_kinematics import solve_fk
 
 # State publisher
 from gauss_robot_state_publisher import GaussRobotStatePublisher
 
 import geometry_msgs
 import tf 
-import copy
+
+# Max distance (m) between a pose target and the FK of its IK solution
+FK_CHECK_TOLERANCE = 0.001
+
+
+class QueuedGoal:
+
+    def __init__(self, goal_handle, timer):
+        self.goal_handle = goal_handle
+        self.cmd = goal_handle.goal.goal.cmd
+        self.timer = timer
+        self.queued_time = monotonic()
+        self.revision = 0
+        self.reset_plan()
+
+    def reset_plan(self):
+        self.revision += 1
+        self.is_planned = False
+        self.has_plan = False
+        self.start_joints = None
+        self.plan = None
+        self.is_timed = False
+        # Predicted joints at the end of this goal, None if unknown
+        self.end_joints = None
+
+    # planned : (plan, is_timed) from compute_plan_from(), or None if
+    # the goal can only be planned when executed
+    def set_plan(self, start_joints, planned):
+        self.is_planned = True
+        if planned is None:
+            return
+        self.has_plan = True
+        self.start_joints = np.asarray(start_joints, dtype=float)
+        self.plan, self.is_timed = planned
+        if self.plan is None:
+            self.end_joints = list(start_joints)
+        else:
+            self.end_joints = list(self.plan.joint_trajectory.points[-1].positions)
+
+    # Goals not moving the arm (tool commands)
+    def set_no_move(self, start_joints):
+        self.is_planned = True
+        self.end_joints = list(start_joints)
+
 """
 This class handles the arm and tools through a service interface 
 - before you execute a command here, you need to validate params
@@ -51,14 +110,102 @@ This class handles the arm and tools through a service interface
 class RobotCommander:
 
     def compute_and_execute_plan(self):
-        plan = self.move_group_arm.compute_plan()
+        with self.time_phase('planning'):
+            plan = self.move_group_arm.compute_plan()
+        self.count_plan_attempts(self.move_group_arm.planning_statistics.get('attempts', 0))
         if not plan : 
             raise RobotCommanderException(
                 CommandStatus.PLAN_FAILED, "Moveit failed to compute the plan.")
 
         self.reset_controller()
         rospy.loginfo("Send Moveit trajectory")
-        return self.arm_commander.execute_plan(plan)
+        return self.execute_plan(self.retime_plan(plan, is_scaled=True))
+
+    # Direct mode : joint space interpolation from current joints,
+    # no Moveit planning (and so no collision checking)
+    def compute_and_execute_direct_plan(self, joint_target):
+        with self.time_phase('planning'):
+            plan = self.compute_direct_plan(self.move_group_arm.get_current_joint_values(), joint_target)
+        if plan is None:
+            return CommandStatus.SUCCESS, "Command has been successfully processed"
+
+        self.reset_controller()
+        rospy.loginfo("Send direct trajectory")
+        return self.execute_plan(plan)
+
+    # None if already at joint target
+    def compute_direct_plan(self, start_joints, joint_target):
+        factor = self.move_group_arm.velocity_scaling_factor
+        interpolation = interpolate_joints(start_joints, joint_target,
+                self.max_velocities * factor, self.max_accelerations * factor**2)
+        if interpolation is None:
+            return None
+        return create_robot_trajectory(self.joint_names, *interpolation)
+
+    # Waypoints : joint paths between consecutive waypoints (Moveit plans, or
+    # straight lines in direct mode) are blended and timed as one trajectory,
+    # so the arm doesn't stop at each waypoint
+    def compute_and_execute_waypoints_plan(self, cmd):
+        with self.time_phase('planning'):
+            plan = self.compute_waypoints_plan(cmd, self.move_group_arm.get_current_joint_values())
+        if plan is None:
+            return CommandStatus.SUCCESS, "Command has been successfully processed"
+
+        self.reset_controller()
+        rospy.loginfo("Send waypoints trajectory")
+        return self.execute_plan(plan)
+
+    # None if all waypoints are at start joints
+    def compute_waypoints_plan(self, cmd, start_joints):
+        waypoints_joints = [start_joints]
+        for i, waypoint in enumerate(cmd.waypoints):
+            if len(waypoint.joints) > 0:
+                joints = list(waypoint.joints)
+            else:
+                joints = self.compute_pose_ik(waypoint.position, waypoint.rpy, waypoints_joints[-1])
+                if joints is None:
+                    raise RobotCommanderException(
+                        CommandStatus.PLAN_FAILED, "No IK solution for waypoint " + str(i))
+            waypoints_joints.append(joints)
+
+        paths = []
+        for start, goal in zip(waypoints_joints[:-1], waypoints_joints[1:]):
+            if self.direct_motion:
+                paths.append([start, goal])
+                continue
+            plan = self.move_group_arm.compute_plan_between(start, goal, check_stability=False)
+            if plan is None:
+                raise RobotCommanderException(
+                    CommandStatus.PLAN_FAILED, "Moveit failed to compute the plan.")
+            paths.append(TrajectoryAnalysis(plan.joint_trajectory).positions)
+
+        factor = self.move_group_arm.velocity_scaling_factor
+        plan = retime_path(self.joint_names, blend_paths(paths, cmd.blend_radius),
+                self.max_velocities * factor, self.max_accelerations * factor**2)
+        if plan is not None:
+            self.parameters_validation.validate_trajectory(None, TrajectoryAnalysis(plan.joint_trajectory))
+        return plan
+
+    # Roadmap trajectories are planned at full speed
+    def execute_roadmap_plan(self, plan):
+        self.reset_controller()
+        rospy.loginfo("Send roadmap trajectory")
+        return self.execute_plan(self.retime_plan(plan))
+
+    # Timing of a plan just before execution
+    # - time optimal retiming : fastest timing of the plan path, under joint
+    #   limits scaled by the current velocity scaling factor
+    # - else plans not computed with the velocity scaling factor (roadmap,
+    #   stored trajectories) are slowed down by this factor
+    def retime_plan(self, plan, is_scaled=False):
+        factor = self.move_group_arm.velocity_scaling_factor
+        with self.time_phase('retiming'):
+            if self.time_optimal_retiming:
+                return retime_robot_trajectory(plan,
+                        self.max_velocities * factor, self.max_accelerations * factor**2)
+            if is_scaled or factor == 1.0:
+                return plan
+            return scale_robot_trajectory(plan, factor)
 
     def set_plan_and_execute(self, traj):
         self.reset_controller()
@@ -66,11 +213,105 @@ class RobotCommander:
         if traj == None :
             raise RobotCommanderException(
                 CommandStatus.PLAN_FAILED, "Moveit failed to execute plan.")  
-        return self.arm_commander.execute_plan(traj.trajectory)
+        return self.execute_plan(self.retime_plan(traj.trajectory))
+
+    # Every trajectory is sent from here : its end is the start of the
+    # next queued goal plan
+    def execute_plan(self, plan):
+        if plan and plan.joint_trajectory.points:
+            with self.goal_queue_condition:
+                self.current_end_joints = list(plan.joint_trajectory.points[-1].positions)
+                self.goal_queue_condition.notify_all()
+        with self.time_phase('execution'):
+            return self.arm_commander.execute_plan(plan, feedback_callback=self.publish_execution_feedback)
+
+    # Robot move action feedback, during trajectory execution
+    def publish_execution_feedback(self, tracker, joints):
+        goal_handle = self.current_goal_handle
+        if goal_handle is None:
+            return
+        (points, rpy, quaternions) = solve_fk([joints])
+        feedback = RobotMoveFeedback()
+        feedback.state.position.x, feedback.state.position.y, feedback.state.position.z = points[0].tolist()
+        feedback.state.rpy.roll, feedback.state.rpy.pitch, feedback.state.rpy.yaw = rpy[0].tolist()
+        feedback.percent_done = tracker.progress
+        feedback.eta = tracker.eta
+        feedback.tracking_error = tracker.tracking_error
+        goal_handle.publish_feedback(feedback)
+
+    # Plan of a queued command, from the predicted end of the previous one.
+    # Return (plan, is_timed) - plan is None if there is no move - or None
+    # for commands which can only be planned from the actual robot state
+    def compute_plan_from(self, cmd, start_joints):
+        with self.time_phase('planning'):
+            return self.compute_plan_from_start(cmd, start_joints)
+
+    def compute_plan_from_start(self, cmd, start_joints):
+        cmd_type = cmd.cmd_type
+        if cmd_type == CommandType.WAYPOINTS:
+            return self.compute_waypoints_plan(cmd, start_joints), True
+        if cmd_type == CommandType.JOINTS:
+            joint_target = list(cmd.joints)
+        elif cmd_type == CommandType.POSE:
+            joint_target = self.compute_pose_ik(cmd.position, cmd.rpy, start_joints)
+            if joint_target is None:
+                raise RobotCommanderException(CommandStatus.PLAN_FAILED, "pose plan failed")
+        elif cmd_type == CommandType.SAVED_POSITION:
+            joint_target = self.get_saved_position_joints(cmd)
+            plan = self.roadmap_manager.get_plan(cmd.saved_position_name, joint_target,
+                    start_joints, self.move_group_arm.goal_joint_tolerance)
+            if plan is not None:
+                return plan, False
+        else:
+            return None
+
+        if self.direct_motion:
+            return self.compute_direct_plan(start_joints, joint_target), True
+        plan = self.move_group_arm.compute_plan_between(start_joints, joint_target)
+        if plan is None:
+            raise RobotCommanderException(
+                CommandStatus.PLAN_FAILED, "Moveit failed to compute the plan.")
+        return plan, False
+
+    def execute_queued_plan(self, queued_goal):
+        if queued_goal.plan is None:
+            return CommandStatus.SUCCESS, "Command has been successfully processed"
+        plan = queued_goal.plan
+        if not queued_goal.is_timed:
+            plan = self.retime_plan(plan)
+        self.reset_controller()
+        rospy.loginfo("Send trajectory planned ahead")
+        return self.execute_plan(plan)
 
     def reset_controller(self):
-        msg = Empty() 
-        self.reset_controller_pub.publish(msg)
+        with self.time_phase('reset_controller'):
+            msg = Empty() 
+            self.reset_controller_pub.publish(msg)
+
+    # Time a phase of the goal processed by the calling thread
+    def time_phase(self, name):
+        return timed_phase(getattr(self.command_timing, 'timer', None), name)
+
+    def count_plan_attempts(self, attempts):
+        timer = getattr(self.command_timing, 'timer', None)
+        if timer is not None:
+            timer.count('plan_attempts', attempts)
+
+    def publish_command_metrics(self, cmd, status, timer):
+        with timer.lock:
+            durations = OrderedDict(timer.durations)
+            plan_attempts = timer.counters.get('plan_attempts', 0)
+        total = timer.get_total()
+        msg = CommandMetrics()
+        msg.cmd_type = cmd.cmd_type
+        msg.status = status
+        msg.plan_attempts = plan_attempts
+        msg.phases = durations.keys()
+        msg.durations = durations.values()
+        msg.total = total
+        self.command_metrics_publisher.publish(msg)
+        durations['total'] = total
+        self.latency_statistics.add(durations)
 
     def activate_learning_mode(self, activate):
         try:
@@ -122,18 +363,87 @@ class RobotCommander:
         
         self.validation = rospy.get_param("/gauss/robot_command_validation")
         self.parameters_validation = ParametersValidation(self.validation)
-
-        self.calculate_pose_ik = rospy.ServiceProxy('/gauss/calculate_ik', CalculateIK)
-
-
-    def set_saved_position(self, cmd):
+        self.roadmap_manager = RoadmapManager(self.pos_manager, self.move_group_arm,
+                self.parameters_validation, self.gauss_ros_logger)
+
+        self.ik_cache = IKCache()
+
+        self.direct_motion = rospy.get_param("~direct_motion", False)
+        self.time_optimal_retiming = rospy.get_param("~time_optimal_retiming", False)
+        self.joint_names = self.move_group_arm.get_active_joints()
+        self.max_velocities, self.max_accelerations = get_joint_limits(self.joint_names)
+        self.set_direct_motion_server = rospy.Service(
+                'gauss/commander/set_direct_motion', SetBool, self.callback_set_direct_motion)
+        self.set_max_velocity_scaling_factor_server = rospy.Service(
+                'gauss/commander/set_max_velocity_scaling_factor', SetInt,
+                self.callback_set_max_velocity_scaling_factor)
+        self.get_plan_cache_statistics_server = rospy.Service(
+                'gauss/commander/get_plan_cache_statistics', GetCacheStatistics,
+                self.callback_get_plan_cache_statistics)
+
+        # Time spent in each phase of robot move commands
+        self.command_timing = threading.local()
+        self.latency_statistics = LatencyStatistics(rospy.get_param("~latency_window_size", 1000))
+        self.command_metrics_publisher = rospy.Publisher('/gauss/commander/command_metrics',
+                CommandMetrics, queue_size=10)
+        self.get_command_latencies_server = rospy.Service(
+                'gauss/commander/get_command_latencies', GetCommandLatencies,
+                self.callback_get_command_latencies)
+        self.current_timer = None
+
+        # Goals received while a command is running wait in a bounded queue
+        # (0 : no queue), and are planned in advance from the predicted end
+        # of the previous goal
+        self.goal_queue_size = rospy.get_param("~goal_queue_size", 0)
+        self.plan_ahead_tolerance = rospy.get_param("~plan_ahead_tolerance", 0.01)
+        self.goal_queue = deque()
+        self.current_end_joints = None
+        self.goal_queue_condition = threading.Condition()
+        if self.goal_queue_size > 0:
+            self.plan_ahead_thread = threading.Thread(name="plan_ahead", target=self.plan_queued_goals)
+            self.plan_ahead_thread.daemon = True
+            self.plan_ahead_thread.start()
+
+
+    def get_saved_position_joints(self, cmd):
         rospy.loginfo("set saved position")
         pos = self.pos_manager.get_position(cmd.saved_position_name)
-        self.arm_commander.set_joint_target(pos.joints) 
+        return pos.joints
 
     def set_saved_trajectory(self, cmd):
-        traj = self.trajectory_manager.get_trajectory(cmd.saved_trajectory_id) 
-        return self.set_plan_and_execute(traj.trajectory_plan)
+        traj = self.trajectory_manager.get_validated_trajectory(cmd.saved_trajectory_id) 
+        return self.set_plan_and_execute(traj.trajectory_plan if traj != None else None)
+
+    # IK of a single pose : all IK branches (from cache or solved here),
+    # then the one closest to seed joints (default : current joints), for the shortest move
+    def compute_pose_ik(self, position, rpy, seed_joints=None):
+        with self.time_phase('ik'):
+            return self.solve_pose_ik(position, rpy, seed_joints)
+
+    def solve_pose_ik(self, position, rpy, seed_joints):
+        (qx, qy, qz, qw) = tf.transformations.quaternion_from_euler(rpy.roll, rpy.pitch, rpy.yaw)
+        pose = [position.x, position.y, position.z, qx, qy, qz, qw]
+
+        dh, joint_limits = get_kinematics_parameters()
+        self.ik_cache.check_parameters(dh, joint_limits.tolist(), self.validation['joint_limits'])
+        branches = self.ik_cache.get(pose)
+        if branches is None:
+            joints, valid = solve_ik_branches([pose], dh, joint_limits, FK_CHECK_TOLERANCE)
+            branches = (joints[0], valid[0])
+            self.ik_cache.put(pose, branches)
+
+        joints, valid = branches
+        if seed_joints is None:
+            seed_joints = self.move_group_arm.get_current_joint_values()
+        # No valid branch : joints out of range, or FK check failed
+        selected, selected_valid = select_closest_solutions(joints[None], valid[None], seed_joints)
+        if not selected_valid[0]:
+            return None
+        pos_list = selected[0].tolist()
+        for i in pos_list:
+            if str(i) == 'nan':
+                return None
+        return pos_list
 
     def execute_command(self, cmd):
         cmd_type = cmd.cmd_type
@@ -158,47 +468,25 @@ class RobotCommander:
             elif cmd_type == CommandType.SAVED_TRAJECTORY: 
                 status,message = self.set_saved_trajectory(cmd)
                 self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander set_saved_trajectory")
+            elif cmd_type == CommandType.WAYPOINTS:
+                status, message = self.compute_and_execute_waypoints_plan(cmd)
+                self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander compute_and_execute_waypoints_plan")
             else:
+                # Commands with a joint target can skip Moveit planning in direct mode
+                joint_target = None
                 if cmd_type == CommandType.JOINTS:
-                    self.arm_commander.set_joint_target(cmd.joints)
+                    joint_target = cmd.joints
                     self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander set_joint_target")
                 elif cmd_type == CommandType.POSE:
                     # self.arm_commander.set_pose_target(cmd.position.x, cmd.position.y, cmd.position.z,
                     #                                    cmd.rpy.roll, cmd.rpy.pitch, cmd.rpy.yaw)
-                    print "r p y got ~~~~~~~~~~~~~~~~~~~~~~~"
-                    print  cmd.rpy.roll
-                    print  cmd.rpy.pitch
-                    print  cmd.rpy.yaw
-                    
-                    pose_goal = geometry_msgs.msg.Pose()
-                    (qx, qy, qz, qw) = tf.transformations.quaternion_from_euler(cmd.rpy.roll, cmd.rpy.pitch, cmd.rpy.yaw)
-                    pose_goal.orientation.w = qw
-                    pose_goal.orientation.x = qx
-                    pose_goal.orientation.y = qy
-                    pose_goal.orientation.z = qz
-                    pose_goal.position.x = cmd.position.x 
-                    pose_goal.position.y = cmd.position.y
-                    pose_goal.position.z = cmd.position.z
-
-                    print "orientation send ~~~~~~~~~~~~~~~~~~~~~~~"
-                    print  qx
-                    print  qy
-                    print  qz
-                    print  qw
-                    
-                    poses = []
-                    poses.append(copy.deepcopy(pose_goal))
-                    resp = self.calculate_pose_ik(poses)
-                    pos_list = resp.points[0].positions
-                    print "~~~~~~~~~~~~~~~~~~~~~~~~~~~pos_list"
-                    print pos_list
-                    for i in pos_list:
-                        if str(i) == 'nan':
-                            print "warning, got a nan joint value, failed to plan pose"
-                            status, message = (400, "pose plan failed")
-                            return status, message
+                    pos_list = self.compute_pose_ik(cmd.position, cmd.rpy)
+                    if pos_list is None:
+                        print "warning, got a nan joint value, failed to plan pose"
+                        status, message = (400, "pose plan failed")
+                        return status, message
                   
-                    self.arm_commander.set_joint_target(resp.points[0].positions)
+                    joint_target = pos_list
 
                     self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander set_pose_target")                    
                 elif cmd_type == CommandType.POSITION:
@@ -214,11 +502,27 @@ class RobotCommander:
                     self.arm_commander.set_pose_quat_target(cmd.pose_quat)
                     self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander set_pose_quat_target")
                 elif cmd_type == CommandType.SAVED_POSITION: 
-                    self.set_saved_position(cmd)
+                    joint_target = self.get_saved_position_joints(cmd)
                     self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander set_saved_position")
 
-                status, message = self.compute_and_execute_plan()
-                self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander compute_and_execute_plan")
+                # Saved positions may have a trajectory computed in advance
+                roadmap_plan = None
+                if cmd_type == CommandType.SAVED_POSITION:
+                    with self.time_phase('planning'):
+                        roadmap_plan = self.roadmap_manager.get_plan(cmd.saved_position_name, joint_target,
+                                self.move_group_arm.get_current_joint_values(), self.move_group_arm.goal_joint_tolerance)
+
+                if roadmap_plan is not None:
+                    status, message = self.execute_roadmap_plan(roadmap_plan)
+                    self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander execute_roadmap_plan")
+                elif joint_target is not None and self.direct_motion:
+                    status, message = self.compute_and_execute_direct_plan(joint_target)
+                    self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander compute_and_execute_direct_plan")
+                else:
+                    if joint_target is not None:
+                        self.arm_commander.set_joint_target(joint_target)
+                    status, message = self.compute_and_execute_plan()
+                    self.gauss_ros_logger.publish_log_status("INFO", "RobotCommander compute_and_execute_plan")
                 self.gauss_ros_logger.publish_log_status("INFO", message)
 
         return (status, message)
@@ -229,9 +533,45 @@ class RobotCommander:
             self.tool_commander.stop_tool_command() # todo handle goal cancelation for tools (client side)
 
     def callback_stop_command(self, req):
+        self.flush_goal_queue()
         self.cancel_command()
         return True, "Command stopped"
 
+    # value : max velocity percentage (1-100)
+    def callback_set_max_velocity_scaling_factor(self, req):
+        if req.value < 1 or req.value > 100:
+            return {'status': 400, 'message': "Max velocity percentage must be between 1 and 100"}
+        try:
+            self.move_group_arm.set_max_velocity_scaling_factor(req.value / 100.0)
+        except Exception, e:
+            return {'status': 400, 'message': str(e)}
+        return {'status': 200, 'message': "Max velocity set to " + str(req.value) + "%"}
+
+    def callback_get_plan_cache_statistics(self, req):
+        if self.move_group_arm.plan_cache is None:
+            return {'status': 400, 'message': "Plan cache is disabled"}
+        response = self.move_group_arm.plan_cache.get_statistics()
+        response['status'] = 200
+        response['message'] = "OK"
+        return response
+
+    def callback_get_command_latencies(self, req):
+        percentiles = self.latency_statistics.get_percentiles((50, 95, 99))
+        if not percentiles:
+            return {'status': 400, 'message': "No command has been executed yet"}
+        return {'status': 200, 'message': "OK",
+                'phases': [name for (name, count, values) in percentiles],
+                'counts': [count for (name, count, values) in percentiles],
+                'p50': [values[0] for (name, count, values) in percentiles],
+                'p95': [values[1] for (name, count, values) in percentiles],
+                'p99': [values[2] for (name, count, values) in percentiles]}
+
+    def callback_set_direct_motion(self, req):
+        self.direct_motion = req.data
+        if self.direct_motion:
+            return True, "Direct motion mode enabled"
+        return True, "Direct motion mode disabled"
+
  # robot action server functions 
     # Check if no other command is being processed
     # - Validate params
@@ -268,6 +608,7 @@ class RobotCommander:
      
     def on_goal(self, goal_handle):
         rospy.loginfo("Robot Action Server - Received goal. Check if exists")
+        timer = CommandTimer()
 
         if not self.simulator_mode:
             # Check if hw status has been received at least once
@@ -309,23 +650,22 @@ class RobotCommander:
                goal_handle.set_rejected(result)
                return
 
-        # check if still have a goal -> set_rejected() 
-        if self.current_goal_handle is not None:
-
-            result = self.create_result(CommandStatus.GOAL_STILL_ACTIVE, 
-                "Current command is still active. Cancel it if you want to execute a new one")
-            goal_handle.set_rejected(result)
-            return
-      
         # validate parameters -> set_rejected (msg : validation or commander error)
         try:
             rospy.loginfo("Robot Action Server - Checking parameters Validity")
-            self.validate_params(goal_handle.goal.goal.cmd)
+            with timer.phase('validation'):
+                self.validate_params(goal_handle.goal.goal.cmd)
         except RobotCommanderException as e:
             result = self.create_result(e.status, e.message)
             goal_handle.set_rejected(result)
             rospy.loginfo("Robot Action Server - Invalid parameters")
             return
+
+        # check if still have a goal -> queue it, or set_rejected() if queue is full
+        with self.goal_queue_condition:
+            if self.current_goal_handle is not None:
+                self.queue_goal(goal_handle, timer)
+                return
         
         # Check if learning mode ON
         if self.learning_mode_on:
@@ -336,7 +676,10 @@ class RobotCommander:
                 return
         
         # set accepted
-        self.current_goal_handle = goal_handle
+        with self.goal_queue_condition:
+            self.current_goal_handle = goal_handle
+            self.current_timer = timer
+            self.current_end_joints = None
         self.current_goal_handle.set_accepted()
         rospy.loginfo("Robot Action Server - Goal has been accepted")
 
@@ -350,42 +693,155 @@ class RobotCommander:
 
         if goal_handle == self.current_goal_handle:
             self.cancel_current_command()
+        elif self.cancel_queued_goal(goal_handle):
+            rospy.loginfo("Robot Action Server - Queued goal has been canceled")
         else:
             rospy.loginfo("Robot Action Server - No current goal, nothing to do")
 
+    # Execute current goal, then queued goals one after the other
     def execute_command_action(self):
-        cmd = self.current_goal_handle.goal.goal.cmd 
-        rospy.loginfo("passing to executing command")
-        result = self.create_result(CommandStatus.ROS_ERROR, "error with executing command")
-        response = None
-        try: 
-            (status, message) = self.execute_command(cmd)
-            response = self.create_result(status, message)
-            result = response 
-        except RobotCommanderException as e :
-            result = self.create_result(e.status, e.message)
-            rospy.loginfo ("An exception was thrown during command execution") 
-
-        if not response:
-            self.current_goal_handle.set_aborted(result)
-            rospy.loginfo("Execution has been aborted")
-        elif response.status == CommandStatus.SUCCESS:
-            self.current_goal_handle.set_succeeded(result)
-            rospy.loginfo("Goal has been set as succeeded")
-        elif response.status == CommandStatus.STOPPED:
-            self.current_goal_handle.set_canceled(result)
-            rospy.loginfo("Goal has been successfully canceled")
-        elif response.status == CommandStatus.CONTROLLER_PROBLEMS:
-            self.current_goal_handle.set_aborted(result)
-            rospy.loginfo("Controller failed during execution : Goal has been aborted")
-        else:
-            self.current_goal_handle.set_aborted(result)
-            rospy.loginfo("Unknown result, goal has been set as aborted")
-        self.current_goal_handle = None
+        queued_goal = None
+        while True:
+            cmd = self.current_goal_handle.goal.goal.cmd 
+            timer = self.current_timer
+            self.command_timing.timer = timer
+            rospy.loginfo("passing to executing command")
+            result = self.create_result(CommandStatus.ROS_ERROR, "error with executing command")
+            response = None
+            try: 
+                (status, message) = self.execute_goal_command(cmd, queued_goal)
+                response = self.create_result(status, message)
+                result = response 
+            except RobotCommanderException as e :
+                result = self.create_result(e.status, e.message)
+                rospy.loginfo ("An exception was thrown during command execution") 
+
+            with timer.phase('result'):
+                if not response:
+                    self.current_goal_handle.set_aborted(result)
+                    rospy.loginfo("Execution has been aborted")
+                elif response.status == CommandStatus.SUCCESS:
+                    self.current_goal_handle.set_succeeded(result)
+                    rospy.loginfo("Goal has been set as succeeded")
+                elif response.status == CommandStatus.STOPPED:
+                    self.current_goal_handle.set_canceled(result)
+                    rospy.loginfo("Goal has been successfully canceled")
+                elif response.status == CommandStatus.CONTROLLER_PROBLEMS:
+                    self.current_goal_handle.set_aborted(result)
+                    rospy.loginfo("Controller failed during execution : Goal has been aborted")
+                else:
+                    self.current_goal_handle.set_aborted(result)
+                    rospy.loginfo("Unknown result, goal has been set as aborted")
+            self.command_timing.timer = None
+            self.publish_command_metrics(cmd, result.status, timer)
+
+            # Queued goals expect the robot where this goal ends
+            if not response or response.status != CommandStatus.SUCCESS:
+                self.flush_goal_queue("Previous command has not succeeded")
+
+            with self.goal_queue_condition:
+                if not self.goal_queue:
+                    self.current_goal_handle = None
+                    self.current_timer = None
+                    self.current_end_joints = None
+                    return
+                queued_goal = self.goal_queue.popleft()
+                self.current_goal_handle = queued_goal.goal_handle
+                self.current_timer = queued_goal.timer
+                self.current_end_joints = queued_goal.end_joints
+                self.goal_queue_condition.notify_all()
+            queued_goal.timer.add('queue_wait', monotonic() - queued_goal.queued_time)
+            self.current_goal_handle.set_accepted()
+            rospy.loginfo("Robot Action Server - Queued goal has been accepted")
+
+    # Use the plan computed in advance if robot is where it was predicted to be
+    def execute_goal_command(self, cmd, queued_goal):
+        if queued_goal is not None and queued_goal.has_plan:
+            current_joints = self.move_group_arm.get_current_joint_values()
+            if np.max(np.abs(np.asarray(current_joints) - queued_goal.start_joints)) <= self.plan_ahead_tolerance:
+                return self.execute_queued_plan(queued_goal)
+            rospy.loginfo("Robot Action Server - Robot is not at the start of the plan computed in advance")
+        return self.execute_command(cmd)
+
+    # goal queue : caller must hold goal_queue_condition
+    def queue_goal(self, goal_handle, timer):
+        if len(self.goal_queue) >= self.goal_queue_size:
+            message = "Current command is still active. Cancel it if you want to execute a new one"
+            if self.goal_queue_size > 0:
+                message = "Goal queue is full, wait for the current command to end"
+            goal_handle.set_rejected(self.create_result(CommandStatus.GOAL_STILL_ACTIVE, message))
+            return
+        self.goal_queue.append(QueuedGoal(goal_handle, timer))
+        self.goal_queue_condition.notify_all()
+        rospy.loginfo("Robot Action Server - Goal has been queued (" + str(len(self.goal_queue)) + " waiting)")
+
+    def cancel_queued_goal(self, goal_handle):
+        with self.goal_queue_condition:
+            goals = list(self.goal_queue)
+            handles = [queued_goal.goal_handle for queued_goal in goals]
+            if goal_handle not in handles:
+                return False
+            index = handles.index(goal_handle)
+            del self.goal_queue[index]
+            # Next goals were planned from the end of the canceled one
+            for queued_goal in goals[index + 1:]:
+                queued_goal.reset_plan()
+            self.goal_queue_condition.notify_all()
+        goal_handle.set_canceled(self.create_result(CommandStatus.STOPPED, "Command has been canceled"))
+        return True
+
+    def flush_goal_queue(self, message="Command has been canceled"):
+        with self.goal_queue_condition:
+            goals = list(self.goal_queue)
+            self.goal_queue.clear()
+        for queued_goal in goals:
+            queued_goal.goal_handle.set_canceled(self.create_result(CommandStatus.STOPPED, message))
+        if goals:
+            rospy.loginfo("Robot Action Server - " + str(len(goals)) + " queued goals have been canceled")
+
+    # First queued goal not planned yet, with the predicted joints it starts
+    # from, or (None, None) if the end of a previous goal is unknown
+    def get_next_goal_to_plan(self):
+        start_joints = self.current_end_joints
+        for queued_goal in self.goal_queue:
+            if start_joints is None:
+                break
+            if not queued_goal.is_planned:
+                return queued_goal, start_joints
+            start_joints = queued_goal.end_joints
+        return None, None
+
+    # Plan ahead thread : plan queued goals while the current one is executed
+    def plan_queued_goals(self):
+        while not rospy.is_shutdown():
+            with self.goal_queue_condition:
+                queued_goal, start_joints = self.get_next_goal_to_plan()
+                if queued_goal is None:
+                    self.goal_queue_condition.wait(1.0)
+                    continue
+                revision = queued_goal.revision
+
+            planned = None
+            if queued_goal.cmd.cmd_type != CommandType.TOOL:
+                self.command_timing.timer = queued_goal.timer
+                try:
+                    planned = self.compute_plan_from(queued_goal.cmd, start_joints)
+                except RobotCommanderException as e:
+                    rospy.logwarn("Robot Action Server - Could not plan queued goal in advance : " + str(e.message))
+                self.command_timing.timer = None
+
+            with self.goal_queue_condition:
+                # Queue may have changed while planning
+                if queued_goal in self.goal_queue and queued_goal.revision == revision:
+                    if queued_goal.cmd.cmd_type == CommandType.TOOL:
+                        queued_goal.set_no_move(start_joints)
+                    else:
+                        queued_goal.set_plan(start_joints, planned)
+                    self.goal_queue_condition.notify_all()
 
-    
     # Send a cancel signal to Moveit interface
     def cancel_current_command(self):
+        self.flush_goal_queue()
         try:
             self.cancel_command ()
         except RobotCommanderException:
@@ -417,8 +873,10 @@ class RobotCommander:
             self.parameters_validation.validate_orientation_quaternion(cmd.pose_quat.orientation)
         elif cmd_type == CommandType.SAVED_POSITION: 
             self.validate_saved_position(cmd.saved_position_name)
-        elif CommandType.SAVED_TRAJECTORY:
+        elif cmd_type == CommandType.SAVED_TRAJECTORY:
             self.validate_saved_trajectory(cmd)
+        elif cmd_type == CommandType.WAYPOINTS:
+            self.validate_waypoints(cmd)
 
         else:
             raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS, "Wrong command type")
@@ -426,12 +884,23 @@ class RobotCommander:
 
     def validate_saved_trajectory(self, cmd): 
         rospy.loginfo("Checking saved trajectory validity")
-        saved_traj = self.trajectory_manager.get_trajectory(cmd.saved_trajectory_id)
+        saved_traj = self.trajectory_manager.get_validated_trajectory(cmd.saved_trajectory_id)
         if saved_traj == None :
             raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS, "Saved trajectory  not found") 
-        self.parameters_validation.validate_trajectory(saved_traj.trajectory_plan)
          
 
+    def validate_waypoints(self, cmd):
+        if len(cmd.waypoints) == 0:
+            raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS, "No waypoint given")
+        if cmd.blend_radius < 0:
+            raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS, "Blend radius must be positive")
+        for waypoint in cmd.waypoints:
+            if len(waypoint.joints) > 0:
+                self.parameters_validation.validate_joints(waypoint.joints)
+            else:
+                self.parameters_validation.validate_position(waypoint.position)
+                self.parameters_validation.validate_orientation(waypoint.rpy)
+
     def validate_saved_position(self, position_name):
         rospy.loginfo("Checking joints validity")
         saved_position = self.pos_manager.get_position(position_name)
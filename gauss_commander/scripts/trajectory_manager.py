@@ -5,17 +5,28 @@ from gauss_commander.gauss_file_exception import GaussFileException
 from gauss_commander.trajectory.trajectory import Trajectory
 from gauss_commander.trajectory.trajectory_command_type import TrajectoryCommandType
 from gauss_commander.trajectory.trajectory_file_handler import TrajectoryFileHandler
+from gauss_commander.trajectory.trajectory_database_handler import TrajectoryDatabaseHandler
+from gauss_commander.trajectory.trajectory_cache import TrajectoryCache, TrajectoryCacheEntry
 from gauss_commander.robot_commander_exception import RobotCommanderException
 from gauss_commander.parameters_validation import ParametersValidation
+from gauss_commander.motion.joint_limits import get_joint_limits
+from gauss_commander.motion.trajectory_analysis import TrajectoryAnalysis
+from gauss_commander.motion.trajectory_retiming import retime_robot_trajectory
 
 from gauss_msgs.msg import Trajectory
+from gauss_msgs.msg import TrajectoryInfo
 from gauss_msgs.srv import ManageTrajectory
 from gauss_msgs.srv import GetTrajectoryList
 
 class TrajectoryManager:
     
-    def __init__(self, trajectory_dir, logger): 
-        self.fh = TrajectoryFileHandler(trajectory_dir)
+    # database : gauss_commander.database.Database, trajectories are stored in
+    # trajectory_dir files if None
+    def __init__(self, trajectory_dir, logger, database=None): 
+        if database is not None:
+            self.fh = TrajectoryDatabaseHandler(database, trajectory_dir)
+        else:
+            self.fh = TrajectoryFileHandler(trajectory_dir)
         self.manage_position_server = rospy.Service(
                 '/gauss/trajectory/manage_trajectory', ManageTrajectory, self.callback_manage_trajectory)
         rospy.loginfo("/gauss/trajectory/manage_trajectory service has been created " )
@@ -25,30 +36,57 @@ class TrajectoryManager:
         self.validation = rospy.get_param("/gauss/robot_command_validation")
         self.parameters_validation = ParametersValidation(self.validation)
         self.gauss_ros_logger = logger
+        self.time_optimal_retiming = rospy.get_param("~time_optimal_retiming", False)
+        # Decoded trajectories, for repeated executions
+        self.trajectory_cache = TrajectoryCache(rospy.get_param("~trajectory_cache_max_points", 100000))
 
+    # Page of trajectories sorted by id : headers only with info_header_only,
+    # full trajectories are then retrieved one at a time (GET)
     def callback_get_trajectory_list(self, req = None): 
-        traj_list = self.get_all_trajectories()
+        offset = req.offset if req != None else 0
+        limit = req.limit if req != None else 0
+        if req != None and req.info_header_only:
+            infos = self.fh.get_trajectory_infos()
+            info_msg_list = []
+            for info in self.get_page(infos, offset, limit):
+                info_msg = TrajectoryInfo()
+                info_msg.id = info.id
+                info_msg.name = info.name
+                info_msg.description = info.description
+                info_msg.point_count = info.point_count
+                info_msg.duration = info.duration
+                info_msg.joints_min = info.joints_min
+                info_msg.joints_max = info.joints_max
+                info_msg_list.append(info_msg)
+            return { 'trajectories': [], 'trajectory_infos': info_msg_list, 'total_count': len(infos) }
+
+        trajectory_ids = self.fh.get_all_trajectory_ids()
         msg_list = []
-        for traj in traj_list:
+        for traj in self.get_trajectories(self.get_page(trajectory_ids, offset, limit)):
             trajectory_msg = Trajectory()
             trajectory_msg.description= traj.description
             trajectory_msg.name = traj.name
             trajectory_msg.id = traj.id
             trajectory_msg.trajectory_plan = traj.trajectory_plan
             msg_list.append(trajectory_msg)
-        return{ 'trajectories': msg_list }
+        return{ 'trajectories': msg_list, 'trajectory_infos': [], 'total_count': len(trajectory_ids) }
+
+    # limit 0 : no limit
+    def get_page(self, items, offset, limit):
+        offset = max(offset, 0)
+        if limit > 0:
+            return items[offset:offset + limit]
+        return items[offset:]
 
     def get_all_trajectories(self): 
-        filenames = self.fh.get_all_filenames()
+        return self.get_trajectories(self.fh.get_all_trajectory_ids())
+
+    def get_trajectories(self, trajectory_ids):
         trajectory_list = []
-        for f in filenames:
-            try:
-                trajectory_id = self.fh.trajectory_id_from_filename(f)
-                traj = self.get_trajectory(trajectory_id)
-                if traj != None:
-                    trajectory_list.append(traj)
-            except GaussFileException as e:
-                pass
+        for trajectory_id in trajectory_ids:
+            traj = self.get_trajectory(trajectory_id)
+            if traj != None:
+                trajectory_list.append(traj)
         return trajectory_list
 
     def create_trajectory_response(self, status, message, trajectory = None):
@@ -99,6 +137,7 @@ class TrajectoryManager:
             return self.create_trajectory_response(400, "Wrong command type")
     
     def delete_trajectory(self, tarjectory_id): 
+        self.trajectory_cache.invalidate(tarjectory_id)
         try:
             self.fh.remove_trajectory( tarjectory_id)
         except GaussFileException as e:
@@ -106,10 +145,13 @@ class TrajectoryManager:
         return True
 
     def update_trajectory(self, traj, trajectory_data) : 
+        # traj may be the cached object
+        self.trajectory_cache.invalidate(traj.id)
         traj.name = trajectory_data.name
         traj.description = trajectory_data.description
         traj.trajectory_plan = trajectory_data.trajectory_plan       
         try:
+            self.retime_trajectory_plan(traj.trajectory_plan)
             self.parameters_validation.validate_trajectory(traj.trajectory_plan)
         except RobotCommanderException as e:
             rospy.logwarn(str(e) + " Invalid trajectory ")
@@ -121,25 +163,67 @@ class TrajectoryManager:
         return (True ," Trajectory has been updated : ")
 
     def create_new_trajectory(self, traj): 
-        new_id = self.fh.pick_new_id()
-        traj.id = new_id 
         try:
+             self.retime_trajectory_plan(traj.trajectory_plan)
              self.parameters_validation.validate_trajectory(traj.trajectory_plan)
         except RobotCommanderException as e:
             rospy.logwarn(str(e) + " Invalid trajectory")
             return (-1  ,"Failed to create trajectory: invalid trajectory ")
 
         try: 
-            self.fh.write_trajectroy(traj)
+            new_id = self.fh.create_trajectory(traj)
         except GaussFileException as e:
             return (-1, "Failed to create trajectory ")
         return (new_id, "trajectory has been created : ")
 
+    # Trajectories are saved time optimal, at full speed
+    def retime_trajectory_plan(self, trajectory_plan):
+        if not self.time_optimal_retiming:
+            return
+        joint_trajectory = trajectory_plan.trajectory.joint_trajectory
+        if len(joint_trajectory.points) < 2:
+            return
+        max_velocities, max_accelerations = get_joint_limits(joint_trajectory.joint_names)
+        trajectory_plan.trajectory = retime_robot_trajectory(trajectory_plan.trajectory,
+                max_velocities, max_accelerations)
+
     def get_trajectory(self, trajectory_id):
+        entry = self.trajectory_cache.get(trajectory_id)
+        if entry is not None:
+            return entry.trajectory
+        return self.load_trajectory(trajectory_id)
+
+    def get_validated_trajectory(self, trajectory_id):
+        """
+        Saved trajectory checked against current limits, validated only once
+        while it stays in cache. None if it does not exist, raise
+        RobotCommanderException if it is not valid.
+        """
+        entry = self.trajectory_cache.get(trajectory_id)
+        if entry is None:
+            return self.load_trajectory(trajectory_id, validate=True)
+        limits_key = self.parameters_validation.get_limits_key(entry.joint_names)
+        if entry.limits_key != limits_key:
+            self.parameters_validation.validate_trajectory(entry.trajectory.trajectory_plan)
+            entry.limits_key = limits_key
+        return entry.trajectory
+
+    # Validation runs on binary arrays, before messages are created
+    def load_trajectory(self, trajectory_id, validate=False):
         try:	
-            return self.fh.read_trajectory(trajectory_id)
+            binary_traj = self.fh.read_binary_trajectory(trajectory_id)
         except GaussFileException as e:
             return None  
+        joint_names = binary_traj.get_joint_names()
+        limits_key = None
+        if validate:
+            self.parameters_validation.validate_trajectory(None, TrajectoryAnalysis.from_arrays(joint_names,
+                    binary_traj.times, binary_traj.positions, binary_traj.velocities, binary_traj.accelerations))
+            limits_key = self.parameters_validation.get_limits_key(joint_names)
+        traj = binary_traj.to_trajectory()
+        self.trajectory_cache.put(trajectory_id, TrajectoryCacheEntry(
+                traj, joint_names, binary_traj.get_point_count(), limits_key))
+        return traj
 
 if __name__ == '__main__':
  
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Timing of the phases of robot move commands, with a monotonic clock
+(time.time() can jump when the system clock is set, e.g. by NTP).
+
+- CommandTimer : durations of the phases of one command
+- LatencyStatistics : rolling percentiles of phase durations over the
+  last commands
+"""
+
+import time
+import ctypes
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from threading import Lock, local
+
+import numpy as np
+
+CLOCK_MONOTONIC = 1
+
+
+class timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+try:
+    clock_gettime = ctypes.CDLL('librt.so.1', use_errno=True).clock_gettime
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+except (OSError, AttributeError):
+    clock_gettime = None
+
+
+def monotonic():
+    """Seconds from an arbitrary start, never going back."""
+    if clock_gettime is None:
+        return time.time()
+    t = timespec()
+    if clock_gettime(CLOCK_MONOTONIC, ctypes.pointer(t)) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, "clock_gettime failed")
+    return t.tv_sec + t.tv_nsec * 1e-9
+
+
+class CommandTimer:
+
+    def __init__(self):
+        self.start_time = monotonic()
+        self.durations = OrderedDict()
+        self.counters = {}
+        # Time spent in nested phases, for each running phase. Phases of
+        # one command can run in several threads (e.g. planning ahead) :
+        # each thread has its own stack
+        self.thread_state = local()
+        self.lock = Lock()
+
+    def get_nested_times(self):
+        if not hasattr(self.thread_state, 'nested_times'):
+            self.thread_state.nested_times = []
+        return self.thread_state.nested_times
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Add the time spent in the with block to phase name. Time spent
+        in nested phases only counts for the innermost one.
+        """
+        nested_times = self.get_nested_times()
+        start = monotonic()
+        nested_times.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = monotonic() - start
+            self.add(name, elapsed - nested_times.pop())
+            if nested_times:
+                nested_times[-1] += elapsed
+
+    def add(self, name, duration):
+        with self.lock:
+            self.durations[name] = self.durations.get(name, 0.0) + duration
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get_total(self):
+        return monotonic() - self.start_time
+
+
+@contextmanager
+def timed_phase(timer, name):
+    """Same as timer.phase(name), does nothing if timer is None."""
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+class LatencyStatistics:
+
+    def __init__(self, window_size=1000):
+        self.window_size = window_size
+        self.samples = OrderedDict()
+        self.lock = Lock()
+
+    def add(self, durations):
+        """durations : {phase name: duration} of one command"""
+        with self.lock:
+            for name, duration in durations.items():
+                if name not in self.samples:
+                    self.samples[name] = deque(maxlen=self.window_size)
+                self.samples[name].append(duration)
+
+    def get_percentiles(self, percentiles=(50, 95, 99)):
+        """
+        Return values:
+        list of (phase name, number of samples, [duration at each percentile])
+        """
+        with self.lock:
+            samples = [(name, np.array(values)) for name, values in self.samples.items()]
+        return [(name, len(values), np.percentile(values, percentiles).tolist())
+                for name, values in samples if len(values) > 0]
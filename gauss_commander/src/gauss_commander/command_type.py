@@ -11,3 +11,4 @@ class CommandType(object):
     POSE_QUAT  = 8
     SAVED_POSITION =9
     SAVED_TRAJECTORY = 10  
+    WAYPOINTS = 11
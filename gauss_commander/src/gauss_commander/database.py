@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from threading import RLock
+
+"""
+Single file SQLite storage, optional replacement of one file per record
+directories for positions, trajectories and sequences
+
+- every change is an atomic transaction (crash safe with WAL journal)
+- records of an existing directory are migrated once, when the handler of
+  its table is first created
+"""
+
+class Database:
+
+    def __init__(self, path):
+        self.path = path
+        if self.path.startswith('~'):
+            self.path = os.path.expanduser(self.path)
+        db_dir = os.path.dirname(self.path)
+        if db_dir and not os.path.exists(db_dir):
+            print("Create database dir " + str(db_dir))
+            os.makedirs(db_dir)
+        # Connection is shared by service threads, under the lock
+        self.lock = RLock()
+        # Transactions are started explicitly (see transaction())
+        self.connection = sqlite3.connect(self.path, timeout=10.0,
+                check_same_thread=False, isolation_level=None)
+        self.connection.text_factory = str
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY)")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Cursor of a write transaction : changes are committed at the end of
+        the with block, rolled back on exception.
+        """
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+                cursor.execute("COMMIT")
+            except:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                cursor.close()
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def get_data_version(self):
+        """Changes each time another connection commits to the database."""
+        return self.query("PRAGMA data_version")[0][0]
+
+    def migrate(self, name, migration):
+        """
+        Run migration(cursor) once, in the same transaction as its record.
+        Return values:
+        True if the migration has been run now
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT 1 FROM migrations WHERE name = ?", (name,))
+            if cursor.fetchone() is not None:
+                return False
+            migration(cursor)
+            cursor.execute("INSERT INTO migrations (name) VALUES (?)", (name,))
+            return True
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
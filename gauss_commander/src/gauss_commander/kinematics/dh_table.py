@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+DH parameters of the Gauss6-500 robot arm and vectorized link transforms.
+"""
+
+import numpy as np
+from numpy import pi
+
+
+def get_DH_Table():
+    """
+    Define DH parameters for Gauss6-500.
+    alphai-1 :  angle b/w z-axes of links i-1 and i along x-axis of link i-1
+    ai-1     :  distance b/w z-axes of links i-1 and i along x-axis of link i-1
+    di       :  distance b/w x-axes of links i-1 and i along z-axis of link i
+    thetai   :  angle b/w x-axes of links i-1 and i along z-axis of link i
+    """
+    # Define variables for joint angles
+    theta1, theta2, theta3, theta4, theta5, theta6 = 0., 0., 0., 0., 0., 0.
+    # Construct DH Table of Gauss6-500
+    dh = {'alpha0':     0,  'a0':      0,  'd1': 0.2505,  'theta1':   theta1,
+          'alpha1':  pi/2,  'a1':      0,  'd2':      0,  'theta2':   theta2,
+          'alpha2':     0,  'a2':  0.185,  'd3':      0,  'theta3':   theta3,
+          'alpha3':  pi/2,  'a3':      0,  'd4':  0.252,  'theta4':   theta4,
+          'alpha4': -pi/2,  'a4':      0,  'd5':      0,  'theta5':   theta5,
+          'alpha5':  pi/2,  'a5':      0,  'd6':      0,  'theta6':   theta6,
+          'alpha6':     0,  'a6':      0,  'dG':  0.025,  'thetaG':        0}
+
+    return dh
+
+
+def get_Rx(theta):
+    """Define matrix for rotation (roll) about x axis."""
+    return np.array([[1,             0,              0],
+                     [0, np.cos(theta), -np.sin(theta)],
+                     [0, np.sin(theta),  np.cos(theta)]])
+
+
+def get_Ry(theta):
+    """Define matrix for rotation (pitch) about y axis."""
+    return np.array([[ np.cos(theta), 0, np.sin(theta)],
+                     [             0, 1,             0],
+                     [-np.sin(theta), 0, np.cos(theta)]])
+
+
+def get_Rz(theta):
+    """Define matrix for rotation (yaw) about z axis."""
+    return np.array([[np.cos(theta), -np.sin(theta), 0],
+                     [np.sin(theta),  np.cos(theta), 0],
+                     [            0,              0, 1]])
+
+
+# Alignment between the EE frame in the URDF and the one of the DH table:
+# intrinsic (body-fixed) rotations of 180 deg yaw then -90 deg pitch
+R_URDF_TO_DH = np.dot(get_Rz(pi), get_Ry(-pi/2))
+
+
+def get_TF_batch(alpha, a, d, theta):
+    """
+    Compute homogeneous transforms between adjacent links for many angles.
+    Keyword arguments:
+    alpha, a, d -- constant DH parameters of the link
+    theta -- array of N joint angles
+    Return values:
+    Tf -- (N, 4, 4) array, one transform per joint angle
+    """
+    theta = np.asarray(theta, dtype=float)
+    ct, st = np.cos(theta), np.sin(theta)
+    ca, sa = np.cos(alpha), np.sin(alpha)
+
+    Tf = np.zeros(theta.shape + (4, 4))
+    Tf[..., 0, 0] = ct
+    Tf[..., 0, 1] = -st
+    Tf[..., 0, 3] = a
+    Tf[..., 1, 0] = st*ca
+    Tf[..., 1, 1] = ct*ca
+    Tf[..., 1, 2] = -sa
+    Tf[..., 1, 3] = -sa*d
+    Tf[..., 2, 0] = st*sa
+    Tf[..., 2, 1] = ct*sa
+    Tf[..., 2, 2] = ca
+    Tf[..., 2, 3] = ca*d
+    Tf[..., 3, 3] = 1.0
+    return Tf
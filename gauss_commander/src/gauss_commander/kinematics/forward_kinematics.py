@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Vectorized closed-form Forward Kinematics of the Gauss6-500 robot arm.
+
+All functions work on a whole batch of N joint vectors at once, given as
+an (N, 6) array. The computed EE frame is the one expected by the IK
+solver (flange frame of the URDF).
+"""
+
+import numpy as np
+from numpy import pi
+
+from gauss_commander.kinematics.dh_table import get_DH_Table, get_TF_batch, R_URDF_TO_DH
+
+
+def get_T0_ee(joints, dh=None):
+    """
+    Compute overall transforms between base frame and EE by
+    composing the individual link transforms.
+    Return values:
+    T0_ee -- (N, 4, 4) array, expressed in the DH convention
+    """
+    if dh is None:
+        dh = get_DH_Table()
+    joints = np.atleast_2d(np.asarray(joints, dtype=float))
+    n = joints.shape[0]
+
+    # T(i-1)_i = Rx(alpha(i-1)) * Dx(alpha(i-1)) * Rz(theta(i)) * Dz(d(i))
+    # NOTE: theta2 has a 90 deg constant offset in the DH table
+    T0_ee = get_TF_batch(dh['alpha0'], dh['a0'], dh['d1'], joints[:, 0])
+    T0_ee = np.matmul(T0_ee, get_TF_batch(dh['alpha1'], dh['a1'], dh['d2'], joints[:, 1] + pi/2))
+    T0_ee = np.matmul(T0_ee, get_TF_batch(dh['alpha2'], dh['a2'], dh['d3'], joints[:, 2]))
+    T0_ee = np.matmul(T0_ee, get_TF_batch(dh['alpha3'], dh['a3'], dh['d4'], joints[:, 3]))
+    T0_ee = np.matmul(T0_ee, get_TF_batch(dh['alpha4'], dh['a4'], dh['d5'], joints[:, 4]))
+    T0_ee = np.matmul(T0_ee, get_TF_batch(dh['alpha5'], dh['a5'], dh['d6'], joints[:, 5]))
+    T6_ee = get_TF_batch(dh['alpha6'], dh['a6'], dh['dG'], np.full(n, dh['thetaG'], dtype=float))
+    return np.matmul(T0_ee, T6_ee)
+
+
+def rotation_matrices_to_quaternions(R):
+    """Convert an (N, 3, 3) array of rotation matrices into (N, 4) [qx, qy, qz, qw]."""
+    r00, r11, r22 = R[:, 0, 0], R[:, 1, 1], R[:, 2, 2]
+    qw = 0.5*np.sqrt(np.maximum(0.0, 1 + r00 + r11 + r22))
+    qx = 0.5*np.sqrt(np.maximum(0.0, 1 + r00 - r11 - r22))
+    qy = 0.5*np.sqrt(np.maximum(0.0, 1 - r00 + r11 - r22))
+    qz = 0.5*np.sqrt(np.maximum(0.0, 1 - r00 - r11 + r22))
+    qx = np.copysign(qx, R[:, 2, 1] - R[:, 1, 2])
+    qy = np.copysign(qy, R[:, 0, 2] - R[:, 2, 0])
+    qz = np.copysign(qz, R[:, 1, 0] - R[:, 0, 1])
+    q = np.column_stack((qx, qy, qz, qw))
+    return q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+
+
+def rotation_matrices_to_rpy(R):
+    """
+    Convert an (N, 3, 3) array of rotation matrices into (N, 3) extrinsic
+    x-y-z (roll, pitch, yaw) angles, i.e. R = Rz(yaw) * Ry(pitch) * Rx(roll)
+    """
+    roll = np.arctan2(R[:, 2, 1], R[:, 2, 2])
+    pitch = np.arctan2(-R[:, 2, 0], np.sqrt(R[:, 0, 0]**2 + R[:, 1, 0]**2))
+    yaw = np.arctan2(R[:, 1, 0], R[:, 0, 0])
+    return np.column_stack((roll, pitch, yaw))
+
+
+def solve_fk(joints, dh=None):
+    """
+    Solve FK for a batch of joint vectors in one pass.
+    Keyword arguments:
+    joints -- (N, 6) array of joint angles
+    dh -- DH table, defaults to get_DH_Table()
+    Return values:
+    points -- (N, 3) array of EE positions
+    rpy -- (N, 3) array of EE roll, pitch, yaw
+    quaternions -- (N, 4) array of EE [qx, qy, qz, qw]
+    """
+    T0_ee = get_T0_ee(joints, dh)
+    # Go back from DH to URDF EE frame alignment
+    R_ee = np.matmul(T0_ee[:, 0:3, 0:3], R_URDF_TO_DH.T)
+    return T0_ee[:, 0:3, 3], rotation_matrices_to_rpy(R_ee), rotation_matrices_to_quaternions(R_ee)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+LRU cache of Inverse Kinematics results, keyed by quantized EE poses.
+Cached values are shared between callers and must not be modified.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+
+class IKCache:
+
+    def __init__(self, max_size=1024, position_resolution=0.0001, orientation_resolution=0.0001):
+        self.max_size = max_size
+        self.position_resolution = position_resolution
+        self.orientation_resolution = orientation_resolution
+        self.entries = OrderedDict()
+        self.parameters_key = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get_key(self, pose):
+        """
+        Quantize a [x, y, z, qx, qy, qz, qw] pose.
+        q and -q are the same orientation, so the quaternion is
+        normalized with a positive w (or first non zero component) first.
+        """
+        pose = np.asarray(pose, dtype=float)
+        quaternion = pose[3:7] / np.linalg.norm(pose[3:7])
+        non_zero = quaternion[np.round(quaternion / self.orientation_resolution) != 0]
+        if len(non_zero) and non_zero[-1] < 0:
+            quaternion = -quaternion
+        return (tuple(np.round(pose[0:3] / self.position_resolution).astype(int).tolist()) +
+                tuple(np.round(quaternion / self.orientation_resolution).astype(int).tolist()))
+
+    def check_parameters(self, *parameters):
+        """Invalidate the cache if the kinematics parameters changed since last call."""
+        parameters_key = repr(parameters)
+        with self.lock:
+            if parameters_key != self.parameters_key:
+                self.entries.clear()
+                self.parameters_key = parameters_key
+
+    def get(self, pose):
+        key = self.get_key(pose)
+        with self.lock:
+            value = self.entries.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            # Most recently used goes last
+            self.entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, pose, value):
+        key = self.get_key(pose)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_statistics(self):
+        with self.lock:
+            return {'size': len(self.entries), 'max_size': self.max_size,
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+"""
+Vectorized analytical Inverse Kinematics of the Gauss6-500 robot arm.
+
+All functions work on a whole batch of N end effector poses at once,
+given as an (N, 7) array of [x, y, z, qx, qy, qz, qw] rows.
+"""
+
+import numpy as np
+from numpy import pi
+
+from gauss_commander.kinematics.dh_table import get_DH_Table, get_TF_batch, R_URDF_TO_DH
+from gauss_commander.kinematics.forward_kinematics import solve_fk
+
+# Joint ranges reachable by the geometric IK method (lower, upper)
+IK_JOINT_LIMITS = np.array([[-pi/2,       pi/2],
+                            [-pi/2,       pi/6],
+                            [-0.26179938, pi/2],
+                            [-2.0944,   2.0944],
+                            [-1.7453,   1.7453],
+                            [-pi,           pi]])
+
+# Arm branches as (shoulder, elbow) : front/back and up/down.
+# Each one has 2 wrist solutions, so a pose has up to 8 IK solutions
+ARM_BRANCHES = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+N_BRANCHES = 2*len(ARM_BRANCHES)
+
+
+def wrap_angles(angles):
+    """Wrap angles into [-pi, pi]."""
+    return np.arctan2(np.sin(angles), np.cos(angles))
+
+
+def quaternions_to_matrices(quaternions):
+    """
+    Convert an (N, 4) array of [qx, qy, qz, qw] quaternions into
+    an (N, 3, 3) array of rotation matrices.
+    """
+    q = np.asarray(quaternions, dtype=float)
+    q = q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+
+    R = np.empty((q.shape[0], 3, 3))
+    R[:, 0, 0] = 1 - 2*(y*y + z*z)
+    R[:, 0, 1] = 2*(x*y - z*w)
+    R[:, 0, 2] = 2*(x*z + y*w)
+    R[:, 1, 0] = 2*(x*y + z*w)
+    R[:, 1, 1] = 1 - 2*(x*x + z*z)
+    R[:, 1, 2] = 2*(y*z - x*w)
+    R[:, 2, 0] = 2*(x*z - y*w)
+    R[:, 2, 1] = 2*(y*z + x*w)
+    R[:, 2, 2] = 1 - 2*(x*x + y*y)
+    return R
+
+
+def get_R_EE(poses):
+    """
+    Compute EE Rotation matrices w.r.t base frame, expressed in the DH
+    convention, from the quaternions of an (N, 7) pose array.
+    """
+    R_ee = quaternions_to_matrices(poses[:, 3:7])
+    # Account for the frame alignment error between URDF and DH params
+    return np.matmul(R_ee, R_URDF_TO_DH)
+
+
+def get_WC(dh, R_ee, poses):
+    """
+    Compute Wrist Center positions (cartesian coords) w.r.t base frame.
+    WC is a displacement from EE equal to a translation along
+    the EE z-axis of magnitude dG (Refer to DH Table)
+    """
+    return poses[:, 0:3] - dh['dG'] * R_ee[:, :, 2]
+
+
+def get_joints1_2_3(dh, Wc, shoulder=1, elbow=1):
+    """
+    Calculate joint angles 1,2,3 using geometric IK method.
+    NOTE: Joints 1,2,3 control position of WC (joint 5).
+    Unreachable wrist centers give NaN angles.
+    Keyword arguments:
+    shoulder -- 1 to face WC, -1 to reach it from behind (theta1 + pi)
+    elbow -- 1 for elbow up, -1 for elbow down
+    """
+    wcx, wcy, wcz = Wc[:, 0], Wc[:, 1], Wc[:, 2]
+
+    # theta1 is calculated by viewing joint 1 and arm from top-down
+    theta1 = np.where(np.round(wcy, 7) == 0.0, np.where(wcx < 0, pi, 0.0), np.arctan2(wcy, wcx))
+    if shoulder < 0:
+        theta1 = wrap_angles(theta1 + pi)
+
+    # theta2,3 are calculated using Cosine Law on a triangle with edges
+    # at joints 1,2 and WC viewed from side and
+    # forming angles A, B and C repectively
+    wcz_j2 = wcz - dh['d1']                              # WC z-component from j2
+    wcx_j2 = shoulder * np.sqrt(wcx**2 + wcy**2)         # WC x-component from j2
+
+    side_a = dh['d4']                                   # line segment: j3-WC
+    side_b = np.round(np.sqrt(wcx_j2**2 + wcz_j2**2), 7)  # line segment: j2-WC
+    side_c = dh['a2']                                   # link length:  j2-j3
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        angleA = np.arccos((side_b**2 + side_c**2 - side_a**2) / (2*side_b*side_c))
+        angleB = np.arccos((side_a**2 + side_c**2 - side_b**2) / (2*side_a*side_c))
+
+    theta2 = -pi/2 + elbow*angleA + np.arctan2(wcz_j2, wcx_j2)
+    theta3 = wrap_angles(elbow*angleB - pi/2)
+
+    return theta1, theta2, theta3
+
+
+def get_R0_3(dh, theta1, theta2, theta3):
+    """
+    Compose the rotations of joints 1,2,3 from their individual link transforms.
+    NOTE: theta2 is given in joint space, the 90 deg DH offset is added here
+    """
+    T0_1 = get_TF_batch(dh['alpha0'], dh['a0'], dh['d1'], theta1)
+    T1_2 = get_TF_batch(dh['alpha1'], dh['a1'], dh['d2'], theta2 + pi/2)
+    T2_3 = get_TF_batch(dh['alpha2'], dh['a2'], dh['d3'], theta3)
+    return np.matmul(np.matmul(T0_1[:, 0:3, 0:3], T1_2[:, 0:3, 0:3]), T2_3[:, 0:3, 0:3])
+
+
+def get_joints4_5_6(dh, R_ee, theta1, theta2, theta3, joint_limits=IK_JOINT_LIMITS):
+    """
+    Calculate joint Euler angles 4,5,6 using analytical IK method.
+    NOTE: Joints 4,5,6 constitute the wrist and control WC orientation
+    """
+    R0_3 = get_R0_3(dh, theta1, theta2, theta3)
+    # R3_6 = inv(R0_3) * R_ee, b/c R0_6 == R_ee = R0_3*R3_6
+    R3_6 = np.matmul(np.swapaxes(R0_3, 1, 2), R_ee)
+
+    r21 = R3_6[:, 1, 0]  # sin(theta5)*cos(theta6)
+    r22 = R3_6[:, 1, 1]  # -sin(theta5)*sin(theta6)
+    r13 = R3_6[:, 0, 2]  # -sin(theta5)*cos(theta4)
+    r23 = R3_6[:, 1, 2]  # cos(theta5)
+    r33 = R3_6[:, 2, 2]  # sin(theta4)*sin(theta5)
+
+    # Compute Euler angles theta 4,5,6 from R3_6 by individually
+    # isolating and explicitly solving each angle
+    sin_theta5 = np.sqrt(r13**2 + r33**2)
+    theta5 = np.where(np.round(sin_theta5, 5) == 0.0, 0.0, np.arctan2(sin_theta5, -r23))
+    theta4 = np.where(np.round(r33, 5) == 0.0, 0.0, np.arctan2(r33, r13))
+    theta6 = np.where(np.round(-r22, 5) == 0.0, 0.0, np.arctan2(-r22, r21))
+
+    # Keep theta4 in its range with the equivalent flipped wrist
+    with np.errstate(invalid='ignore'):
+        flip = (theta4 < joint_limits[3, 0]) | (theta4 > joint_limits[3, 1])
+    flipped_theta4, flipped_theta5, flipped_theta6 = flip_wrist(theta4, theta5, theta6)
+    theta4 = np.where(flip, flipped_theta4, theta4)
+    theta5 = np.where(flip, flipped_theta5, theta5)
+    theta6 = np.where(flip, flipped_theta6, theta6)
+
+    return theta4, theta5, theta6
+
+
+def flip_wrist(theta4, theta5, theta6):
+    """Give the other wrist solution reaching the same orientation."""
+    return wrap_angles(theta4 + pi), -theta5, wrap_angles(theta6 + pi)
+
+
+def get_valid_mask(joints, joint_limits=IK_JOINT_LIMITS):
+    """Flag solutions that are finite and inside the IK joint ranges."""
+    with np.errstate(invalid='ignore'):
+        in_range = (joints >= joint_limits[:, 0]) & (joints <= joint_limits[:, 1])
+    return np.all(np.isfinite(joints) & in_range, axis=1)
+
+
+def get_ee_errors(dh, poses, joints, valid):
+    """
+    Calculate Forward Kinematics for verifying joint angles.
+    Return values:
+    ee_errors -- (N,) distances between received EE positions and FK ones,
+                 inf for invalid solutions
+    """
+    ee_errors = np.full(len(poses), np.inf)
+    if valid.any():
+        fk_ee_points = solve_fk(joints[valid], dh)[0]
+        ee_errors[valid] = np.linalg.norm(fk_ee_points - poses[valid, 0:3], axis=1)
+    return ee_errors
+
+
+def solve_ik(poses, dh=None, joint_limits=IK_JOINT_LIMITS):
+    """
+    Solve IK for a batch of EE poses in one pass.
+    Keyword arguments:
+    poses -- (N, 7) array of [x, y, z, qx, qy, qz, qw]
+    dh -- DH table, defaults to get_DH_Table()
+    joint_limits -- (6, 2) array of IK joint ranges
+    Return values:
+    joints -- (N, 6) array of joint angles
+    valid -- (N,) boolean mask, False for unreachable or out of range poses
+    """
+    if dh is None:
+        dh = get_DH_Table()
+    poses = np.atleast_2d(np.asarray(poses, dtype=float))
+
+    R_ee = get_R_EE(poses)
+    Wc = get_WC(dh, R_ee, poses)
+
+    theta1, theta2, theta3 = get_joints1_2_3(dh, Wc)
+    theta4, theta5, theta6 = get_joints4_5_6(dh, R_ee, theta1, theta2, theta3, joint_limits)
+
+    joints = np.column_stack((theta1, theta2, theta3, theta4, theta5, theta6))
+    return joints, get_valid_mask(joints, joint_limits)
+
+
+def solve_ik_branches(poses, dh=None, joint_limits=IK_JOINT_LIMITS, fk_check_tolerance=None):
+    """
+    Enumerate all the analytic IK solutions of a batch of EE poses.
+    Keyword arguments:
+    fk_check_tolerance -- if given, also invalidate solutions whose FK position
+                          is farther than this distance (m) from the pose
+    Return values:
+    joints -- (N, N_BRANCHES, 6) array, branch 0 is the solution of solve_ik()
+    valid -- (N, N_BRANCHES) boolean mask
+    """
+    if dh is None:
+        dh = get_DH_Table()
+    poses = np.atleast_2d(np.asarray(poses, dtype=float))
+
+    R_ee = get_R_EE(poses)
+    Wc = get_WC(dh, R_ee, poses)
+
+    joints = np.empty((len(poses), N_BRANCHES, 6))
+    for b, (shoulder, elbow) in enumerate(ARM_BRANCHES):
+        theta1, theta2, theta3 = get_joints1_2_3(dh, Wc, shoulder, elbow)
+        theta4, theta5, theta6 = get_joints4_5_6(dh, R_ee, theta1, theta2, theta3, joint_limits)
+        joints[:, 2*b] = np.column_stack((theta1, theta2, theta3, theta4, theta5, theta6))
+        joints[:, 2*b + 1] = np.column_stack((theta1, theta2, theta3) + flip_wrist(theta4, theta5, theta6))
+
+    valid = get_valid_mask(joints.reshape(-1, 6), joint_limits).reshape(len(poses), N_BRANCHES)
+    if fk_check_tolerance is not None:
+        ee_errors = get_ee_errors(dh, np.repeat(poses, N_BRANCHES, axis=0), joints.reshape(-1, 6), valid.reshape(-1))
+        valid &= ee_errors.reshape(len(poses), N_BRANCHES) <= fk_check_tolerance
+    return joints, valid
+
+
+def get_joint_travel(joints, seed):
+    """
+    Cost of moving from seed to each solution of the (..., 6) joints array:
+    largest joint displacement, ties broken by the overall displacement
+    """
+    delta = np.abs(joints - seed)
+    return delta.max(axis=-1) + 0.001*np.sqrt((delta**2).sum(axis=-1))
+
+
+def select_closest_solutions(joints, valid, seed, chain=False):
+    """
+    Pick for each pose the valid IK branch closest to a seed joint vector.
+    Keyword arguments:
+    joints, valid -- IK branches given by solve_ik_branches()
+    seed -- 6 joint angles, e.g. current robot joints
+    chain -- if True, the seed of each pose is the solution of the previous
+             one (joint space continuity along a cartesian path)
+    Return values:
+    joints -- (N, 6) array, branch 0 for poses without valid branch
+    valid -- (N,) boolean mask
+    """
+    seed = np.asarray(seed, dtype=float)
+    n = joints.shape[0]
+    any_valid = valid.any(axis=1)
+
+    if not chain:
+        with np.errstate(invalid='ignore'):
+            cost = np.where(valid, get_joint_travel(joints, seed), np.inf)
+        best = np.where(any_valid, cost.argmin(axis=1), 0)
+        return joints[np.arange(n), best], any_valid
+
+    selected = joints[:, 0].copy()
+    for x in xrange(0, n):
+        if not any_valid[x]:
+            continue
+        with np.errstate(invalid='ignore'):
+            cost = np.where(valid[x], get_joint_travel(joints[x], seed), np.inf)
+        selected[x] = joints[x, cost.argmin()]
+        seed = selected[x]
+    return selected, any_valid
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+import rospy
+import numpy as np
+
+from gauss_commander.kinematics.dh_table import get_DH_Table
+from gauss_commander.kinematics.inverse_kinematics import IK_JOINT_LIMITS
+
+KINEMATICS_PARAM_NAMESPACE = "/gauss/kinematics"
+
+#
+# Optional overrides on the param server :
+#   /gauss/kinematics/dh_table        : dict, same keys as get_DH_Table()
+#   /gauss/kinematics/ik_joint_limits : list of 6 [min, max]
+#
+# Cached params are updated by the param server, so reading them
+# on every IK request is cheap
+#
+
+def get_kinematics_parameters():
+    params = rospy.get_param_cached(KINEMATICS_PARAM_NAMESPACE, {})
+
+    dh = get_DH_Table()
+    dh.update(params.get('dh_table', {}))
+
+    joint_limits = IK_JOINT_LIMITS
+    if 'ik_joint_limits' in params:
+        joint_limits = np.array(params['ik_joint_limits'], dtype=float)
+
+    return dh, joint_limits
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Time parameterized joint space motions computed without planning.
+
+All joints follow the same trapezoidal velocity profile, scaled by their
+own travel, so they start and stop together and the arm moves along a
+straight line in joint space.
+"""
+
+import rospy
+import numpy as np
+
+from moveit_msgs.msg import RobotTrajectory
+from trajectory_msgs.msg import JointTrajectoryPoint
+
+# Time between two trajectory points sent to the controller
+DEFAULT_SAMPLE_PERIOD = 0.02
+
+
+def get_trapezoidal_timing(max_velocity, max_acceleration):
+    """
+    Timing of the fastest trapezoidal profile going from 0 to 1.
+    Return values:
+    peak_velocity, acc_time, duration
+    """
+    if max_velocity**2 / max_acceleration >= 1.0:
+        # Triangular profile, max velocity is never reached
+        acc_time = np.sqrt(1.0 / max_acceleration)
+        return max_acceleration * acc_time, acc_time, 2.0 * acc_time
+    acc_time = max_velocity / max_acceleration
+    return max_velocity, acc_time, 1.0 / max_velocity + acc_time
+
+
+def get_trapezoidal_profile(max_velocity, max_acceleration, times):
+    """
+    Normalized trapezoidal profile going from 0 to 1, sampled at times.
+    Return values:
+    s, ds, dds -- (T,) arrays of position, velocity and acceleration
+    """
+    peak_velocity, acc_time, duration = get_trapezoidal_timing(max_velocity, max_acceleration)
+
+    times = np.clip(times, 0.0, duration)
+    dec_times = duration - times
+    accelerating = times < acc_time
+    decelerating = dec_times < acc_time
+
+    s = np.where(accelerating, 0.5*max_acceleration*times**2,
+                 np.where(decelerating, 1.0 - 0.5*max_acceleration*dec_times**2,
+                          peak_velocity*(times - 0.5*acc_time)))
+    ds = np.where(accelerating, max_acceleration*times,
+                  np.where(decelerating, max_acceleration*dec_times, peak_velocity))
+    dds = np.where(accelerating, max_acceleration,
+                   np.where(decelerating, -max_acceleration, 0.0))
+    return s, ds, dds
+
+
+def interpolate_joints(start, goal, max_velocities, max_accelerations, sample_period=DEFAULT_SAMPLE_PERIOD):
+    """
+    Compute a synchronized, time optimal (for a straight joint space line)
+    trajectory between two joint vectors.
+    Return values:
+    times -- (T,) array of times from start
+    positions, velocities, accelerations -- (T, n_joints) arrays
+    Return None if start and goal are the same.
+    """
+    start = np.asarray(start, dtype=float)
+    delta = np.asarray(goal, dtype=float) - start
+    travel = np.abs(delta)
+    moving = travel > 1e-9
+    if not moving.any():
+        return None
+
+    # Normalized profile limits satisfying every joint
+    max_velocity = np.min(max_velocities[moving] / travel[moving])
+    max_acceleration = np.min(max_accelerations[moving] / travel[moving])
+
+    duration = get_trapezoidal_timing(max_velocity, max_acceleration)[2]
+    n_points = int(np.ceil(duration / sample_period)) + 1
+    times = np.linspace(0.0, duration, n_points)
+    s, ds, dds = get_trapezoidal_profile(max_velocity, max_acceleration, times)
+
+    positions = start + s[:, np.newaxis] * delta
+    velocities = ds[:, np.newaxis] * delta
+    accelerations = dds[:, np.newaxis] * delta
+    # Controllers expect exact zero velocity and acceleration at both ends
+    velocities[[0, -1]] = 0.0
+    accelerations[[0, -1]] = 0.0
+    return times, positions, velocities, accelerations
+
+
+def create_robot_trajectory(joint_names, times, positions, velocities, accelerations):
+    """Pack trajectory arrays into a moveit_msgs/RobotTrajectory."""
+    trajectory = RobotTrajectory()
+    trajectory.joint_trajectory.header.stamp = rospy.Time.now()
+    trajectory.joint_trajectory.joint_names = list(joint_names)
+    for t, p, v, a in zip(times.tolist(), positions.tolist(), velocities.tolist(), accelerations.tolist()):
+        point = JointTrajectoryPoint()
+        point.positions = p
+        point.velocities = v
+        point.accelerations = a
+        point.time_from_start = rospy.Duration.from_sec(t)
+        trajectory.joint_trajectory.points.append(point)
+    return trajectory
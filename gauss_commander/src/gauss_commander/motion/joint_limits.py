@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+import rospy
+import numpy as np
+
+# Loaded by gauss_moveit_config planning_context.launch (joint_limits.yaml)
+JOINT_LIMITS_PARAM = "/robot_description_planning/joint_limits"
+
+# Same defaults as Moveit time parameterization when a joint has no limit
+DEFAULT_MAX_VELOCITY = 1.0
+DEFAULT_MAX_ACCELERATION = 1.0
+
+
+def get_joint_limits(joint_names, default_velocity=DEFAULT_MAX_VELOCITY,
+        default_acceleration=DEFAULT_MAX_ACCELERATION):
+    """
+    Read velocity and acceleration limits of joints from joint_limits.yaml
+    Keyword arguments:
+    default_velocity, default_acceleration -- limits of joints without
+        declared limit (np.inf : no limit)
+    Return values:
+    max_velocities, max_accelerations -- arrays ordered as joint_names
+    """
+    limits = rospy.get_param(JOINT_LIMITS_PARAM, {})
+
+    max_velocities = np.full(len(joint_names), default_velocity, dtype=float)
+    max_accelerations = np.full(len(joint_names), default_acceleration, dtype=float)
+    for i, name in enumerate(joint_names):
+        joint_limits = limits.get(name, {})
+        if joint_limits.get('has_velocity_limits', False):
+            max_velocities[i] = joint_limits['max_velocity']
+        if joint_limits.get('has_acceleration_limits', False):
+            max_accelerations[i] = joint_limits['max_acceleration']
+
+    return max_velocities, max_accelerations
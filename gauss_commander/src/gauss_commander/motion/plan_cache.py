@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+LRU cache of Moveit plans, keyed by (quantized start joints, target, planning parameters).
+
+Plans are stored serialized, each hit gives a new RobotTrajectory message.
+If a cache dir is given, each entry is also written to its own file, so
+the cache survives restarts.
+"""
+
+import os
+import hashlib
+import cPickle as pickle
+from collections import OrderedDict
+from StringIO import StringIO
+from threading import Lock
+
+import rospy
+import numpy as np
+
+from moveit_msgs.msg import RobotTrajectory
+
+
+class PlanCache:
+
+    def __init__(self, max_size=256, joint_resolution=0.01, cache_dir=None):
+        self.max_size = max_size
+        self.joint_resolution = joint_resolution
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+        self.base_dir = cache_dir
+        if self.base_dir is not None:
+            if self.base_dir.startswith('~'):
+                self.base_dir = os.path.expanduser(self.base_dir)
+            if not self.base_dir.endswith('/'):
+                self.base_dir += '/'
+            if not os.path.exists(self.base_dir):
+                print("Create plan cache dir " + str(self.base_dir))
+                os.makedirs(self.base_dir)
+            self.load_entries()
+
+    def quantize(self, joints):
+        return tuple(np.round(np.asarray(joints, dtype=float) / self.joint_resolution).astype(int).tolist())
+
+    def get_key(self, start, target, parameters):
+        return (self.quantize(start), self.quantize(target), repr(parameters))
+
+    def filename_from_key(self, key):
+        return hashlib.sha1(repr(key)).hexdigest() + '.plan'
+
+    def get(self, start, target, parameters, tolerance):
+        """
+        Return a cached plan going to target, if its start is within
+        tolerance of the given start joints, else None
+        """
+        key = self.get_key(start, target, parameters)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                # Most recently used goes last
+                self.entries[key] = entry
+                if np.max(np.abs(np.asarray(start, dtype=float) - entry[0])) <= tolerance:
+                    self.hits += 1
+                    self.touch_file(key)
+                    return RobotTrajectory().deserialize(entry[1])
+            self.misses += 1
+            return None
+
+    def put(self, start, target, parameters, plan):
+        key = self.get_key(start, target, parameters)
+        buff = StringIO()
+        plan.serialize(buff)
+        entry = (np.asarray(start, dtype=float), buff.getvalue())
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            self.write_file(key, entry)
+            while len(self.entries) > self.max_size:
+                old_key, _ = self.entries.popitem(last=False)
+                self.remove_file(old_key)
+
+    def clear(self):
+        with self.lock:
+            for key in self.entries.keys():
+                self.remove_file(key)
+            self.entries.clear()
+
+    def get_statistics(self):
+        with self.lock:
+            return {'size': len(self.entries), 'max_size': self.max_size,
+                    'hits': self.hits, 'misses': self.misses}
+
+    # Disk persistence : one file per entry, file mtime gives LRU order
+
+    def load_entries(self):
+        filenames = [f for f in os.listdir(self.base_dir) if f.endswith('.plan')]
+        filenames.sort(key=lambda f: os.path.getmtime(self.base_dir + f))
+        for filename in filenames:
+            try:
+                with open(self.base_dir + filename, 'rb') as f:
+                    key, start, data = pickle.load(f)
+                self.entries[key] = (np.asarray(start, dtype=float), data)
+            except Exception as e:
+                rospy.logwarn("Could not load cached plan " + filename + " : " + str(e))
+                self.remove_file_by_name(filename)
+        while len(self.entries) > self.max_size:
+            old_key, _ = self.entries.popitem(last=False)
+            self.remove_file(old_key)
+        rospy.loginfo("Plan cache - loaded " + str(len(self.entries)) + " plans from " + self.base_dir)
+
+    def write_file(self, key, entry):
+        if self.base_dir is None:
+            return
+        try:
+            with open(self.base_dir + self.filename_from_key(key), 'wb') as f:
+                pickle.dump((key, entry[0].tolist(), entry[1]), f, pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError) as e:
+            rospy.logwarn("Could not write cached plan : " + str(e))
+
+    def touch_file(self, key):
+        if self.base_dir is None:
+            return
+        try:
+            os.utime(self.base_dir + self.filename_from_key(key), None)
+        except OSError:
+            pass
+
+    def remove_file(self, key):
+        if self.base_dir is None:
+            return
+        self.remove_file_by_name(self.filename_from_key(key))
+
+    def remove_file_by_name(self, filename):
+        try:
+            os.remove(self.base_dir + filename)
+        except OSError:
+            pass
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Precomputed trajectories between saved positions.
+
+Each edge (from position name, to position name) keeps the joints of both
+positions at planning time and the trajectory as arrays. On disk, all the
+edges are packed in a single .npz file : one (P, 1 + 3*n_joints) array of
+points [time, positions, velocities, accelerations], indexed by offsets.
+"""
+
+import os
+from threading import Lock
+
+import rospy
+import numpy as np
+
+
+class RoadmapEdge:
+
+    def __init__(self, start, goal, times, positions, velocities, accelerations):
+        self.start = np.asarray(start, dtype=float)
+        self.goal = np.asarray(goal, dtype=float)
+        self.times = times
+        self.positions = positions
+        self.velocities = velocities
+        self.accelerations = accelerations
+
+    def goes_to(self, goal, tolerance):
+        """Check if edge still ends at goal joints."""
+        return np.max(np.abs(np.asarray(goal, dtype=float) - self.goal)) <= tolerance
+
+
+class Roadmap:
+
+    def __init__(self, roadmap_file=None):
+        self.joint_names = []
+        self.edges = {}
+        self.lock = Lock()
+        self.save_lock = Lock()
+
+        self.filename = roadmap_file
+        if self.filename is not None:
+            self.filename = os.path.expanduser(self.filename)
+            roadmap_dir = os.path.dirname(self.filename)
+            if not os.path.exists(roadmap_dir):
+                print("Create roadmap dir " + str(roadmap_dir))
+                os.makedirs(roadmap_dir)
+            if os.path.exists(self.filename):
+                self.load()
+
+    def get_edge(self, from_name, to_name):
+        with self.lock:
+            return self.edges.get((from_name, to_name))
+
+    def set_edge(self, from_name, to_name, edge):
+        with self.lock:
+            self.edges[(from_name, to_name)] = edge
+
+    def remove_edge(self, from_name, to_name):
+        with self.lock:
+            self.edges.pop((from_name, to_name), None)
+
+    def remove_node(self, name):
+        with self.lock:
+            for key in [k for k in self.edges if name in k]:
+                del self.edges[key]
+
+    def find_edge_to(self, to_name, start, tolerance):
+        """Edge going to to_name from joints within tolerance of start, else None."""
+        start = np.asarray(start, dtype=float)
+        with self.lock:
+            for (from_name, name), edge in self.edges.items():
+                if name == to_name and np.max(np.abs(start - edge.start)) <= tolerance:
+                    return edge
+        return None
+
+    def save(self):
+        if self.filename is None:
+            return
+        with self.save_lock:
+            self.write_file()
+
+    def write_file(self):
+        with self.lock:
+            keys = sorted(self.edges.keys())
+            edges = [self.edges[k] for k in keys]
+            joint_names = list(self.joint_names)
+        names = sorted(set(name for key in keys for name in key))
+        n_joints = len(joint_names)
+
+        offsets = np.zeros(len(edges) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e.times) for e in edges])
+        points = np.empty((offsets[-1], 1 + 3*n_joints))
+        for e, start, end in zip(edges, offsets[:-1], offsets[1:]):
+            points[start:end] = np.column_stack((e.times, e.positions, e.velocities, e.accelerations))
+
+        # Write in a temporary file first, a crash can't corrupt the roadmap
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            np.savez(f,
+                     joint_names=np.array(joint_names, dtype=str),
+                     names=np.array(names, dtype=str),
+                     edge_nodes=np.array([[names.index(a), names.index(b)] for a, b in keys],
+                                         dtype=np.int32).reshape(-1, 2),
+                     edge_joints=np.array([[e.start, e.goal] for e in edges]).reshape(-1, 2, n_joints),
+                     offsets=offsets,
+                     points=points)
+        os.rename(tmp_filename, self.filename)
+
+    def load(self):
+        try:
+            data = np.load(self.filename)
+            joint_names = data['joint_names'].tolist()
+            names = data['names'].tolist()
+            offsets = data['offsets']
+            points = data['points']
+            n_joints = len(joint_names)
+            edges = {}
+            for (a, b), (start, goal), i, j in zip(data['edge_nodes'], data['edge_joints'],
+                                                   offsets[:-1], offsets[1:]):
+                edge_points = points[i:j]
+                edges[(names[a], names[b])] = RoadmapEdge(
+                        start, goal, edge_points[:, 0],
+                        edge_points[:, 1:1 + n_joints],
+                        edge_points[:, 1 + n_joints:1 + 2*n_joints],
+                        edge_points[:, 1 + 2*n_joints:])
+        except Exception as e:
+            rospy.logwarn("Could not load roadmap " + self.filename + " : " + str(e))
+            return
+        with self.lock:
+            self.joint_names = joint_names
+            self.edges = edges
+        rospy.loginfo("Roadmap - loaded " + str(len(edges)) + " edges from " + self.filename)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Bulk quality metrics of a joint trajectory.
+
+The trajectory message is converted once into (T, n_joints) arrays, which
+can then be shared by every check run on the same trajectory.
+"""
+
+import numpy as np
+
+
+def get_trajectory_arrays(joint_trajectory):
+    """
+    Convert a trajectory_msgs/JointTrajectory into arrays.
+    Missing velocities or accelerations are filled with zeros.
+    Return values:
+    times -- (T,) array of times from start
+    positions, velocities, accelerations -- (T, n_joints) arrays
+    """
+    points = joint_trajectory.points
+    n_joints = len(points[0].positions) if points else len(joint_trajectory.joint_names)
+
+    def get_field(name):
+        values = [getattr(p, name) for p in points]
+        if not all(len(v) == n_joints for v in values):
+            return np.zeros((len(points), n_joints))
+        return np.array(values, dtype=float).reshape(len(points), n_joints)
+
+    times = np.array([p.time_from_start.to_sec() for p in points], dtype=float)
+    return times, get_field('positions'), get_field('velocities'), get_field('accelerations')
+
+
+def count_sign_changes(values):
+    """
+    Count, for each column of a (T, n) array, how many times values change
+    sign. Zeros are skipped, sign is compared with the last non zero value.
+    """
+    signs = np.sign(values)
+    if len(signs) < 2:
+        return np.zeros(signs.shape[1], dtype=int)
+    # Forward fill zeros with the last non zero sign
+    rows = np.where(signs != 0, np.arange(len(signs))[:, np.newaxis], 0)
+    rows = np.maximum.accumulate(rows, axis=0)
+    filled = signs[rows, np.arange(signs.shape[1])]
+    return np.sum(filled[1:] * filled[:-1] < 0, axis=0)
+
+
+class TrajectoryAnalysis:
+
+    # joint_trajectory None : arrays are set by from_arrays
+    def __init__(self, joint_trajectory=None):
+        if joint_trajectory is None:
+            return
+        self.joint_names = list(joint_trajectory.joint_names)
+        self.times, self.positions, self.velocities, self.accelerations = \
+            get_trajectory_arrays(joint_trajectory)
+
+    @staticmethod
+    def from_arrays(joint_names, times, positions, velocities=None, accelerations=None):
+        """Analysis of trajectory arrays, missing velocities or accelerations are zeros."""
+        analysis = TrajectoryAnalysis()
+        analysis.joint_names = list(joint_names)
+        analysis.times = times
+        analysis.positions = positions
+        analysis.velocities = velocities if velocities is not None else np.zeros(positions.shape)
+        analysis.accelerations = accelerations if accelerations is not None else np.zeros(positions.shape)
+        return analysis
+
+    def get_duration(self):
+        if len(self.times) == 0:
+            return 0.0
+        return self.times[-1]
+
+    def get_acceleration_sign_changes(self):
+        """(n_joints,) number of acceleration sign changes per joint."""
+        return count_sign_changes(self.accelerations)
+
+    def get_jerks(self):
+        """(T-1, n_joints) finite differences of accelerations."""
+        dt = np.diff(self.times)[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            jerks = np.diff(self.accelerations, axis=0) / dt
+        return np.where(dt > 0, jerks, 0.0)
+
+    def get_max_jerks(self):
+        """(n_joints,) max absolute jerk per joint."""
+        jerks = self.get_jerks()
+        if len(jerks) == 0:
+            return np.zeros(self.positions.shape[1])
+        return np.abs(jerks).max(axis=0)
+
+    def get_peak_velocity_ratios(self, max_velocities):
+        """(n_joints,) max absolute velocity per joint, as a ratio of its limit."""
+        if len(self.velocities) == 0:
+            return np.zeros(len(max_velocities))
+        return np.abs(self.velocities).max(axis=0) / np.asarray(max_velocities, dtype=float)
+
+    # see --> https://github.com/ros-planning/moveit/issues/416
+    # For each axis, velocity should go up, then down : acceleration
+    # changes sign only once
+    def is_acceleration_stable(self):
+        return bool(np.all(self.get_acceleration_sign_changes() <= 1))
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+Change the timing of already computed trajectories, without replanning.
+
+- scale : same timing law, run faster or slower
+- time optimal retiming : fastest timing of the same joint path under
+  per-joint velocity and acceleration limits
+"""
+
+import numpy as np
+
+from gauss_commander.motion.trajectory_analysis import get_trajectory_arrays
+from gauss_commander.motion.joint_interpolation import create_robot_trajectory
+
+# Max joint space distance between two points of the retimed path (rad)
+DEFAULT_PATH_STEP = 0.05
+
+# Realized velocities may exceed limits by this ratio (accelerations by about twice)
+LIMIT_TOLERANCE = 1e-3
+MAX_LIMIT_ITERATIONS = 20
+
+
+def scale_trajectory_arrays(times, velocities, accelerations, factor):
+    """
+    Run the same path factor times faster : time is divided by factor,
+    velocities multiplied by factor, accelerations by factor^2
+    """
+    return times / factor, velocities * factor, accelerations * factor**2
+
+
+def scale_robot_trajectory(robot_trajectory, factor):
+    """Return a new moveit_msgs/RobotTrajectory, factor times faster."""
+    joint_trajectory = robot_trajectory.joint_trajectory
+    times, positions, velocities, accelerations = get_trajectory_arrays(joint_trajectory)
+    times, velocities, accelerations = scale_trajectory_arrays(times, velocities, accelerations, factor)
+    return create_robot_trajectory(joint_trajectory.joint_names, times, positions, velocities, accelerations)
+
+
+def resample_path(positions, max_step=DEFAULT_PATH_STEP):
+    """
+    Remove repeated waypoints of an (N, n) path and add points between
+    waypoints, at most max_step apart. New points are on the segments
+    between waypoints : the path (checked by the planner) is not changed.
+    """
+    steps = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+    keep = np.concatenate(([True], steps > 1e-9))
+    positions = positions[keep]
+    steps = steps[keep[1:]]
+    if len(positions) < 2:
+        return positions
+
+    segment_index = np.repeat(np.arange(len(steps)), np.maximum(1, np.ceil(steps / max_step).astype(int)))
+    f = np.concatenate([np.arange(k, dtype=float) / k for k in np.bincount(segment_index)])[:, np.newaxis]
+    resampled = (1.0 - f) * positions[segment_index] + f * positions[segment_index + 1]
+    return np.vstack((resampled, positions[-1]))
+
+
+def get_path_derivatives(positions):
+    """
+    Path parameterized by joint space arc length s.
+    Return values:
+    s -- (N,) arc length of each point
+    dq, ddq -- (N, n) first and second derivatives of joints w.r.t. s
+    """
+    h = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+    s = np.concatenate(([0.0], np.cumsum(h)))
+    segment_slopes = np.diff(positions, axis=0) / h[:, np.newaxis]
+
+    dq = np.empty_like(positions)
+    dq[0] = segment_slopes[0]
+    dq[-1] = segment_slopes[-1]
+    dq[1:-1] = (positions[2:] - positions[:-2]) / (s[2:] - s[:-2])[:, np.newaxis]
+
+    ddq = np.zeros_like(positions)
+    if len(positions) > 2:
+        ddq[1:-1] = 2.0 * np.diff(segment_slopes, axis=0) / (h[1:] + h[:-1])[:, np.newaxis]
+        ddq[0] = ddq[1]
+        ddq[-1] = ddq[-2]
+    return s, dq, ddq
+
+
+def get_time_optimal_parameterization(positions, max_velocities, max_accelerations, max_speeds=None):
+    """
+    Fastest timing of a joint path under per-joint velocity and acceleration
+    limits, starting and ending at rest (TOPP by reachability analysis).
+    With x = sdot^2 and u = sddot, joint accelerations are dq*u + ddq*x.
+    max_speeds -- optional (N,) bound of sdot at each point
+    Return values:
+    times -- (N,) time of each point
+    velocities, accelerations -- (N, n) joint velocities and accelerations
+    """
+    s, dq, ddq = get_path_derivatives(positions)
+    n_points = len(s)
+    h = np.diff(s)
+    max_velocities = np.asarray(max_velocities, dtype=float)
+    max_accelerations = np.asarray(max_accelerations, dtype=float)
+
+    # Admissible u at point i for x : [-acc_range - c*x, acc_range - c*x]
+    # Joints not moving along the path only bound x
+    moving = np.abs(dq) > 1e-9
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acc_range = np.where(moving, max_accelerations / np.abs(dq), np.inf)
+        c = np.where(moving, ddq / dq, 0.0)
+
+        # Maximum velocity curve : velocity limits, still joints accelerations,
+        # and non empty range of u for every pair of joints
+        x_max = np.min(np.where(moving, (max_velocities / np.abs(dq))**2, np.inf), axis=1)
+        x_max = np.minimum(x_max, np.min(np.where(moving | (ddq == 0), np.inf,
+                                                  max_accelerations / np.abs(ddq)), axis=1))
+        pair_slope = c[:, np.newaxis, :] - c[:, :, np.newaxis]
+        pair_range = acc_range[:, np.newaxis, :] + acc_range[:, :, np.newaxis]
+        pair_bound = np.where(pair_slope > 0, pair_range / pair_slope, np.inf)
+    x_max = np.minimum(x_max, pair_bound.reshape(n_points, -1).min(axis=1))
+    if max_speeds is not None:
+        x_max = np.minimum(x_max, np.square(max_speeds))
+
+    # Backward pass : highest x at each point from which the end (at rest) is reachable.
+    # Next x = x + 2*h*u must be <= next reachable x with the lowest u,
+    # and >= 0 with the highest u
+    x_reachable = np.empty(n_points)
+    x_reachable[-1] = 0.0
+    for i in xrange(n_points - 2, -1, -1):
+        slope = 1.0 - 2.0*h[i]*c[i]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bounds = np.where(slope > 0, (x_reachable[i + 1] + 2.0*h[i]*acc_range[i]) / slope,
+                              2.0*h[i]*acc_range[i] / -slope)
+        x_reachable[i] = max(0.0, min(x_max[i], bounds.min()))
+
+    # Forward pass : max acceleration, staying under the reachable curve
+    x = np.empty(n_points)
+    u = np.zeros(n_points)
+    x[0] = 0.0
+    for i in xrange(0, n_points - 1):
+        u_max = np.min(acc_range[i] - c[i]*x[i])
+        x[i + 1] = min(max(0.0, x[i] + 2.0*h[i]*u_max), x_reachable[i + 1])
+        u[i] = (x[i + 1] - x[i]) / (2.0*h[i])
+    # Stop with the last deceleration, if admissible at rest
+    u[-1] = max(u[-2], -np.min(acc_range[-1]))
+
+    sdot = np.sqrt(x)
+    dt = 2.0*h / np.maximum(sdot[:-1] + sdot[1:], 1e-9)
+    times = np.concatenate(([0.0], np.cumsum(dt)))
+    velocities = dq * sdot[:, np.newaxis]
+    accelerations = dq * u[:, np.newaxis] + ddq * x[:, np.newaxis]
+    return times, velocities, accelerations
+
+
+def get_realized_derivatives(dt, positions):
+    """
+    Derivatives of an (N, n) path timed with durations dt (N-1,) between
+    points, by finite differences, at rest at both ends.
+    Return values:
+    segment_velocities -- (N-1, n) mean velocity of each segment
+    velocities, accelerations -- (N, n) joint velocities and accelerations
+    """
+    n_joints = positions.shape[1]
+    segment_velocities = np.diff(positions, axis=0) / dt[:, np.newaxis]
+    padded_velocities = np.vstack((np.zeros(n_joints), segment_velocities, np.zeros(n_joints)))
+    padded_dt = np.concatenate(([0.0], dt, [0.0]))
+    velocities = (padded_velocities[:-1] + padded_velocities[1:]) / 2.0
+    velocities[0] = velocities[-1] = 0.0
+    accelerations = np.diff(padded_velocities, axis=0) / ((padded_dt[:-1] + padded_dt[1:]) / 2.0)[:, np.newaxis]
+    return segment_velocities, velocities, accelerations
+
+
+def get_limit_ratios(dt, positions, max_velocities, max_accelerations):
+    """
+    Per point factor (>= 1) by which the speed at each point must decrease
+    for realized velocities and accelerations to be within limits
+    (accelerations decrease as the square of the speed).
+    """
+    segment_velocities, velocities, accelerations = get_realized_derivatives(dt, positions)
+    segment_ratios = np.max(np.abs(segment_velocities) / max_velocities, axis=1)
+    velocity_ratios = np.maximum(np.concatenate(([0.0], segment_ratios)), np.concatenate((segment_ratios, [0.0])))
+    acceleration_ratios = np.sqrt(np.max(np.abs(accelerations) / max_accelerations, axis=1))
+    return np.maximum(1.0, np.maximum(velocity_ratios, acceleration_ratios))
+
+
+def get_limited_timing(positions, max_velocities, max_accelerations):
+    """
+    Time optimal durations (N-1,) between points of a path, with finite
+    difference velocities and accelerations within limits. The time optimal
+    parameterization bounds derivatives of the sampled path only up to
+    discretization errors, higher at corners : speed is lowered where
+    limits are exceeded, and the parameterization computed again.
+    """
+    max_velocities = np.asarray(max_velocities, dtype=float)
+    max_accelerations = np.asarray(max_accelerations, dtype=float)
+    dq = get_path_derivatives(positions)[1]
+    max_speeds = np.full(len(positions), np.inf)
+    for _ in xrange(MAX_LIMIT_ITERATIONS):
+        times, velocities = get_time_optimal_parameterization(
+                positions, max_velocities, max_accelerations, max_speeds)[:2]
+        dt = np.diff(times)
+        ratios = get_limit_ratios(dt, positions, max_velocities, max_accelerations)
+        if ratios.max() <= 1.0 + LIMIT_TOLERANCE:
+            return dt
+        # Acceleration at a point depends on velocities of both segments around
+        # it : its neighbors are slowed down too, slightly more than needed so
+        # that iterations converge quickly
+        factors = np.where(ratios > 1.0 + LIMIT_TOLERANCE, ratios * (1.0 + LIMIT_TOLERANCE), 1.0)
+        factors = np.maximum(factors, np.maximum(np.concatenate((factors[1:], [1.0])),
+                                                 np.concatenate(([1.0], factors[:-1]))))
+        speeds = np.max(np.abs(velocities), axis=1) / np.max(np.abs(dq), axis=1)
+        max_speeds = np.where(factors > 1.0, np.minimum(max_speeds, speeds / factors), max_speeds)
+    # Not converged : slow down the whole path, keeping the shape of its timing
+    return dt * get_limit_ratios(dt, positions, max_velocities, max_accelerations).max()
+
+
+def retime_robot_trajectory(robot_trajectory, max_velocities, max_accelerations, max_step=DEFAULT_PATH_STEP):
+    """
+    Return a new moveit_msgs/RobotTrajectory following the same joint path
+    as fast as the given limits allow.
+    """
+    joint_trajectory = robot_trajectory.joint_trajectory
+    positions = get_trajectory_arrays(joint_trajectory)[1]
+    plan = retime_path(joint_trajectory.joint_names, positions, max_velocities, max_accelerations, max_step)
+    if plan is None:
+        return robot_trajectory
+    return plan
+
+
+def retime_path(joint_names, positions, max_velocities, max_accelerations, max_step=DEFAULT_PATH_STEP):
+    """
+    Time optimal moveit_msgs/RobotTrajectory going through the waypoints of
+    an (N, n) joint path, None if the path has less than 2 distinct points.
+    Path is followed segment by segment, every waypoint is kept, and the
+    given velocities and accelerations are the realized ones.
+    """
+    positions = resample_path(np.asarray(positions, dtype=float), max_step)
+    if len(positions) < 2:
+        return None
+    dt = get_limited_timing(positions, max_velocities, max_accelerations)
+    times = np.concatenate(([0.0], np.cumsum(dt)))
+    velocities, accelerations = get_realized_derivatives(dt, positions)[1:]
+    return create_robot_trajectory(joint_names, times, positions, velocities, accelerations)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Follow the execution of a planned trajectory from measured joints.
+
+Each sample of measured joints is projected on the planned path (segments
+between trajectory points), which gives :
+- progress : planned time at the projected point, as percent of duration
+- lag : elapsed time minus planned time at the projected point. The robot
+  is stalled when it keeps lagging behind the plan
+- deviation : distance from the planned path. The robot deviates when it
+  stays too far from the path for several samples
+"""
+
+import numpy as np
+
+
+class TrajectoryTracker:
+
+    def __init__(self, times, positions, max_lag=0.5, max_deviation=0.1, deviation_samples=3):
+        """
+        Keyword arguments:
+        times -- (T,) planned times from start
+        positions -- (T, n_joints) planned joints
+        max_lag -- (s) max delay behind the plan
+        max_deviation -- (rad) max joint distance to the planned path
+        deviation_samples -- consecutive samples over max_deviation before failure
+        """
+        self.times = np.asarray(times, dtype=float)
+        self.positions = np.asarray(positions, dtype=float)
+        self.max_lag = max_lag
+        self.max_deviation = max_deviation
+        self.deviation_samples = deviation_samples
+
+        self.segment_starts = self.positions[:-1]
+        self.segments = np.diff(self.positions, axis=0)
+        self.segment_lengths2 = np.sum(self.segments**2, axis=1)
+
+        # Projection never goes back on the path
+        self.segment_index = 0
+        self.deviation_count = 0
+        self.progress = 0.0
+        self.eta = self.get_duration()
+        self.lag = 0.0
+        self.deviation = 0.0
+        self.tracking_error = 0.0
+
+    def get_duration(self):
+        return self.times[-1]
+
+    def get_expected_positions(self, t):
+        """Planned joints at time t, linearly interpolated between points."""
+        i = np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, len(self.times) - 2)
+        dt = self.times[i + 1] - self.times[i]
+        f = np.clip((t - self.times[i]) / dt, 0.0, 1.0) if dt > 0 else 1.0
+        return self.positions[i] + f * (self.positions[i + 1] - self.positions[i])
+
+    def project(self, t, joints):
+        """
+        Closest point of the path from joints, from the current segment on,
+        up to the segments planned to start at most max_lag after t : the
+        robot is not ahead of the plan, and a path coming back near an
+        earlier configuration must not be projected on its later segments.
+        Return values:
+        segment index, fraction of the segment, distance
+        """
+        end = max(self.segment_index + 1,
+                  np.searchsorted(self.times[:-1], t + self.max_lag, side='right'))
+        starts = self.segment_starts[self.segment_index:end]
+        segments = self.segments[self.segment_index:end]
+        lengths2 = self.segment_lengths2[self.segment_index:end]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f = np.where(lengths2 > 0, np.sum((joints - starts) * segments, axis=1) / lengths2, 0.0)
+        f = np.clip(f, 0.0, 1.0)
+        distances = np.linalg.norm(starts + f[:, np.newaxis] * segments - joints, axis=1)
+        k = np.argmin(distances)
+        return self.segment_index + k, f[k], distances[k]
+
+    def update(self, t, joints):
+        """
+        Update tracking with joints measured t seconds after the start.
+        Return values:
+        None, or a message if the robot stalls or deviates from the path
+        """
+        joints = np.asarray(joints, dtype=float)
+        if len(self.segments) == 0:
+            return None
+        i, f, distance = self.project(t, joints)
+        self.segment_index = i
+        planned_time = self.times[i] + f * (self.times[i + 1] - self.times[i])
+
+        duration = self.get_duration()
+        self.progress = 100.0 * planned_time / duration if duration > 0 else 100.0
+        self.eta = duration - planned_time
+        self.lag = t - planned_time
+        self.deviation = distance
+        self.tracking_error = np.max(np.abs(joints - self.get_expected_positions(t)))
+
+        if distance > self.max_deviation:
+            self.deviation_count += 1
+            if self.deviation_count >= self.deviation_samples:
+                return "robot deviates from the planned path (" + str(round(distance, 3)) + " rad)"
+        else:
+            self.deviation_count = 0
+
+        # Close to the end, the controller checks goal tolerances itself
+        at_end = (self.eta < self.max_lag and
+                  np.linalg.norm(joints - self.positions[-1]) <= self.max_deviation)
+        if not at_end and self.lag > self.max_lag:
+            return "robot is stalled, " + str(round(self.lag, 2)) + " s behind the plan"
+        return None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Join the joint paths going through a list of waypoints into one path, so
+that the whole motion is timed and executed at once, without stopping at
+each waypoint.
+
+With a blend radius, the points of the path closer than this radius
+(joint space distance, rad) to an intermediate waypoint are removed : the
+path cuts the corner instead of going exactly through the waypoint.
+"""
+
+import numpy as np
+
+
+def get_blend_radius(path, next_path, blend_radius):
+    """
+    Blend radius around the waypoint between path and next_path, limited
+    to half of both segments, so that blends of consecutive waypoints
+    don't overlap.
+    """
+    length = np.linalg.norm(path[-1] - path[0])
+    next_length = np.linalg.norm(next_path[-1] - next_path[0])
+    return min(blend_radius, 0.5 * length, 0.5 * next_length)
+
+
+def blend_paths(paths, blend_radius=0.0):
+    """
+    Keyword arguments:
+    paths -- list of (N_i, n) joint paths, each one starting where the
+             previous one ends
+    blend_radius -- joint space distance (rad) around intermediate waypoints
+    Return values:
+    (N, n) joint path going through (or close to) every waypoint
+    """
+    paths = [np.asarray(path, dtype=float) for path in paths]
+    kept = [np.ones(len(path), dtype=bool) for path in paths]
+
+    for i in xrange(0, len(paths) - 1):
+        waypoint = paths[i][-1]
+        radius = get_blend_radius(paths[i], paths[i + 1], blend_radius)
+        # End of path i and start of path i+1 are the same point
+        kept[i + 1][0] = False
+        if radius <= 0.0:
+            continue
+        # Path start and end are kept, the waypoint itself is removed
+        far = np.linalg.norm(paths[i] - waypoint, axis=1) > radius
+        far[0] = True
+        kept[i] &= far
+        far = np.linalg.norm(paths[i + 1] - waypoint, axis=1) > radius
+        far[-1] = True
+        kept[i + 1] &= far
+
+    return np.vstack([path[keep] for path, keep in zip(paths, kept)])
@@ -2,6 +2,20 @@
 
 import rospy
 import moveit_commander
+import threading
+import time
+import Queue
+
+from moveit_msgs.msg import MotionPlanRequest, Constraints, JointConstraint, MoveItErrorCodes
+from moveit_msgs.srv import GetMotionPlan
+
+from gauss_commander.motion.trajectory_analysis import TrajectoryAnalysis
+from gauss_commander.motion.joint_limits import get_joint_limits
+from gauss_commander.motion.plan_cache import PlanCache
+
+# Planners tried first in parallel planning mode, when available for the group
+DEFAULT_PARALLEL_PLANNER_IDS = ['RRTConnectkConfigDefault', 'BKPIECEkConfigDefault',
+                                'KPIECEkConfigDefault', 'RRTkConfigDefault']
 
 
 class MoveGroupArm: 
@@ -14,6 +28,11 @@ class MoveGroupArm:
         goal_joint_tolerance       = rospy.get_param("~goal_joint_tolerance")
         goal_position_tolerance    = rospy.get_param("~goal_position_tolerance")
         goal_orientation_tolerance = rospy.get_param("~goal_orientation_tolerance")
+        self.parallel_planning     = rospy.get_param("~parallel_planning", False)
+        parallel_planning_attempts = rospy.get_param("~parallel_planning_attempts", 4)
+        plan_cache_enabled         = rospy.get_param("~plan_cache", False)
+        plan_cache_size            = rospy.get_param("~plan_cache_size", 256)
+        plan_cache_dir             = rospy.get_param("~plan_cache_dir", "")
 
         # set log
         self.gauss_ros_logger = logger
@@ -43,6 +62,28 @@ class MoveGroupArm:
         self.arm.set_goal_joint_tolerance(goal_joint_tolerance)
         self.arm.set_goal_position_tolerance(goal_position_tolerance)
         self.arm.set_goal_orientation_tolerance(goal_orientation_tolerance)
+        self.goal_joint_tolerance = goal_joint_tolerance
+        self.velocity_scaling_factor = 1.0
+        self.max_velocities, self.max_accelerations = get_joint_limits(self.arm.get_active_joints())
+
+        # Parallel planning : same request sent concurrently to several planners
+        # (or several times to the same one, with different random seeds)
+        self.joint_target = None
+        self.planning_statistics = {}
+        available_planner_ids = rospy.get_param(
+                "/move_group/" + move_group_commander_name + "/planner_configs", [])
+        planner_ids = rospy.get_param("~parallel_planner_ids",
+                [p for p in DEFAULT_PARALLEL_PLANNER_IDS if p in available_planner_ids])
+        if not planner_ids:
+            planner_ids = [""] # move_group default planner
+        self.parallel_planner_ids = [planner_ids[i % len(planner_ids)]
+                for i in range(0, parallel_planning_attempts)]
+        self.plan_kinematic_path = rospy.ServiceProxy('/plan_kinematic_path', GetMotionPlan)
+
+        # Plans of already done moves, reused when starting from the same state
+        self.plan_cache = None
+        if plan_cache_enabled:
+            self.plan_cache = PlanCache(plan_cache_size, cache_dir=(plan_cache_dir or None))
 
         rospy.loginfo("Successfully connected to move_group." +
                 "\n" + "Started group     : " + str(self.arm.get_name()) + 
@@ -59,8 +100,41 @@ class MoveGroupArm:
     """
     
     def compute_plan(self):
+        use_cache = self.plan_cache is not None and self.joint_target is not None
+        if use_cache:
+            plan = self.plan_cache.get(self.get_current_joint_values(), self.joint_target,
+                    self.get_planning_parameters(), self.goal_joint_tolerance)
+            if plan is not None:
+                rospy.loginfo("Plan cache - reuse cached plan")
+                self.planning_statistics = {'attempts': 0, 'completed_attempts': 0,
+                        'wasted_attempts': 0, 'planning_time': 0.0}
+                return plan
+
+        # Parallel planning needs a joint target to build requests
+        if self.parallel_planning and self.joint_target is not None:
+            plan = self.compute_plan_parallel()
+        else:
+            plan = self.compute_plan_serial()
+
+        # Only cache plans passing the acceleration check
+        if use_cache and plan is not None and self.check_trajectory(plan):
+            self.plan_cache.put(plan.joint_trajectory.points[0].positions, self.joint_target,
+                    self.get_planning_parameters(), plan)
+        return plan
+
+    # Parameters changing the plan computed for a given start and target
+    def get_planning_parameters(self):
+        return (self.goal_joint_tolerance, self.velocity_scaling_factor)
+
+    def set_max_velocity_scaling_factor(self, factor):
+        self.arm.set_max_velocity_scaling_factor(factor)
+        self.velocity_scaling_factor = factor
+
+    def compute_plan_serial(self):
+        start_time = time.time()
         trajectory_found_but_not_correct = True
         plan_counter = 0
+        next_plan = None
 
         while trajectory_found_but_not_correct:
             plan = self.arm.plan()
@@ -68,7 +142,7 @@ class MoveGroupArm:
 
             if not plan.joint_trajectory.points:
                 self.gauss_ros_logger.publish_log_status("ERROR", "no plan joint_trajectory points.")
-                return None 
+                break
             else:
                 if self.check_trajectory(plan):
                     trajectory_found_but_not_correct = False
@@ -87,8 +161,120 @@ class MoveGroupArm:
                     self.gauss_ros_logger.publish_log_status("WARNING", "Moveit trajectory has been found, but acceleration is not stable.")
                     self.gauss_ros_logger.publish_log_status("WARNING", "Computing another trajectory...")
 
+        # Same statistics as compute_plan_parallel
+        wasted_attempts = plan_counter - 1 if next_plan is not None else plan_counter
+        self.planning_statistics = {'attempts': plan_counter, 'completed_attempts': plan_counter,
+                'wasted_attempts': wasted_attempts, 'planning_time': time.time() - start_time}
         return(next_plan)
 
+    # start_joints : plan from these joints instead of current robot state
+    def get_motion_plan_request(self, planner_id, joint_target, start_joints=None, velocity_scaling_factor=1.0):
+        request = MotionPlanRequest()
+        request.group_name = self.arm.get_name()
+        request.planner_id = planner_id
+        request.num_planning_attempts = 1
+        request.allowed_planning_time = self.arm.get_planning_time()
+        request.max_velocity_scaling_factor = velocity_scaling_factor
+        request.start_state.is_diff = True
+        if start_joints is not None:
+            request.start_state.joint_state.name = self.arm.get_active_joints()
+            request.start_state.joint_state.position = list(start_joints)
+        request.workspace_parameters.header.frame_id = self.arm.get_planning_frame()
+        request.workspace_parameters.min_corner.x = -1.0
+        request.workspace_parameters.min_corner.y = -1.0
+        request.workspace_parameters.min_corner.z = -1.0
+        request.workspace_parameters.max_corner.x = 1.0
+        request.workspace_parameters.max_corner.y = 1.0
+        request.workspace_parameters.max_corner.z = 1.0
+
+        goal = Constraints()
+        for name, position in zip(self.arm.get_active_joints(), joint_target):
+            constraint = JointConstraint()
+            constraint.joint_name = name
+            constraint.position = position
+            constraint.tolerance_above = self.goal_joint_tolerance
+            constraint.tolerance_below = self.goal_joint_tolerance
+            constraint.weight = 1.0
+            goal.joint_constraints.append(constraint)
+        request.goal_constraints.append(goal)
+        return request
+
+    def request_plan(self, request, results):
+        plan = None
+        try:
+            response = self.plan_kinematic_path(request).motion_plan_response
+            if response.error_code.val == MoveItErrorCodes.SUCCESS and response.trajectory.joint_trajectory.points:
+                plan = response.trajectory
+        except rospy.ServiceException, e:
+            rospy.logwarn("Planning attempt failed with " + str(request.planner_id) + " : " + str(e))
+        results.put((request.planner_id, plan))
+
+    # Plan between any two joint states, e.g. for trajectories computed in advance.
+    # Retry like compute_plan_serial(), but only return a plan with stable acceleration.
+    # check_stability=False when only the path is used, and timed afterwards
+    def compute_plan_between(self, start_joints, joint_target, max_tries=10, check_stability=True):
+        request = self.get_motion_plan_request("", joint_target, start_joints)
+        results = Queue.Queue()
+        for _ in range(0, max_tries):
+            self.request_plan(request, results)
+            plan = results.get()[1]
+            if plan is None:
+                return None
+            if not check_stability or self.check_trajectory(plan):
+                return plan
+        return None
+
+    # Speculative planning : all attempts run at the same time, the first
+    # plan passing check_trajectory wins and other results are dropped.
+    # NOTE: move_group can't interrupt a running planner, abandoned attempts
+    # only stop when their allowed planning time is over
+    def compute_plan_parallel(self):
+        start_time = time.time()
+        results = Queue.Queue()
+        for planner_id in self.parallel_planner_ids:
+            request = self.get_motion_plan_request(planner_id, self.joint_target,
+                    velocity_scaling_factor=self.velocity_scaling_factor)
+            t = threading.Thread(target=self.request_plan, args=(request, results))
+            t.daemon = True
+            t.start()
+
+        # Each attempt is bounded by planning time, a margin is left for time parameterization
+        timeout = self.arm.get_planning_time() + 1.0
+        attempts = len(self.parallel_planner_ids)
+        completed = 0
+        next_plan = None
+        fallback_plan = None
+        while completed < attempts:
+            try:
+                planner_id, plan = results.get(timeout=max(0.0, start_time + timeout - time.time()))
+            except Queue.Empty:
+                break
+            completed += 1
+            if plan is None:
+                continue
+            if self.check_trajectory(plan):
+                next_plan = plan
+                break
+            if fallback_plan is None:
+                fallback_plan = plan
+
+        if next_plan is None and fallback_plan is not None:
+            rospy.logwarn("Moveit trajectory has been found, but acceleration is not stable.")
+            rospy.logwarn("No stable trajectory from parallel planning, execute trajectory...")
+            self.gauss_ros_logger.publish_log_status("WARNING", "Moveit trajectory has been found, but acceleration is not stable.")
+            next_plan = fallback_plan
+        elif next_plan is None:
+            self.gauss_ros_logger.publish_log_status("ERROR", "no plan joint_trajectory points.")
+        else:
+            rospy.loginfo("Parallel planning - plan found by " + str(planner_id))
+
+        wasted_attempts = attempts - 1 if next_plan is not None else attempts
+        self.planning_statistics = {'attempts': attempts, 'completed_attempts': completed,
+                'wasted_attempts': wasted_attempts, 'planning_time': time.time() - start_time}
+        rospy.loginfo("Parallel planning - " + str(wasted_attempts) + "/" + str(attempts) +
+                " attempts wasted, planning time : " + str(self.planning_statistics['planning_time']))
+        return next_plan
+
     # see --> https://github.com/ros-planning/moveit/issues/416
     # Sometimes (on Kinetic) the trajectory will slow down, one or multiple
     # times, at any moment. Here we check if there are some variations in 
@@ -96,26 +282,12 @@ class MoveGroupArm:
     # then down (correct case). If yes, we should retry to compute the traj
     
     def check_trajectory(self, plan):
-        for i in range(0,6):
-            accs = []
-            for point in plan.joint_trajectory.points:
-                accs.append(point.accelerations[i]) 
-
-            sign_change_counter = 0
-            last_acc = accs[1] # accs[0] is 0.0
-
-            for acc in accs:
-                if (acc == 0.0):
-                    pass
-                else:
-                    if (acc < 0.0 and last_acc > 0.0) or (acc > 0.0 and last_acc < 0.0):
-                        sign_change_counter += 1
-                    last_acc = acc
-
-            if sign_change_counter > 1:
-                return False
-            #rospy.loginfo("Sign change counter : " + str(sign_change_counter))
-        return True
+        analysis = TrajectoryAnalysis(plan.joint_trajectory)
+        rospy.logdebug("Trajectory duration : " + str(analysis.get_duration()) +
+                ", sign changes : " + str(analysis.get_acceleration_sign_changes().tolist()) +
+                ", max jerks : " + str(analysis.get_max_jerks().tolist()) +
+                ", peak velocity ratios : " + str(analysis.get_peak_velocity_ratios(self.max_velocities).tolist()))
+        return analysis.is_acceleration_stable()
 
     def execute(self, plan, wait=False):
         self.arm.execute(plan, wait=wait)
@@ -123,21 +295,33 @@ class MoveGroupArm:
     def stop(self):
         self.arm.stop()
 
+    def get_active_joints(self):
+        return self.arm.get_active_joints()
+
+    def get_current_joint_values(self):
+        return self.arm.get_current_joint_values()
+
     def set_joint_value_target(self, joint_array):
         self.arm.set_joint_value_target(joint_array)
+        self.joint_target = list(joint_array)
 
     def set_position_target(self, x, y, z):
+        self.joint_target = None
         self.arm.set_position_target([x, y, z], self.end_effector_link)
 
     def set_rpy_target(self, roll, pitch, yaw):
+        self.joint_target = None
         self.arm.set_rpy_target([roll, pitch, yaw], self.end_effector_link)
  
     def set_pose_target(self, x, y, z, roll, pitch, yaw):
+        self.joint_target = None
         self.arm.set_pose_target([x, y, z, roll, pitch, yaw], self.end_effector_link)
         
     def set_pose_quat_target(self, pose):
+        self.joint_target = None
         self.arm.set_pose_target(pose, self.end_effector_link)
 
     def set_shift_pose_target(self, axis_number, value):
+        self.joint_target = None
         self.arm.shift_pose_target(axis_number, value, self.end_effector_link)
 
@@ -3,40 +3,21 @@
 import rospy 
 import tf 
 from gauss_commander.position.position import Position 
-
-from moveit_msgs.msg import RobotState
-from moveit_msgs.srv import GetPositionFK
-from std_msgs.msg import Header
+from gauss_commander.kinematics.forward_kinematics import solve_fk
 
 
 def get_forward_kinematic(joints): 
-
+    # Closed-form FK from the DH table, no call to Moveit compute_fk service
     try:
-	  rospy.wait_for_service('compute_fk',2)
-    except (rospy.ServiceException, rospy.ROSException), e:
-          rospy.logerr("Service call failed:",e)
-          return None 
-    try:
-	  moveit_fk = rospy.ServiceProxy('compute_fk', GetPositionFK)
-	  fk_link= ['base_link','link6']
-    	  joint_names = ['joint1','joint2','joint3','joint4','joint5','joint6']
-    	  header = Header(0,rospy.Time.now(),"/base_link")
-    	  rs = RobotState()
-          rs.joint_state.name = joint_names
-          rs.joint_state.position = joints
-          response = moveit_fk(header, fk_link, rs)
-    except rospy.ServiceException,e:
-          rospy.logerr("Service call failed:",e)
-	  return(None)
-
-    quaternion=[response.pose_stamped[1].pose.orientation.x, response.pose_stamped[1].pose.orientation.y, 
-	response.pose_stamped[1].pose.orientation.z, response.pose_stamped[1].pose.orientation.w]
-    rpy = get_rpy_from_quaternion(quaternion)
-    quaternion = Position.Quaternion(round(quaternion[0],3), round(quaternion[1],3), round(quaternion[2],3),
-	round(quaternion[3],3))
-    point = Position.Point(round(response.pose_stamped[1].pose.position.x,3), round(response.pose_stamped[1].pose.position.y,3),
-	 round(response.pose_stamped[1].pose.position.z,3))
-    rpy=Position.RPY(round(rpy[0],3),round(rpy[1],3),round(rpy[2],3))
+        (points, rpy, quaternions) = solve_fk([joints])
+    except ValueError as e:
+        rospy.logerr("Forward kinematic failed : " + str(e))
+        return None
+
+    quaternion = Position.Quaternion(round(quaternions[0, 0], 3), round(quaternions[0, 1], 3),
+        round(quaternions[0, 2], 3), round(quaternions[0, 3], 3))
+    point = Position.Point(round(points[0, 0], 3), round(points[0, 1], 3), round(points[0, 2], 3))
+    rpy = Position.RPY(round(rpy[0, 0], 3), round(rpy[0, 1], 3), round(rpy[0, 2], 3))
     rospy.loginfo("kinematic forward has been calculated ") 
     return(point, rpy, quaternion)
 
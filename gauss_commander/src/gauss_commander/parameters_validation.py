@@ -1,48 +1,96 @@
 #!/usr/bin/env python
 
 import rospy 
+import numpy as np
 from math import sqrt 
 from gauss_commander.robot_commander_exception import RobotCommanderException
 from gauss_commander.command_status import CommandStatus
+from gauss_commander.motion.trajectory_analysis import TrajectoryAnalysis
+from gauss_commander.motion.joint_limits import get_joint_limits
+
+JOINT_KEYS = ['j1', 'j2', 'j3', 'j4', 'j5', 'j6']
+
+# Margin over velocity and acceleration limits, for rounding of time
+# parameterization
+MOTION_LIMITS_TOLERANCE = 0.01
 
 class ParametersValidation(): 
 
     def __init__(self, validation):
         self.validation = validation 
+        v = self.validation['joint_limits']
+        self.joint_min = np.array([v[key]['min'] for key in JOINT_KEYS], dtype=float)
+        self.joint_max = np.array([v[key]['max'] for key in JOINT_KEYS], dtype=float)
+        # (max_velocities, max_accelerations) for each list of joint names.
+        # Only limits declared in joint_limits.yaml are checked (no default limit)
+        self.motion_limits = {}
    
+    def get_motion_limits(self, joint_names):
+        if len(joint_names) != len(JOINT_KEYS):
+            joint_names = ['joint' + str(i + 1) for i in range(len(JOINT_KEYS))]
+        key = tuple(joint_names)
+        if key not in self.motion_limits:
+            self.motion_limits[key] = get_joint_limits(joint_names, np.inf, np.inf)
+        return self.motion_limits[key]
+
+    def get_limits_key(self, joint_names):
+        """Limits a trajectory of joint_names is checked against, to know if they change."""
+        max_velocities, max_accelerations = self.get_motion_limits(joint_names)
+        return (tuple(self.joint_min), tuple(self.joint_max), tuple(max_velocities),
+                tuple(max_accelerations), MOTION_LIMITS_TOLERANCE)
+
+    def find_trajectory_violation(self, analysis):
+        """
+        Check all points of a trajectory at once against joint position,
+        velocity and acceleration limits.
+        Return values:
+        None, or (point index, joint index, message) of the first violation
+        """
+        positions = analysis.positions
+        if len(positions) == 0:
+            return None
+        if positions.shape[1] != len(JOINT_KEYS):
+            return 0, 0, "Joint array must have 6 joints"
+        max_velocities, max_accelerations = self.get_motion_limits(analysis.joint_names)
+
+        out_of_range = (positions < self.joint_min) | (positions > self.joint_max)
+        too_fast = np.abs(analysis.velocities) > max_velocities * (1.0 + MOTION_LIMITS_TOLERANCE)
+        too_accelerated = np.abs(analysis.accelerations) > max_accelerations * (1.0 + MOTION_LIMITS_TOLERANCE)
+        violations = out_of_range | too_fast | too_accelerated
+        if not violations.any():
+            return None
+
+        # First point, then first joint
+        i, j = np.unravel_index(np.argmax(violations), violations.shape)
+        name = "joint " + str(j + 1)
+        if out_of_range[i, j]:
+            message = name + " not in range ( " + str(self.joint_min[j]) + " , " + str(self.joint_max[j]) + " )"
+        elif too_fast[i, j]:
+            message = name + " velocity over limit ( " + str(round(max_velocities[j], 4)) + " )"
+        else:
+            message = name + " acceleration over limit ( " + str(round(max_accelerations[j], 4)) + " )"
+        return i, j, message
           
-    def validate_trajectory(self, plan):
+    # analysis : TrajectoryAnalysis of the plan, if already computed
+    def validate_trajectory(self, plan, analysis=None):
         rospy.loginfo("Checking trajectory validity")
-        #Do soemthing here to check if the trajectory is valid
-        n =len(plan.trajectory.joint_trajectory.points)
-        for i in range(0,n-1): 
-            self.validate_joints(plan.trajectory.joint_trajectory.points[i].positions)
-        
-       
+        if analysis is None:
+            analysis = TrajectoryAnalysis(plan.trajectory.joint_trajectory)
+        violation = self.find_trajectory_violation(analysis)
+        if violation is not None:
+            i, j, message = violation
+            raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS,
+                    "Trajectory point " + str(i) + " : " + message)
     
     def validate_joints(self, joint_array):
-        v = self.validation['joint_limits']
-
         if len(joint_array) != 6:
             raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS, "Joint array must have 6 joints")
-        if( joint_array[0] < v['j1']['min'] or joint_array[0] > v['j1']['max']):
-            raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS, 
-                    "joint 1 not in range ( " + str(v['j1']['min']) + " , " + str(v['j1']['max']) + " )")
-        if( joint_array[1] < v['j2']['min'] or joint_array[1] > v['j2']['max']):
-            raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS,
-                    "joint 2 not in range ( " + str(v['j2']['min']) + " , " + str(v['j2']['max']) + " )")
-        if( joint_array[2] < v['j3']['min'] or joint_array[2] > v['j3']['max']):
-            raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS,
-                    "joint 3 not in range ( " + str(v['j3']['min']) + " , " + str(v['j3']['max']) + " )")
-        if( joint_array[3] < v['j4']['min'] or joint_array[3] > v['j4']['max']):
-            raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS, 
-                    "joint 4 not in range ( " + str(v['j4']['min']) + " , " + str(v['j4']['max']) + " )")
-        if( joint_array[4] < v['j5']['min'] or joint_array[4] > v['j5']['max']):
-            raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS,
-                    "joint 5 not in range ( " + str(v['j5']['min']) + " , " + str(v['j5']['max']) + " )")
-        if( joint_array[5] < v['j6']['min'] or joint_array[5] > v['j6']['max']):
+        joints = np.asarray(joint_array, dtype=float)
+        out_of_range = (joints < self.joint_min) | (joints > self.joint_max)
+        if out_of_range.any():
+            j = np.argmax(out_of_range)
             raise RobotCommanderException(CommandStatus.INVALID_PARAMETERS,
-                    "joint 6 not in range ( " + str(v['j6']['min']) + " , " + str(v['j6']['max']) + " )")
+                    "joint " + str(j + 1) + " not in range ( " + str(self.joint_min[j]) + " , " + str(self.joint_max[j]) + " )")
 
     def validate_position(self, position):
         v = self.validation['position_limits']
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+import rospy
+
+import os
+import sqlite3
+
+from gauss_commander.position.position import Position
+from gauss_commander.position.position_file_handler import PositionFileHandler
+from gauss_commander.gauss_file_exception import GaussFileException
+
+"""
+Positions stored in the SQLite database, same interface as
+PositionFileHandler. Positions of position_dir are migrated once.
+"""
+
+class PositionDatabaseHandler:
+
+    def __init__(self, database, position_dir=None):
+        self.database = database
+        self.lock = database.lock
+        with self.database.transaction() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS positions ("
+                    "name TEXT PRIMARY KEY, joints TEXT NOT NULL, "
+                    "roll REAL, pitch REAL, yaw REAL, x REAL, y REAL, z REAL, "
+                    "qx REAL, qy REAL, qz REAL, qw REAL, "
+                    "revision INTEGER NOT NULL)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS positions_revision ON positions (revision)")
+        if position_dir is not None:
+            self.database.migrate('positions', lambda cursor: self.migrate_files(cursor, position_dir))
+
+    def migrate_files(self, cursor, position_dir):
+        if not os.path.isdir(os.path.expanduser(position_dir)):
+            return
+        fh = PositionFileHandler(position_dir)
+        for filename in fh.get_all_filenames():
+            position_name = fh.position_name_from_filename(filename)
+            try:
+                self.insert_position(cursor, fh.read_position(position_name))
+            except GaussFileException as e:
+                rospy.logwarn("Could not migrate position " + position_name + " : " + str(e))
+        rospy.loginfo("Positions of " + str(position_dir) + " migrated to " + self.database.path)
+
+    # replace : False to fail (sqlite3.IntegrityError) if the position exists
+    def insert_position(self, cursor, position, replace=True):
+        cursor.execute("SELECT IFNULL(MAX(revision), 0) + 1 FROM positions")
+        revision = cursor.fetchone()[0]
+        cursor.execute(("INSERT OR REPLACE" if replace else "INSERT") +
+                " INTO positions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(position.name), ','.join(str(float(j)) for j in position.joints),
+                 position.rpy.roll, position.rpy.pitch, position.rpy.yaw,
+                 position.point.x, position.point.y, position.point.z,
+                 position.quaternion.x, position.quaternion.y, position.quaternion.z, position.quaternion.w,
+                 revision))
+
+    def write_position(self, position):
+        try:
+            with self.database.transaction() as cursor:
+                self.insert_position(cursor, position)
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not write position " + " : " + str(e))
+
+    # Existence check and insertion in the same transaction
+    def create_position(self, position):
+        try:
+            with self.database.transaction() as cursor:
+                self.insert_position(cursor, position, replace=False)
+        except sqlite3.IntegrityError:
+            raise GaussFileException("Position " + str(position.name) + " already exists")
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not write position " + " : " + str(e))
+
+    def read_position(self, position_name):
+        try:
+            rows = self.database.query("SELECT * FROM positions WHERE name = ?", (position_name,))
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not read position  " + position_name + " : " + str(e))
+        if not rows:
+            raise GaussFileException(' ' + str(position_name)+ ' does not exist')
+        row = rows[0]
+        pos = Position()
+        pos.name = row[0]
+        pos.joints = map(float, row[1].split(',')) if row[1] else []
+        pos.rpy = Position.RPY(row[2], row[3], row[4])
+        pos.point = Position.Point(row[5], row[6], row[7])
+        pos.quaternion = Position.Quaternion(row[8], row[9], row[10], row[11])
+        return pos
+
+    def remove_position(self, position_name):
+        try:
+            with self.database.transaction() as cursor:
+                cursor.execute("DELETE FROM positions WHERE name = ?", (position_name,))
+                removed = cursor.rowcount > 0
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not remove position " + position_name + " : " + str(e))
+        if not removed:
+            raise GaussFileException("Could not remove position " + position_name + " : does not exist")
+
+    def check_position_name(self, position_name):
+        return not self.database.query("SELECT 1 FROM positions WHERE name = ?", (position_name,))
+
+    # Versions, to know when positions have changed in the database
+
+    def get_version(self):
+        return self.database.get_data_version()
+
+    def get_position_version(self, position_name):
+        rows = self.database.query("SELECT revision FROM positions WHERE name = ?", (position_name,))
+        return rows[0][0] if rows else None
+
+    def get_position_versions(self):
+        return dict(self.database.query("SELECT name, revision FROM positions"))
+
@@ -4,7 +4,7 @@ import rospy
 
 import os
 import re
-from threading import Lock
+from threading import RLock
 
 from gauss_commander.position.position import Position 
 from gauss_commander.gauss_file_exception import GaussFileException
@@ -20,7 +20,7 @@ class PositionFileHandler:
         if not os.path.exists(self.base_dir): 
             print("Create positions dir " + str(self.base_dir))
             os.makedirs(self.base_dir)
-        self.lock = Lock()
+        self.lock = RLock()
     
     def position_name_from_filename(self, filename): 
         return  filename.replace('position_', '')
@@ -56,6 +56,12 @@ class PositionFileHandler:
 
 
 
+    def create_position(self, position):
+        with self.lock:
+            if os.path.exists(self.base_dir + self.filename_from_position_name(position.name)):
+                raise GaussFileException("Position " + str(position.name) + " already exists")
+            self.write_position(position)
+
     def does_file_exist(self, filename):
         filenames = self.get_all_filenames()
         return filename in filenames
@@ -73,7 +79,7 @@ class PositionFileHandler:
     def read_position(self,position_name):
         filename = self.filename_from_position_name(position_name)
         # Check if exists
-        if not self.does_file_exist(filename):
+        if not os.path.isfile(self.base_dir + filename):
             raise GaussFileException(' ' + str(position_name)+ ' does not exist')
         with self.lock:
             with open(self.base_dir + filename, 'r') as f:
@@ -112,6 +118,24 @@ class PositionFileHandler:
             except OSError as e:
                 raise GaussFileException("Could not remove position " + position_name + " : " + str(e))
     
+    def get_mtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    # Versions, to know when positions have changed on disk
+
+    def get_version(self):
+        return self.get_mtime(self.base_dir)
+
+    def get_position_version(self, position_name):
+        return self.get_mtime(self.base_dir + self.filename_from_position_name(position_name))
+
+    def get_position_versions(self):
+        names = [self.position_name_from_filename(f) for f in self.get_all_filenames()]
+        return dict((name, self.get_position_version(name)) for name in names)
+
     def check_position_name(self, position_name): 
         filenames = self.get_all_filenames()
         for filename in filenames:
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+from gauss_commander.position.position import Position
+from gauss_commander.gauss_file_exception import GaussFileException
+
+"""
+In memory index of saved positions, by name
+
+- Positions are read from storage once, then served from memory
+- Changes are written through to storage, under the handler lock
+- Positions changed in storage by another process are read again : storage
+  version (one stat of the positions directory, or database data version)
+  is checked before each access, and a position version before it is
+  returned
+"""
+
+# Positions given to callers can be modified without changing the index
+def copy_position(position):
+    return Position(name=position.name, joints=tuple(position.joints),
+            rpy=Position.RPY(position.rpy.roll, position.rpy.pitch, position.rpy.yaw),
+            point=Position.Point(position.point.x, position.point.y, position.point.z),
+            quaternion=Position.Quaternion(position.quaternion.x, position.quaternion.y,
+                position.quaternion.z, position.quaternion.w))
+
+class PositionRepository:
+
+    def __init__(self, handler):
+        self.fh = handler
+        self.lock = handler.lock
+        # name -> (position or None if unreadable, position version)
+        self.positions = {}
+        self.version = None
+
+    def load_position(self, position_name, version):
+        try:
+            position = self.fh.read_position(position_name)
+        except GaussFileException as e:
+            position = None
+        self.positions[position_name] = (position, version)
+        return position
+
+    # Caller holds the lock
+    def refresh(self):
+        version = self.fh.get_version()
+        if version is not None and version == self.version:
+            return
+        self.version = version
+
+        versions = self.fh.get_position_versions()
+        for name in self.positions.keys():
+            if name not in versions:
+                del self.positions[name]
+        for name, position_version in versions.items():
+            if name not in self.positions or self.positions[name][1] != position_version:
+                self.load_position(name, position_version)
+
+    # Caller holds the lock
+    # A position file edited in place does not change the storage version
+    def get_current(self, position_name):
+        position, version = self.positions[position_name]
+        current_version = self.fh.get_position_version(position_name)
+        if current_version != version:
+            position = self.load_position(position_name, current_version)
+        return position
+
+    def get(self, position_name):
+        """Return a copy of the position, None if it does not exist."""
+        with self.lock:
+            self.refresh()
+            if position_name not in self.positions:
+                return None
+            position = self.get_current(position_name)
+            if position is None:
+                return None
+            return copy_position(position)
+
+    def get_all(self):
+        """Copies of all positions, sorted by name."""
+        with self.lock:
+            self.refresh()
+            positions = [self.get_current(name) for name in sorted(self.positions)]
+            return [copy_position(position) for position in positions if position is not None]
+
+    def contains(self, position_name):
+        with self.lock:
+            self.refresh()
+            return position_name in self.positions
+
+    def write(self, position):
+        with self.lock:
+            self.fh.write_position(position)
+            self.positions[position.name] = (copy_position(position),
+                    self.fh.get_position_version(position.name))
+
+    def create(self, position):
+        """Write a new position, GaussFileException if it already exists."""
+        with self.lock:
+            self.fh.create_position(position)
+            self.positions[position.name] = (copy_position(position),
+                    self.fh.get_position_version(position.name))
+
+    def remove(self, position_name):
+        with self.lock:
+            self.fh.remove_position(position_name)
+            self.positions.pop(position_name, None)
+
@@ -12,5 +12,15 @@ class Trajectory:
         self.trajectory_plan = trajectory_plan 
 
 
+class TrajectoryInfo:
 
+    def __init__(self, id = 0, name = "", description = "", point_count = 0,
+            duration = 0.0, joints_min = [], joints_max = []):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.point_count = point_count
+        self.duration = duration
+        self.joints_min = joints_min
+        self.joints_max = joints_max
 
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+Compact binary format of saved trajectories.
+
+Layout (little endian) :
+- header : magic, version, flags, id, number of points T, number of
+  joints n, size of metadata
+- metadata : JSON (name, description, group name, frame id, joint names,
+  start state), padded to 8 bytes
+- float64 arrays : times (T,), positions (T, n), then velocities and
+  accelerations (T, n) if flags say the trajectory has them
+
+Files are memory mapped : arrays are read without copy, and converted to
+messages with one tolist() per array instead of per point conversions.
+"""
+
+import json
+import mmap
+import struct
+
+import rospy
+import numpy as np
+
+from gauss_msgs.msg import TrajectoryPlan
+from trajectory_msgs.msg import JointTrajectoryPoint
+
+from gauss_commander.trajectory.trajectory import Trajectory, TrajectoryInfo
+
+MAGIC = 'GTRJ'
+VERSION = 1
+HEADER = struct.Struct('<4sHHiIII')
+
+HAS_VELOCITIES = 1
+HAS_ACCELERATIONS = 2
+
+
+def is_binary_trajectory(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def to_str(value):
+    return value.encode('utf-8') if isinstance(value, unicode) else str(value)
+
+
+def get_padded_size(size):
+    return (size + 7) // 8 * 8
+
+
+def get_optional_array(points, name, n_points, n_joints):
+    """(T, n) array of a field of points, None if any point misses it."""
+    values = [getattr(p, name) for p in points]
+    if n_points == 0 or not all(len(v) == n_joints for v in values):
+        return None
+    return np.array(values, dtype=float).reshape(n_points, n_joints)
+
+
+class BinaryTrajectory:
+
+    def __init__(self, id, name, description, metadata, times, positions,
+            velocities=None, accelerations=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.metadata = metadata
+        self.times = times
+        self.positions = positions
+        self.velocities = velocities
+        self.accelerations = accelerations
+
+    @staticmethod
+    def from_trajectory(traj):
+        plan = traj.trajectory_plan
+        joint_trajectory = plan.trajectory.joint_trajectory
+        points = joint_trajectory.points
+        n_points = len(points)
+        n_joints = len(points[0].positions) if points else len(joint_trajectory.joint_names)
+
+        times = np.array([p.time_from_start.to_sec() for p in points], dtype=float)
+        positions = get_optional_array(points, 'positions', n_points, n_joints)
+        if positions is None:
+            positions = np.zeros((n_points, n_joints))
+        metadata = {
+            'group_name': plan.group_name,
+            'frame_id': joint_trajectory.header.frame_id,
+            'joint_names': list(joint_trajectory.joint_names),
+            'start_joint_names': list(plan.trajectory_start.joint_state.name),
+            'start_positions': list(plan.trajectory_start.joint_state.position),
+        }
+        return BinaryTrajectory(traj.id, traj.name, traj.description, metadata, times, positions,
+                get_optional_array(points, 'velocities', n_points, n_joints),
+                get_optional_array(points, 'accelerations', n_points, n_joints))
+
+    @staticmethod
+    def from_buffer(buf):
+        """Arrays are views of buf (str, mmap), no data is copied."""
+        if len(buf) < HEADER.size:
+            raise ValueError("binary trajectory is truncated")
+        magic, version, flags, id, n_points, n_joints, metadata_size = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError("not a binary trajectory")
+        if version != VERSION:
+            raise ValueError("unknown binary trajectory version " + str(version))
+        metadata = json.loads(buf[HEADER.size:HEADER.size + metadata_size])
+
+        offset = [HEADER.size + get_padded_size(metadata_size)]
+        def read_array(shape):
+            count = int(np.prod(shape))
+            array = np.frombuffer(buf, dtype='<f8', count=count, offset=offset[0]).reshape(shape)
+            offset[0] += 8 * count
+            return array
+
+        times = read_array((n_points,))
+        positions = read_array((n_points, n_joints))
+        velocities = read_array((n_points, n_joints)) if flags & HAS_VELOCITIES else None
+        accelerations = read_array((n_points, n_joints)) if flags & HAS_ACCELERATIONS else None
+        return BinaryTrajectory(id, to_str(metadata.pop('name')), to_str(metadata.pop('description')),
+                metadata, times, positions, velocities, accelerations)
+
+    def to_bytes(self):
+        metadata = dict(self.metadata, name=self.name, description=self.description)
+        metadata_bytes = json.dumps(metadata)
+        flags = ((HAS_VELOCITIES if self.velocities is not None else 0) |
+                 (HAS_ACCELERATIONS if self.accelerations is not None else 0))
+        n_points, n_joints = self.positions.shape
+        parts = [HEADER.pack(MAGIC, VERSION, flags, self.id, n_points, n_joints, len(metadata_bytes)),
+                 metadata_bytes.ljust(get_padded_size(len(metadata_bytes)), '\0')]
+        for array in (self.times, self.positions, self.velocities, self.accelerations):
+            if array is not None:
+                parts.append(np.ascontiguousarray(array, dtype='<f8').tostring())
+        return ''.join(parts)
+
+    def get_point_count(self):
+        return len(self.times)
+
+    def get_info(self):
+        """Header of the trajectory, with duration and joints bounding box."""
+        if self.get_point_count() == 0:
+            return TrajectoryInfo(self.id, self.name, self.description)
+        return TrajectoryInfo(self.id, self.name, self.description, self.get_point_count(),
+                float(self.times[-1]), self.positions.min(axis=0).tolist(),
+                self.positions.max(axis=0).tolist())
+
+    def get_joint_names(self):
+        return [to_str(name) for name in self.metadata['joint_names']]
+
+    def to_trajectory(self):
+        plan = TrajectoryPlan()
+        plan.group_name = to_str(self.metadata.get('group_name', ''))
+        plan.trajectory_start.joint_state.name = [to_str(name) for name in self.metadata.get('start_joint_names', [])]
+        plan.trajectory_start.joint_state.position = list(self.metadata.get('start_positions', []))
+        joint_trajectory = plan.trajectory.joint_trajectory
+        joint_trajectory.header.frame_id = to_str(self.metadata.get('frame_id', ''))
+        joint_trajectory.joint_names = self.get_joint_names()
+
+        n_points = self.get_point_count()
+        velocities = self.velocities.tolist() if self.velocities is not None else [[]] * n_points
+        accelerations = self.accelerations.tolist() if self.accelerations is not None else [[]] * n_points
+        joint_trajectory.points = [
+                JointTrajectoryPoint(positions=p, velocities=v, accelerations=a,
+                        time_from_start=rospy.Duration.from_sec(t))
+                for t, p, v, a in zip(self.times.tolist(), self.positions.tolist(), velocities, accelerations)]
+        return Trajectory(id=self.id, name=self.name, description=self.description, trajectory_plan=plan)
+
+
+def read_binary_trajectory_file(filename):
+    """Memory map a binary trajectory file (must be replaced, never rewritten in place)."""
+    with open(filename, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return BinaryTrajectory.from_buffer(buf)
+
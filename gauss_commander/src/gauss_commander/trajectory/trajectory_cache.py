@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+from collections import OrderedDict
+from threading import Lock
+
+"""
+LRU cache of decoded saved trajectories, bounded by their total number of
+points. Each entry keeps the key of the limits it has been validated
+against, so a trajectory is validated again only if limits change.
+"""
+
+class TrajectoryCacheEntry:
+
+    def __init__(self, trajectory, joint_names, point_count, limits_key):
+        self.trajectory = trajectory
+        self.joint_names = joint_names
+        self.point_count = point_count
+        self.limits_key = limits_key
+
+
+class TrajectoryCache:
+
+    def __init__(self, max_points=100000):
+        self.max_points = max_points
+        self.entries = OrderedDict()
+        self.point_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, traj_id):
+        with self.lock:
+            entry = self.entries.pop(traj_id, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries[traj_id] = entry
+            self.hits += 1
+            return entry
+
+    def put(self, traj_id, entry):
+        with self.lock:
+            self.remove_entry(traj_id)
+            if entry.point_count > self.max_points:
+                return
+            self.entries[traj_id] = entry
+            self.point_count += entry.point_count
+            while self.point_count > self.max_points:
+                self.remove_entry(next(iter(self.entries)))
+
+    def invalidate(self, traj_id):
+        with self.lock:
+            self.remove_entry(traj_id)
+
+    # Caller holds the lock
+    def remove_entry(self, traj_id):
+        entry = self.entries.pop(traj_id, None)
+        if entry is not None:
+            self.point_count -= entry.point_count
+
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+import rospy
+
+import os
+import sqlite3
+import jsonpickle
+
+from gauss_commander.trajectory.trajectory_file_handler import TrajectoryFileHandler
+from gauss_commander.trajectory.trajectory import TrajectoryInfo
+from gauss_commander.trajectory.trajectory_binary_format import BinaryTrajectory, is_binary_trajectory
+from gauss_commander.gauss_file_exception import GaussFileException
+
+"""
+Trajectories stored in the SQLite database, same interface as
+TrajectoryFileHandler. Trajectories of trajectory_dir are migrated once.
+Data is stored in binary format, jsonpickle data (previous format) is
+converted on first read. Trajectory headers (TrajectoryInfo) are also
+stored in columns, to list trajectories without reading their data.
+"""
+
+class TrajectoryDatabaseHandler:
+
+    def __init__(self, database, trajectory_dir=None):
+        self.database = database
+        self.lock = database.lock
+        with self.database.transaction() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS trajectories ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, "
+                    "description TEXT NOT NULL, data TEXT NOT NULL, "
+                    "point_count INTEGER, duration REAL, joints_min TEXT, joints_max TEXT)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS trajectories_name ON trajectories (name)")
+        self.database.migrate('trajectory_infos', self.migrate_infos)
+        if trajectory_dir is not None:
+            self.database.migrate('trajectories', lambda cursor: self.migrate_files(cursor, trajectory_dir))
+
+    def migrate_files(self, cursor, trajectory_dir):
+        if not os.path.isdir(os.path.expanduser(trajectory_dir)):
+            return
+        fh = TrajectoryFileHandler(trajectory_dir)
+        for traj_id in fh.get_all_trajectory_ids():
+            try:
+                self.insert_binary_trajectory(cursor, fh.read_binary_trajectory(traj_id))
+            except GaussFileException as e:
+                rospy.logwarn("Could not migrate trajectory " + str(traj_id) + " : " + str(e))
+        rospy.loginfo("Trajectories of " + str(trajectory_dir) + " migrated to " + self.database.path)
+
+    # Header columns added to tables created without them
+    def migrate_infos(self, cursor):
+        cursor.execute("PRAGMA table_info(trajectories)")
+        columns = [row[1] for row in cursor.fetchall()]
+        for column, column_type in [('point_count', 'INTEGER'), ('duration', 'REAL'),
+                ('joints_min', 'TEXT'), ('joints_max', 'TEXT')]:
+            if column not in columns:
+                cursor.execute("ALTER TABLE trajectories ADD COLUMN " + column + " " + column_type)
+        cursor.execute("SELECT id, data FROM trajectories WHERE point_count IS NULL")
+        for traj_id, data in cursor.fetchall():
+            try:
+                self.insert_binary_trajectory(cursor, self.decode_data(traj_id, data))
+            except Exception as e:
+                rospy.logwarn("Could not read trajectory " + str(traj_id) + " : " + str(e))
+
+    # Existing id (update or migration)
+    def insert_binary_trajectory(self, cursor, binary_traj):
+        info = binary_traj.get_info()
+        cursor.execute("INSERT OR REPLACE INTO trajectories (id, name, description, data, "
+                "point_count, duration, joints_min, joints_max) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (binary_traj.id, binary_traj.name, binary_traj.description,
+                 sqlite3.Binary(binary_traj.to_bytes()), info.point_count, info.duration,
+                 ','.join(repr(j) for j in info.joints_min), ','.join(repr(j) for j in info.joints_max)))
+
+    # data is binary, or jsonpickle (previous format)
+    def decode_data(self, trajectory_id, data):
+        data = str(data)
+        if is_binary_trajectory(data):
+            return BinaryTrajectory.from_buffer(data)
+        binary_traj = BinaryTrajectory.from_trajectory(self.json_to_object(data))
+        binary_traj.id = trajectory_id
+        return binary_traj
+
+    def get_trajectory_infos(self):
+        """Headers of all trajectories, sorted by id, without reading their data."""
+        rows = self.database.query("SELECT id, name, description, point_count, duration, "
+                "joints_min, joints_max FROM trajectories ORDER BY id")
+        infos = []
+        for traj_id, name, description, point_count, duration, joints_min, joints_max in rows:
+            if point_count is None:
+                try:
+                    infos.append(self.read_binary_trajectory(traj_id).get_info())
+                except GaussFileException as e:
+                    rospy.logwarn("Could not read trajectory " + str(traj_id) + " : " + str(e))
+                continue
+            infos.append(TrajectoryInfo(traj_id, name, description, point_count, duration,
+                    map(float, joints_min.split(',')) if joints_min else [],
+                    map(float, joints_max.split(',')) if joints_max else []))
+        return infos
+
+    def get_all_trajectory_ids(self):
+        return [row[0] for row in self.database.query("SELECT id FROM trajectories ORDER BY id")]
+
+    def remove_trajectory(self, traj_id):
+        try:
+            with self.database.transaction() as cursor:
+                cursor.execute("DELETE FROM trajectories WHERE id = ?", (traj_id,))
+                removed = cursor.rowcount > 0
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not remove trajectory with id " 
+                    + str(traj_id) + " : " + str(e))
+        if not removed:
+            raise GaussFileException("Could not remove trajectory with id " 
+                    + str(traj_id) + " : does not exist")
+
+    # Id is chosen by the database (AUTOINCREMENT) in the insert transaction.
+    # Data stores the id : it is written once the id is known
+    def create_trajectory(self, traj):
+        binary_traj = BinaryTrajectory.from_trajectory(traj)
+        try:
+            with self.database.transaction() as cursor:
+                cursor.execute("INSERT INTO trajectories (name, description, data) VALUES (?, ?, ?)",
+                        (binary_traj.name, binary_traj.description, sqlite3.Binary('')))
+                binary_traj.id = traj.id = cursor.lastrowid
+                self.insert_binary_trajectory(cursor, binary_traj)
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not create trajectory : " + str(e))
+        return traj.id
+
+    def write_trajectroy(self, traj):
+        self.write_binary_trajectory(BinaryTrajectory.from_trajectory(traj))
+
+    def write_binary_trajectory(self, binary_traj):
+        try:
+            with self.database.transaction() as cursor:
+                self.insert_binary_trajectory(cursor, binary_traj)
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not write trajectory with id "
+                    + str(binary_traj.id) + " : " + str(e))
+
+    def read_trajectory(self, trajectory_id):
+        return self.read_binary_trajectory(trajectory_id).to_trajectory()
+
+    def read_binary_trajectory(self, trajectory_id):
+        try:
+            rows = self.database.query("SELECT data FROM trajectories WHERE id = ?", (trajectory_id,))
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not read trajectory with id " 
+                + str(trajectory_id)+ str(e) )
+        if not rows:
+            raise GaussFileException(' ' + str(trajectory_id)+ ' does not exist')
+        data = str(rows[0][0])
+        try:
+            binary_traj = self.decode_data(trajectory_id, data)
+        except Exception as e:
+            raise GaussFileException("Could not read trajectory with id " 
+                + str(trajectory_id)+ str(e) )
+        if not is_binary_trajectory(data):
+            self.write_binary_trajectory(binary_traj)
+        return binary_traj
+
+    def json_to_object(self, json_str): 
+        return jsonpickle.decode(json_str)
+
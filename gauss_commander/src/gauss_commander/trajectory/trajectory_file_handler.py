@@ -3,9 +3,12 @@
 import rospy 
 import os
 import re
-from threading import Lock
+import shutil
+from threading import RLock
 import jsonpickle
 from gauss_commander.gauss_file_exception import GaussFileException
+from gauss_commander.trajectory.trajectory_binary_format import BinaryTrajectory, \
+        is_binary_trajectory, read_binary_trajectory_file
 
 class TrajectoryFileHandler:
        
@@ -18,7 +21,9 @@ class TrajectoryFileHandler:
         if not os.path.exists(self.base_dir): 
             print("Create trajectory dir " + str(self.base_dir))
             os.makedirs(self.base_dir)
-        self.lock = Lock()
+        self.lock = RLock()
+        # Index of trajectory headers : id -> (file mtime, TrajectoryInfo)
+        self.infos = {}
 
     def get_all_filenames(self):
         filenames = []
@@ -30,6 +35,35 @@ class TrajectoryFileHandler:
         # Keep only correct filenames
         return filter(r.match, filenames)
 
+    def get_all_trajectory_ids(self):
+        return sorted(self.trajectory_id_from_filename(f) for f in self.get_all_filenames())
+
+    def get_trajectory_infos(self):
+        """
+        Headers of all trajectories, sorted by id. Only files changed since
+        the last call are read.
+        """
+        with self.lock:
+            infos = {}
+            for traj_id in self.get_all_trajectory_ids():
+                try:
+                    mtime = os.stat(self.base_dir + self.filename_from_trajectory_id(traj_id)).st_mtime
+                except OSError:
+                    continue
+                if traj_id in self.infos and self.infos[traj_id][0] == mtime:
+                    infos[traj_id] = self.infos[traj_id]
+                    continue
+                try:
+                    info = self.read_binary_trajectory(traj_id).get_info()
+                    # File is rewritten when converted from jsonpickle
+                    mtime = os.stat(self.base_dir + self.filename_from_trajectory_id(traj_id)).st_mtime
+                except (GaussFileException, OSError) as e:
+                    rospy.logwarn("Could not read trajectory " + str(traj_id) + " : " + str(e))
+                    continue
+                infos[traj_id] = (mtime, info)
+            self.infos = infos
+            return [infos[traj_id][1] for traj_id in sorted(infos)]
+
     def does_file_exist(self, filename):
         filenames = self.get_all_filenames()
         return filename in filenames
@@ -58,26 +92,74 @@ class TrajectoryFileHandler:
                 max_id = current_id
         return max_id + 1
                      
+    # Id is picked and written under the lock
+    def create_trajectory(self, traj):
+        with self.lock:
+            traj.id = self.pick_new_id()
+            self.write_trajectroy(traj)
+        return traj.id
+
     def write_trajectroy(self,traj):
-        filename = self.filename_from_trajectory_id(traj.id)
+        self.write_binary_trajectory(BinaryTrajectory.from_trajectory(traj))
+
+    # Files are replaced, never rewritten : they may be memory mapped
+    def write_binary_trajectory(self, binary_traj):
+        filename = self.base_dir + self.filename_from_trajectory_id(binary_traj.id)
         with self.lock: 
-            with open(self.base_dir + filename, 'w') as f: 
-                f.write(self.object_to_json(traj))
-                
+            try:
+                with open(filename + '.tmp', 'wb') as f: 
+                    f.write(binary_traj.to_bytes())
+                os.rename(filename + '.tmp', filename)
+            except (IOError, OSError) as e:
+                raise GaussFileException("Could not write trajectory with id "
+                        + str(binary_traj.id) + " : " + str(e))
                 
     def read_trajectory(self,trajectory_id ): 
+        return self.read_binary_trajectory(trajectory_id).to_trajectory()
+
+    # Original jsonpickle file is kept as trajectory_<id>.json.bak : the binary
+    # format does not store efforts, start state velocities and efforts,
+    # multi DOF trajectories and header stamps.
+    # Return False if it could not be kept (or a backup already exists)
+    def backup_json_trajectory(self, filename):
+        backup = self.base_dir + filename + '.json.bak'
+        if os.path.exists(backup):
+            return False
+        try:
+            try:
+                os.link(self.base_dir + filename, backup)
+            except OSError:
+                shutil.copy2(self.base_dir + filename, backup)
+            return True
+        except (IOError, OSError) as e:
+            rospy.logwarn("Could not keep trajectory file " + filename + " : " + str(e))
+            return False
+
+    # jsonpickle files (previous format) are converted on first read, the
+    # original file is kept aside (see backup_json_trajectory)
+    def read_binary_trajectory(self, trajectory_id):
         filename = self.filename_from_trajectory_id(trajectory_id)
         # Check if exists
-        if not self.does_file_exist(filename):
+        if not os.path.isfile(self.base_dir + filename):
             raise GaussFileException(' ' + str(trajectory_id)+ ' does not exist')
         with self.lock:
-            with open(self.base_dir + filename, 'r') as f:
-                try : 
-                    json_str = f.read()
-                    return self.json_to_object(json_str)
-                except Exception as e : 
-                    raise GaussFileException("Could not read trajectory with id " 
-                        + str(trajectory_id)+ str(e) )
+            try : 
+                with open(self.base_dir + filename, 'rb') as f:
+                    is_binary = is_binary_trajectory(f.read(4))
+                if is_binary:
+                    return read_binary_trajectory_file(self.base_dir + filename)
+                with open(self.base_dir + filename, 'r') as f:
+                    binary_traj = BinaryTrajectory.from_trajectory(self.json_to_object(f.read()))
+            except Exception as e : 
+                raise GaussFileException("Could not read trajectory with id " 
+                    + str(trajectory_id)+ str(e) )
+            binary_traj.id = trajectory_id
+            if not self.backup_json_trajectory(filename):
+                return binary_traj # read again next time, not converted
+            self.write_binary_trajectory(binary_traj)
+            rospy.loginfo("Trajectory " + str(trajectory_id) + " converted to binary format, previous file kept as "
+                    + filename + ".json.bak")
+            return binary_traj
     
     def object_to_json(self, obj): 
         return jsonpickle.encode(obj)
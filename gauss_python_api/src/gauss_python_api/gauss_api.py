@@ -10,6 +10,7 @@ from std_msgs.msg import String
 from gauss_msgs.msg import RobotMoveAction
 from gauss_msgs.msg import RobotMoveGoal
 from gauss_msgs.msg import HardwareStatus
+from gauss_msgs.msg import Waypoint
 
 from gauss_msgs.srv import SetInt
 from gauss_msgs.srv import GetDigitalIO
@@ -163,7 +164,7 @@ class Gauss:
             result = self.call_service('gauss/calibrate_motors',
                     SetInt, [2])
             if result.status != 200:
-                raise NiryoOneException(result.message)
+                raise GaussException(result.message)
             # Wait until calibration is finished
             rospy.sleep(1)
             calibration_finished = False
@@ -174,7 +175,7 @@ class Gauss:
                     if not hw_status.calibration_in_progress:
                         calibration_finished = True
                 except rospy.ROSException as e:
-                    raise NiryoOneException(str(e))
+                    raise GaussException(str(e))
        
         def activate_learning_mode(self, activate):
             result = self.call_service('gauss/activate_learning_mode', 
@@ -224,6 +225,31 @@ class Gauss:
             goal.cmd.joints = joints
             return self.execute_action('gauss/commander/robot_action', RobotMoveAction, goal)
 
+        # Waypoints are executed in one motion, without stopping at each one
+        # blend_radius : joint space distance (rad) at which the path may cut the corner
+        def move_joints_waypoints(self, joints_list, blend_radius=0.0):
+            goal = RobotMoveGoal()
+            goal.cmd.cmd_type = MoveCommandType.WAYPOINTS
+            goal.cmd.waypoints = [Waypoint(joints=joints) for joints in joints_list]
+            goal.cmd.blend_radius = blend_radius
+            return self.execute_action('gauss/commander/robot_action', RobotMoveAction, goal)
+
+        # poses : list of [x, y, z, roll, pitch, yaw]
+        def move_pose_waypoints(self, poses, blend_radius=0.0):
+            goal = RobotMoveGoal()
+            goal.cmd.cmd_type = MoveCommandType.WAYPOINTS
+            for (x, y, z, roll, pitch, yaw) in poses:
+                waypoint = Waypoint()
+                waypoint.position.x = x
+                waypoint.position.y = y
+                waypoint.position.z = z
+                waypoint.rpy.roll = roll
+                waypoint.rpy.pitch = pitch
+                waypoint.rpy.yaw = yaw
+                goal.cmd.waypoints.append(waypoint)
+            goal.cmd.blend_radius = blend_radius
+            return self.execute_action('gauss/commander/robot_action', RobotMoveAction, goal)
+
         def shift_pose(self, axis, value):
             goal = RobotMoveGoal()
             goal.cmd.cmd_type = MoveCommandType.SHIFT_POSE
@@ -235,7 +261,7 @@ class Gauss:
             result = self.call_service('/gauss/commander/set_max_velocity_scaling_factor',
                     SetInt, [percentage])
             if result.status != 200:
-                raise NiryoOneException(result.message)
+                raise GaussException(result.message)
 
         def open_gripper(self, gripper_id, speed):
             goal = RobotMoveGoal()
@@ -2,28 +2,23 @@
 
 var fs = require('fs');
 var net = require('net'); 
+var program = require('commander');
 
 var Blockly = require('./gauss_python_generators').Blockly;
 
 Blockly.Python.STATEMENT_PREFIX = 'n.highlight_block(%1)\n';
 Blockly.Python.addReservedWords('highlightBlock');
 
-const generateCode = (dirPath) => {
-    var filenameRead = dirPath + '/blockly_xml';
-    var filenameWrite = dirPath + '/blockly_python';
-
-    try {
-        var xmlCode = fs.readFileSync(filenameRead, 'utf8');
-    }
-    catch (e) {
-        return { status: 400, message: 'Could not read file : ' + filenameRead };
-    }
+program
+    .option('-s, --socket <path>', 'Unix socket to listen on', '/tmp/blockly_code_generator.sock')
+    .parse(process.argv);
 
+const generateCode = (xmlCode) => {
     try {
         var xml = Blockly.Xml.textToDom(xmlCode);
     }
     catch (e) {
-        return { status: 400, message: 'Could not parse XML from file : ' + filenameRead };
+        return { status: 400, message: 'Could not parse XML' };
     }
 
     var workspace = new Blockly.Workspace();
@@ -35,6 +30,8 @@ const generateCode = (dirPath) => {
         return { status: 400, message: 'Failed to parse given Xml' };
     }
     
+    // Generated code is cached : change GENERATOR_VERSION (blockly_code_generator.py)
+    // when the generated code changes
     var code = '#!/usr/bin/env python\n\nfrom gauss_python_api.gauss_api import *\n'
         + 'import rospy\nrospy.init_node(\'gauss_generated_code_execution\')\nn = Gauss()\n\n';
     
@@ -45,25 +42,57 @@ const generateCode = (dirPath) => {
         return { status: 400, message: 'Could not generate code from given Xml' };
     }
 
+    return  { status: 200, message: 'Successfully generated code', code: code };
+}
+
+// Protocol : each request and response is a frame, 4 bytes big endian
+// length followed by UTF-8 JSON
+// - request : { id, xml }
+// - response : { id, status, message, code (if status is 200) }
+// Connection stays open, several requests can be sent without waiting
+// for responses, which are matched to requests by id
+var FRAME_HEADER_SIZE = 4;
+
+const writeFrame = (socket, object) => {
+    var payload = Buffer.from(JSON.stringify(object), 'utf8');
+    var header = Buffer.alloc(FRAME_HEADER_SIZE);
+    header.writeUInt32BE(payload.length, 0);
+    socket.write(Buffer.concat([header, payload]));
+}
+
+const handleRequest = (socket, frame) => {
     try {
-        fs.writeFileSync(filenameWrite, code, 'utf-8');
+        var request = JSON.parse(frame.toString('utf8'));
     }
     catch (e) {
-        return { status: 400, message: 'Could not write generated code on file : ' + filenameWrite };
+        writeFrame(socket, { id: null, status: 400, message: 'Could not parse request' });
+        return;
     }
-   
-    return  { status: 200, message: 'Successfully generated code' };
+    var response = generateCode(request.xml);
+    response.id = request.id;
+    writeFrame(socket, response);
 }
 
-var HOST = '127.0.0.1';
-var PORT = '1337';
+// Remove socket left by a server which did not shutdown normally
+if (fs.existsSync(program.socket)) {
+    fs.unlinkSync(program.socket);
+}
 
 var server = net.createServer(function (socket) {
-    console.log('CONNECTED: ' + socket.remoteAddress + ':' + socket.remotePort);
+    console.log('CONNECTED on ' + program.socket);
+    var buffer = Buffer.alloc(0);
 
-    socket.on('data', function (dirPath) {
-        var response = generateCode(dirPath.toString('utf8'));
-        socket.write(JSON.stringify(response));
+    socket.on('data', function (data) {
+        buffer = Buffer.concat([buffer, data]);
+        while (buffer.length >= FRAME_HEADER_SIZE) {
+            var size = buffer.readUInt32BE(0);
+            if (buffer.length < FRAME_HEADER_SIZE + size) {
+                break;
+            }
+            var frame = buffer.slice(FRAME_HEADER_SIZE, FRAME_HEADER_SIZE + size);
+            buffer = buffer.slice(FRAME_HEADER_SIZE + size);
+            handleRequest(socket, frame);
+        }
     });
 
     socket.on('close', function (data) {
@@ -73,5 +102,9 @@ var server = net.createServer(function (socket) {
     socket.on('error', function (error) {
         console.log(error);
     });
-}).listen(PORT, HOST);
+}).listen(program.socket);
 
+process.on('SIGINT', function () {
+    server.close();
+    process.exit(0);
+});
@@ -72,6 +72,10 @@ class SequenceActionServer:
         else:
             rospy.loginfo("No current goal, nothing to do")
 
+    # !! Need to call this with rospy.on_shutdown !!
+    def shutdown(self):
+        self.seq_code_executor.shutdown()
+
     def cancel_current_command(self):
         self.seq_code_executor.cancel_execution()
     
@@ -2,6 +2,8 @@
 
 import rospy
 
+import os
+
 from gauss_msgs.msg import Sequence as SequenceMessage
 from gauss_msgs.srv import GetSequenceList
 from gauss_msgs.srv import ManageSequence
@@ -9,18 +11,31 @@ from gauss_msgs.srv import ManageSequence
 from gauss_user_interface.sequences.sequence import Sequence
 from gauss_user_interface.sequences.gauss_file_exception import GaussFileException
 from gauss_user_interface.sequences.sequence_file_handler import SequenceFileHandler
+from gauss_user_interface.sequences.sequence_database_handler import SequenceDatabaseHandler
 from gauss_user_interface.sequences.sequence_command_type import SequenceCommandType
 from gauss_user_interface.sequences.blockly_code_generator import BlocklyCodeGenerator
+from gauss_user_interface.sequences.blockly_code_generator import GENERATOR_VERSION
+from gauss_user_interface.sequences.python_code_cache import PythonCodeCache
+
+# Generated code is cached in this directory of sequences_dir
+PYTHON_CODE_CACHE_DIR = '.python_code_cache'
 
 
 class SequenceManager:
 
-    def __init__(self, sequences_dir, logger):
+    # database : gauss_commander.database.Database, sequences are stored in
+    # sequences_dir files if None
+    def __init__(self, sequences_dir, logger, database=None):
         self.gauss_ros_logger = logger
         self.gauss_ros_logger.publish_log_status("INFO", "SequenceManager __init__, sequences_dir: "+ sequences_dir)
 
-        self.fh = SequenceFileHandler(sequences_dir)
+        if database is not None:
+            self.fh = SequenceDatabaseHandler(database, sequences_dir)
+        else:
+            self.fh = SequenceFileHandler(sequences_dir)
         self.blockly_generator = BlocklyCodeGenerator(self.gauss_ros_logger)
+        self.code_cache = PythonCodeCache(GENERATOR_VERSION,
+                os.path.join(os.path.expanduser(sequences_dir), PYTHON_CODE_CACHE_DIR))
 
         self.get_sequence_list_server = rospy.Service(
                 '/gauss/sequences/get_sequence_list', GetSequenceList, self.callback_get_sequence_list)
@@ -29,7 +44,23 @@ class SequenceManager:
                 '/gauss/sequences/manage_sequence', ManageSequence, self.callback_manage_sequence)
 
     def get_python_code_from_xml(self, xml):
-        return self.blockly_generator.get_generated_python_code(xml)
+        code = self.code_cache.get(xml)
+        if code is not None:
+            return { 'status': 200, 'code': code }
+        response = self.blockly_generator.get_generated_python_code(xml)
+        if response['status'] == 200:
+            self.code_cache.put(xml, response['code'])
+        return response
+
+    # Generate code when the sequence is saved, so executions
+    # (autorun included) find it in cache and do not wait for nodejs server
+    def cache_python_code(self, sequence):
+        if not sequence.blockly_xml:
+            return
+        response = self.get_python_code_from_xml(sequence.blockly_xml)
+        if response['status'] != 200:
+            self.gauss_ros_logger.publish_log_status("WARNING", "SequenceManager could not generate code of sequence "
+                    + str(sequence.id) + " : " + str(response['message']))
 
     # !! Need to call this with rospy.on_shutdown !!
     def shutdown(self):
@@ -123,43 +154,25 @@ class SequenceManager:
             return None
 
     def get_all_sequences(self, read_info_only=False):
-        filenames = self.fh.get_all_filenames()
         sequence_list = []
-        for f in filenames:
-            self.gauss_ros_logger.publish_log_status("INFO", "SequenceManager get_all_sequences, found file: "+ f)
-            try:
-                sequence_id = self.fh.sequence_id_from_filename(f)
-                sequence = self.get_sequence_from_id(sequence_id, read_info_only=read_info_only)
-                if sequence != None:
-                    sequence_list.append(sequence)
-            except GaussFileException as e:
-                pass
+        for sequence_id in self.fh.get_all_sequence_ids():
+            sequence = self.get_sequence_from_id(sequence_id, read_info_only=read_info_only)
+            if sequence != None:
+                sequence_list.append(sequence)
+        self.gauss_ros_logger.publish_log_status("INFO", "SequenceManager get_all_sequences, found "
+                + str(len(sequence_list)) + " sequences")
         return sequence_list
     
     def save_new_sequence(self, sequence):
-        id = self.pick_new_id()
-        sequence.id = id
-        self.gauss_ros_logger.publish_log_status("INFO", "SequenceManager save_new_sequence, id: "+ str(id))
-
-        if sequence.name == "":
-            sequence.name = self.fh.filename_from_sequence_id(id) 
         sequence.created = rospy.Time.now().secs
         sequence.updated = rospy.Time.now().secs
         try:
-            self.fh.write_sequence(sequence)
+            id = self.fh.create_sequence(sequence)
         except GaussFileException as e:
             return -1
+        self.gauss_ros_logger.publish_log_status("INFO", "SequenceManager save_new_sequence, id: "+ str(id))
+        self.cache_python_code(sequence)
         return id
-
-    # choose a non used, incremental id
-    def pick_new_id(self):
-        filenames = self.fh.get_all_filenames()
-        max_id = 0
-        for filename in filenames:
-            current_id = self.fh.sequence_id_from_filename(filename)
-            if current_id > max_id:
-                max_id = current_id
-        return max_id + 1
     
     def update_sequence(self, sequence, sequence_data):
         sequence.name = sequence_data.name
@@ -171,6 +184,7 @@ class SequenceManager:
             self.fh.write_sequence(sequence)
         except GaussFileException as e:
             return False
+        self.cache_python_code(sequence)
         return True
 
     def delete_sequence(self, id):
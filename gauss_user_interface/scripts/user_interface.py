@@ -8,6 +8,7 @@ from sequence_manager import SequenceManager
 from sequence_action_server import SequenceActionServer
 from sequence_autorun import SequenceAutorun
 from gauss_user_interface.gauss_ros_logger import RosLogger
+from gauss_commander.database import Database
 #from matlab_manager import MatlabManager 
 
 class UserInterface:
@@ -21,7 +22,10 @@ class UserInterface:
     
         # Sequence Manager
         sequences_dir = rospy.get_param("~sequences_dir")
-        self.sequence_manager = SequenceManager(sequences_dir, self.gauss_ros_logger)
+        # Optional SQLite storage, sequences dir is migrated into it
+        database_path = rospy.get_param("~database_path", "")
+        self.database = Database(database_path) if database_path else None
+        self.sequence_manager = SequenceManager(sequences_dir, self.gauss_ros_logger, self.database)
 
         # Sequence Action Server
         self.sequence_action_server = SequenceActionServer(self.sequence_manager, self.gauss_ros_logger)
@@ -37,6 +41,7 @@ class UserInterface:
 
 
     def shutdown(self):
+        self.sequence_action_server.shutdown()
         self.sequence_manager.shutdown()
 
 if __name__ == '__main__':
@@ -5,13 +5,29 @@ import subprocess
 import socket
 import os
 import signal
-import ast
-
-HOST = '127.0.0.1'
-
-def cleanup_node_tcp_port(port_number):
+import json
+import struct
+import time
+import pipes
+from threading import Thread, Lock, Event
+
+# Version of the code generated by blockly_code_generator_server.js and
+# gauss_python_generators.js : generated code is cached with this version,
+# change it each time these files change the generated code
+GENERATOR_VERSION = '1.0.0'
+
+# Frames of the protocol with nodejs server : 4 bytes big endian length,
+# followed by UTF-8 JSON (see blockly_code_generator_server.js)
+FRAME_HEADER = struct.Struct('>I')
+
+GENERATION_TIMEOUT = 6.0
+CONNECT_RETRY_PERIOD = 0.1
+
+def cleanup_node_server(socket_path):
+    if not os.path.exists(socket_path):
+        return
     try:
-	output = subprocess.check_output(['lsof', '-i', 'tcp:' + str(port_number)])
+	output = subprocess.check_output(['lsof', socket_path])
 	for line in output.split(os.linesep):
 	    if 'node' in line:
 		lines = line.split()
@@ -24,97 +40,156 @@ def create_directory(directory_path):
     if not os.path.exists(directory_path):
         os.makedirs(directory_path)
 
-def save_to_file(filename, text):
-    with open(filename, 'w') as target:
-        target.write(text)
+def recv_exactly(sock, size):
+    data = ''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise socket.error("Connection closed by nodejs server")
+        data += chunk
+    return data
+
+def send_frame(sock, obj):
+    payload = json.dumps(obj)
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+def recv_frame(sock):
+    size = FRAME_HEADER.unpack(recv_exactly(sock, FRAME_HEADER.size))[0]
+    return json.loads(recv_exactly(sock, size))
+
+# Wakes up the thread reading sock, which then closes it
+def shutdown_socket(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except socket.error:
+        pass
+
+class PendingRequest:
+
+    def __init__(self):
+        self.event = Event()
+        self.response = None
 
-def read_file(filename):
-    with open(filename, 'r') as target:
-	return target.read()	
+    def set_response(self, response):
+        self.response = response
+        self.event.set()
 
 class BlocklyCodeGenerator:
 
     def __init__(self, logger):
-        self.blockly_dir = rospy.get_param("~gauss_blockly_path")
-        self.tcp_port = rospy.get_param("~gauss_blockly_tcp_port")
-        self.blockly_xml_file = str(self.blockly_dir) + '/blockly_xml'
-        self.blockly_python_file = str(self.blockly_dir) + '/blockly_python'
+        self.blockly_dir = os.path.expanduser(rospy.get_param("~gauss_blockly_path"))
+        self.socket_path = self.blockly_dir + '/blockly_code_generator.sock'
         create_directory(self.blockly_dir)
         self.gauss_ros_logger = logger
 
-        # Cleanup tcp port if another Nodejs server didn't shutdown normally
-        cleanup_node_tcp_port(self.tcp_port)
+        # Cleanup socket if another Nodejs server didn't shutdown normally
+        cleanup_node_server(self.socket_path)
 
         # Start Nodejs server
-        self.blockly_generator_server = subprocess.Popen("blockly_code_generator_server", shell=True)
+        self.blockly_generator_server = subprocess.Popen(
+                "exec blockly_code_generator_server --socket " + pipes.quote(self.socket_path), shell=True)
         rospy.loginfo("Blockly code generator started")
 
+        # One connection shared by all requests, opened again when lost.
+        # Responses are read by another thread, and matched to requests by id
         self.socket = None
+        self.lock = Lock()
+        self.next_request_id = 1
+        self.pending_requests = {}
 
     def shutdown(self):
-        if self.socket:
-            self.socket.close()
+        with self.lock:
+            if self.socket:
+                shutdown_socket(self.socket)
         rospy.loginfo("Shutdown blockly code generator : Kill PID : " + str(self.blockly_generator_server.pid))
         os.kill(self.blockly_generator_server.pid, signal.SIGINT)
-    
+
+    # Called without the lock : other requests keep being sent and answered
+    # while the connection is retried
+    def connect(self, deadline):
+        with self.lock:
+            if self.socket is not None:
+                return self.socket
+        # Nodejs server may still be starting
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                break
+            except socket.error:
+                sock.close()
+                if time.time() + CONNECT_RETRY_PERIOD > deadline:
+                    raise
+                time.sleep(CONNECT_RETRY_PERIOD)
+        with self.lock:
+            # Another thread may have connected in the meantime
+            if self.socket is not None:
+                sock.close()
+                return self.socket
+            self.socket = sock
+        reader = Thread(target=self.read_responses, args=(sock,))
+        reader.daemon = True
+        reader.start()
+        return sock
+
+    def read_responses(self, sock):
+        try:
+            while True:
+                response = recv_frame(sock)
+                with self.lock:
+                    pending = self.pending_requests.pop(response.get('id'), None)
+                if pending is not None:
+                    pending.set_response(response)
+        except (socket.error, ValueError), e:
+            message = 'Connection to nodejs server lost : ' + str(e)
+
+        # Requests sent on this connection will not get a response
+        with self.lock:
+            if self.socket is sock:
+                self.socket = None
+            sock.close()
+            failed_requests = self.pending_requests.values()
+            self.pending_requests.clear()
+        for pending in failed_requests:
+            pending.set_response({ 'status': 400, 'message': message })
+
     #
     # input : correctly formatted XML on one line
     # output : generated Python code from XML
+    # Can be called by several threads at once
     #
     def get_generated_python_code(self, xml_code):
         self.gauss_ros_logger.publish_log_status("INFO", "BlocklyCodeGenerator get_generated_python_code")
+        deadline = time.time() + GENERATION_TIMEOUT
 
-        # 1. Save xml to file
-        save_to_file(self.blockly_xml_file, xml_code)
-
-        # 2. Create socket
-        self.gauss_ros_logger.publish_log_status("INFO", "BlocklyCodeGenerator get_generated_python_code, Create socket")
+        # 1. Send request to nodejs server
+        pending = PendingRequest()
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(6)
+            sock = self.connect(deadline)
         except socket.error, msg:
-            return { 'status': 400, 'message': msg }
-
-        # 3. Connect to nodejs server
-        self.gauss_ros_logger.publish_log_status("INFO", "BlocklyCodeGenerator get_generated_python_code, Connect to nodejs server")
-        try:
-            self.socket.connect((HOST, self.tcp_port))
-        except socket.error, msg:
-            self.socket.close()
-            return { 'status': 400, 'message': msg }
+            return { 'status': 400, 'message': str(msg) }
+        with self.lock:
+            request_id = self.next_request_id
+            self.next_request_id += 1
+            try:
+                self.pending_requests[request_id] = pending
+                send_frame(sock, { 'id': request_id, 'xml': xml_code })
+            except socket.error, msg:
+                self.pending_requests.pop(request_id, None)
+                shutdown_socket(sock)
+                return { 'status': 400, 'message': str(msg) }
+
+        # 2. Wait for response
+        if not pending.event.wait(max(deadline - time.time(), 0)):
+            with self.lock:
+                self.pending_requests.pop(request_id, None)
+            return { 'status': 400, 'message': 'Could not generate Python code in time' }
 
-        # 4. Send filename to nodejs server
-        self.gauss_ros_logger.publish_log_status("INFO", "BlocklyCodeGenerator get_generated_python_code, Send filename to nodejs server")
-        try:
-            self.socket.sendall(self.blockly_dir)
-        except socket.error, msg:
-            self.socket.close()
-            return { 'status': 400, 'message': msg }
+        response = pending.response
+        if response['status'] != 200:
+            return { 'status': response['status'], 'message': str(response['message']) }
 
-        # 5. Wait for response
-        self.gauss_ros_logger.publish_log_status("INFO", "BlocklyCodeGenerator get_generated_python_code, Wait for response")
-        try:
-            reply = self.socket.recv(1024)
-        except socket.timeout, msg:
-            self.socket.close()
-            return { 'status': 400, 'message': 'Could not generate Python code in time' }
-       
-        # 6. Close socket
-        self.gauss_ros_logger.publish_log_status("INFO", "BlocklyCodeGenerator get_generated_python_code, Close socket")
-        self.socket.close()
-    
-        # 7. Analyze response
-        self.gauss_ros_logger.publish_log_status("INFO", "BlocklyCodeGenerator get_generated_python_code, Analyze response")
-        try: 
-            reply = ast.literal_eval(reply)
-        except Exception, e:
-            return { 'status': 400, 'message': e }
-
-        if reply['status'] != 200:
-            return reply
-
-        # 8. Return generated code
+        # 3. Return generated code
         self.gauss_ros_logger.publish_log_status("INFO", "BlocklyCodeGenerator get_generated_python_code, Return generated code")
-        code = read_file(self.blockly_python_file)
-        return { 'status': 200, 'code': code }
+        return { 'status': 200, 'code': response['code'].encode('utf-8') }
 
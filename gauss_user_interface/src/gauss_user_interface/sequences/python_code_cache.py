@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import rospy
+
+import os
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+"""
+Cache of Python code generated from Blockly XML, keyed by a hash of the
+XML and of the generator version (same XML and generators always give the
+same code).
+- recently used code is kept in memory
+- each code is also written in cache_dir, so it survives restarts
+"""
+
+class PythonCodeCache:
+
+    def __init__(self, generator_version, cache_dir=None, max_size=256):
+        self.generator_version = generator_version
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+        self.base_dir = cache_dir
+        if self.base_dir is not None:
+            if self.base_dir.startswith('~'):
+                self.base_dir = os.path.expanduser(self.base_dir)
+            if not self.base_dir.endswith('/'):
+                self.base_dir += '/'
+            if not os.path.exists(self.base_dir):
+                os.makedirs(self.base_dir)
+
+    def get_key(self, xml):
+        return hashlib.sha1(self.generator_version + '\0' + str(xml)).hexdigest()
+
+    def get(self, xml):
+        """Cached code generated from xml, None if not cached."""
+        key = self.get_key(xml)
+        with self.lock:
+            code = self.entries.pop(key, None)
+            if code is None:
+                code = self.read_file(key)
+            if code is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.add_entry(key, code)
+            return code
+
+    def put(self, xml, code):
+        key = self.get_key(xml)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.add_entry(key, code)
+            self.write_file(key, code)
+
+    # Caller holds the lock
+    def add_entry(self, key, code):
+        self.entries[key] = code
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def read_file(self, key):
+        if self.base_dir is None:
+            return None
+        try:
+            with open(self.base_dir + key, 'r') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def write_file(self, key, code):
+        if self.base_dir is None:
+            return
+        try:
+            with open(self.base_dir + key + '.tmp', 'w') as f:
+                f.write(code)
+            os.rename(self.base_dir + key + '.tmp', self.base_dir + key)
+        except (IOError, OSError) as e:
+            rospy.logwarn("Could not write generated code in cache : " + str(e))
+
@@ -2,10 +2,13 @@
 
 import rospy
 import os
-import subprocess
+import json
+from threading import Lock
 
 from std_srvs.srv import SetBool
 
+from gauss_user_interface.sequences.sequence_code_worker_pool import SequenceCodeWorkerPool
+
 def create_directory(directory_path):
     if not os.path.exists(directory_path):
         os.makedirs(directory_path)
@@ -24,7 +27,12 @@ class SequenceCodeExecutor:
         self.blockly_dir = rospy.get_param("~sequence_code_to_execute_path")
         self.python_file = str(self.blockly_dir) + '/generated_code.py'
         create_directory(self.blockly_dir)
+        # Workers with Gauss API imported and a node registered, ready to execute code
+        self.worker_pool = SequenceCodeWorkerPool(rospy.get_param("~sequence_worker_pool_size", 1))
+        # Worker executing code, None when idle. Changed and terminated under
+        # process_lock : a worker back in the pool is never terminated
         self.process = None
+        self.process_lock = Lock()
         self.cancel_flag = False
 
     def execute_generated_code(self, python_code): 
@@ -32,15 +40,28 @@ class SequenceCodeExecutor:
         if self.is_executing_code():
             return { 'status': 400, 'message': "A generated code is already running" }
 
-        # 2. Save code in python file
+        # 2. Save code in python file (last executed code, shown in tracebacks)
         save_to_file(self.python_file, python_code)
 
-        # 3. Start executing code with process
-        self.process = subprocess.Popen(['python', str(self.python_file)],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        # 4. Wait for process to finish
-        output = self.process.communicate()
+        # 3. Send code to a worker process
+        worker = self.worker_pool.acquire()
+        with self.process_lock:
+            self.process = worker
+        result = None
+        try:
+            worker.stdin.write(json.dumps({ 'code': python_code, 'filename': self.python_file }) + '\n')
+            worker.stdin.flush()
+            # 4. Wait for worker to finish (no output if terminated)
+            output = worker.stdout.readline()
+            if output:
+                result = json.loads(output)
+        except IOError, e:
+            pass
+        finally:
+            # Worker is alive until next execution : no code is executing anymore
+            with self.process_lock:
+                self.process = None
+            self.worker_pool.release(worker, reuse=(result is not None and not result.get('worker_failed')))
 
         # 5. Check if cmd was canceled
         if self.cancel_flag:
@@ -48,32 +69,24 @@ class SequenceCodeExecutor:
             self.stop_robot_action()
             return { 'status': 300, 'message': 'Execution of Sequence has been canceled' }
 
-        # 6. Check error in output
-        error = output[1]
-
-        if error != '':
-            str_to_find = 'gauss_python_api.gauss_api.GaussException:'
-            exception_index = error.find(str_to_find)
-
-            # found GaussException -> Gauss error
-            if exception_index != -1:
-                exception_index = exception_index + len(str_to_find) + 1
-                return { 'status': 400, 'message': error[exception_index:].rstrip() }
-            # Any other exception 
-            else:
-                return { 'status': 400, 'message': 'Error while executing generated code : ' + str(error)}
-
-        # 7. Return OK if no error
-        return { 'status': 200, 'message': 'Successfully executed Sequence code' }
+        # 6. Check result of execution
+        if result is None:
+            return { 'status': 400, 'message': 'Sequence code worker stopped unexpectedly' }
+        return { 'status': result['status'], 'message': str(result['message']) }
 
     def cancel_execution(self):
-        if self.process is None:
-            return
-        if self.is_executing_code():
+        with self.process_lock:
+            if self.process is None or self.process.poll() is not None:
+                return
             rospy.logwarn("Stopping sequence code execution")
             self.cancel_flag = True
             self.process.terminate()
     
+    # !! Need to call this with rospy.on_shutdown !!
+    def shutdown(self):
+        self.cancel_execution()
+        self.worker_pool.shutdown()
+
     def stop_robot_action(self):
         # Stop current move command
         try:
@@ -84,8 +97,9 @@ class SequenceCodeExecutor:
             pass
 
     def is_executing_code(self):
-        if self.process is None:
+        process = self.process
+        if process is None:
             return False
-        return_code = self.process.poll()
+        return_code = process.poll()
         return (return_code is None)
 
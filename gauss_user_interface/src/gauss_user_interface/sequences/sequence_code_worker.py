@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import traceback
+
+"""
+Worker process executing generated sequence code, started in advance by
+SequenceCodeExecutor so that executions do not pay Python startup, imports,
+node registration and Gauss() setup.
+
+- Requests are read on stdin, one JSON per line : { "code", "filename" }
+- Results are written on stdout, one JSON per line : { "status", "message" },
+  with "worker_failed" if the worker could not be initialized (it then exits)
+- Output of generated code is discarded
+- Each code is executed in a fresh namespace, with Gauss API imported
+"""
+
+def init_namespace():
+    import rospy
+    namespace = {}
+    exec "from gauss_python_api.gauss_api import *" in namespace
+    # Several workers can be started at once : node names must be unique
+    rospy.init_node('gauss_generated_code_execution', anonymous=True, disable_signals=True)
+    namespace['Gauss']()
+    # Node is already registered, generated code header calls init_node again
+    rospy.init_node = lambda *args, **kwargs: None
+    return namespace
+
+def execute_code(namespace, code, filename):
+    GaussException = namespace['GaussException']
+    globals_dict = dict(namespace, __name__='__main__', __builtins__=__builtins__)
+    try:
+        exec compile(code, filename, 'exec') in globals_dict
+    except GaussException, e:
+        return { 'status': 400, 'message': str(e) }
+    except SystemExit, e:
+        if e.code not in (None, 0):
+            return { 'status': 400, 'message': 'Generated code exited with status ' + str(e.code) }
+    except Exception:
+        return { 'status': 400, 'message': 'Error while executing generated code : ' + traceback.format_exc() }
+    return { 'status': 200, 'message': 'Successfully executed Sequence code' }
+
+def main():
+    # Keep stdout for results, output of generated code goes to /dev/null
+    results = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+    try:
+        namespace = init_namespace()
+    except Exception:
+        namespace = None
+        init_error = traceback.format_exc()
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            return
+        if namespace is None:
+            # Answer with the error, a new worker will be started
+            result = { 'status': 400, 'message': 'Could not start sequence code worker : ' + init_error,
+                       'worker_failed': True }
+        else:
+            request = json.loads(line)
+            result = execute_code(namespace, request['code'].encode('utf-8'), request['filename'])
+        results.write(json.dumps(result) + '\n')
+        results.flush()
+        if namespace is None:
+            return
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import rospy
+import sys
+import subprocess
+from threading import Lock
+
+"""
+Pool of sequence code workers (see sequence_code_worker.py), started in
+advance and reused from one execution to the next.
+
+- A worker which has been terminated (execution canceled) or has died is
+  replaced by a new one, which initializes while the pool is not used
+- If all workers are busy, a worker is started for the execution
+"""
+
+WORKER_MODULE = 'gauss_user_interface.sequences.sequence_code_worker'
+
+def start_worker():
+    return subprocess.Popen([sys.executable, '-m', WORKER_MODULE],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=True)
+
+def stop_worker(worker):
+    if worker.poll() is None:
+        worker.terminate()
+        worker.wait()
+
+class SequenceCodeWorkerPool:
+
+    def __init__(self, size):
+        self.size = size
+        self.idle_workers = []
+        self.lock = Lock()
+        self.closed = False
+        with self.lock:
+            self.fill()
+
+    # Caller holds the lock
+    def fill(self):
+        self.idle_workers = [w for w in self.idle_workers if w.poll() is None]
+        while len(self.idle_workers) < self.size:
+            self.idle_workers.append(start_worker())
+            rospy.loginfo("Sequence code worker started, PID : " + str(self.idle_workers[-1].pid))
+
+    def acquire(self):
+        with self.lock:
+            while self.idle_workers:
+                worker = self.idle_workers.pop(0)
+                if worker.poll() is None:
+                    return worker
+            return start_worker()
+
+    # reuse : False if the worker must not execute code anymore
+    def release(self, worker, reuse=True):
+        with self.lock:
+            if not reuse or self.closed or worker.poll() is not None or len(self.idle_workers) >= self.size:
+                stop_worker(worker)
+            else:
+                self.idle_workers.append(worker)
+            if not self.closed:
+                self.fill()
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            for worker in self.idle_workers:
+                stop_worker(worker)
+            self.idle_workers = []
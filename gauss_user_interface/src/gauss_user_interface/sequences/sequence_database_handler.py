@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import rospy
+
+import os
+import sqlite3
+
+from gauss_user_interface.sequences.gauss_file_exception import GaussFileException
+from gauss_user_interface.sequences.sequence import Sequence
+from gauss_user_interface.sequences.sequence_file_handler import SequenceFileHandler
+
+"""
+Sequences stored in the SQLite database (gauss_commander.database), same
+interface as SequenceFileHandler. Sequences of sequences_dir are migrated
+once.
+"""
+
+class SequenceDatabaseHandler:
+
+    def __init__(self, database, sequences_dir=None):
+        self.database = database
+        self.lock = database.lock
+        with self.database.transaction() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS sequences ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, "
+                    "description TEXT NOT NULL, created INTEGER NOT NULL, updated INTEGER NOT NULL, "
+                    "blockly_xml TEXT NOT NULL, python_code TEXT NOT NULL)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS sequences_name ON sequences (name)")
+        if sequences_dir is not None:
+            self.database.migrate('sequences', lambda cursor: self.migrate_files(cursor, sequences_dir))
+
+    def migrate_files(self, cursor, sequences_dir):
+        if not os.path.isdir(os.path.expanduser(sequences_dir)):
+            return
+        fh = SequenceFileHandler(sequences_dir)
+        for seq_id in fh.get_all_sequence_ids():
+            try:
+                self.insert_sequence(cursor, fh.read_sequence(seq_id))
+            except GaussFileException as e:
+                rospy.logwarn("Could not migrate sequence " + str(seq_id) + " : " + str(e))
+        rospy.loginfo("Sequences of " + str(sequences_dir) + " migrated to " + self.database.path)
+
+    # Existing id (update or migration)
+    def insert_sequence(self, cursor, seq):
+        cursor.execute("INSERT OR REPLACE INTO sequences VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (seq.id, str(seq.name), str(seq.description), seq.created, seq.updated,
+                 str(seq.blockly_xml), str(seq.python_code)))
+
+    def read_sequence(self, id, read_info_only=False):
+        if read_info_only:
+            sql = "SELECT id, name, created, updated FROM sequences WHERE id = ?"
+        else:
+            sql = "SELECT id, name, created, updated, description, blockly_xml, python_code FROM sequences WHERE id = ?"
+        try:
+            rows = self.database.query(sql, (id,))
+        except sqlite3.Error as e:
+            raise GaussFileException("Failed to read sequence id : " + str(id) + str(e))
+        if not rows:
+            raise GaussFileException('Sequence for id ' + str(id) + ' does not exist')
+        row = rows[0]
+        seq = Sequence(id=row[0], name=row[1])
+        seq.created = row[2]
+        seq.updated = row[3]
+        if not read_info_only:
+            seq.description, seq.blockly_xml, seq.python_code = row[4:7]
+        return seq
+
+    def write_sequence(self, seq):
+        try:
+            with self.database.transaction() as cursor:
+                self.insert_sequence(cursor, seq)
+        except sqlite3.Error:
+            raise GaussFileException("Failed to write sequence id : " + str(seq.id))
+
+    # Id is chosen by the database (AUTOINCREMENT) in the insert transaction,
+    # sequences without a name are named after it
+    def create_sequence(self, seq):
+        try:
+            with self.database.transaction() as cursor:
+                cursor.execute("INSERT INTO sequences (name, description, created, updated, blockly_xml, python_code) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", (str(seq.name), str(seq.description), seq.created,
+                        seq.updated, str(seq.blockly_xml), str(seq.python_code)))
+                seq.id = cursor.lastrowid
+                if seq.name == "":
+                    seq.name = self.filename_from_sequence_id(seq.id)
+                    cursor.execute("UPDATE sequences SET name = ? WHERE id = ?", (seq.name, seq.id))
+        except sqlite3.Error as e:
+            raise GaussFileException("Failed to create sequence : " + str(e))
+        return seq.id
+
+    def get_all_sequence_ids(self):
+        return [row[0] for row in self.database.query("SELECT id FROM sequences ORDER BY id")]
+
+    def remove_sequence(self, seq_id):
+        try:
+            with self.database.transaction() as cursor:
+                cursor.execute("DELETE FROM sequences WHERE id = ?", (seq_id,))
+                removed = cursor.rowcount > 0
+        except sqlite3.Error as e:
+            raise GaussFileException("Could not remove sequence with id " 
+                    + str(seq_id) + " : " + str(e))
+        if not removed:
+            raise GaussFileException("Could not remove sequence with id " 
+                    + str(seq_id) + " : does not exist")
+
+    def filename_from_sequence_id(self, seq_id):
+        return 'sequence_' + str(seq_id)
+
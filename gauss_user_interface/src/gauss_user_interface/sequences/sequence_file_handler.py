@@ -4,11 +4,33 @@ import rospy
 
 import os
 import re
-from threading import Lock
+import json
+from threading import RLock
 
 from gauss_user_interface.sequences.gauss_file_exception import GaussFileException
 from gauss_user_interface.sequences.sequence import Sequence
 
+INDEX_FILENAME = '.sequence_index'
+
+HEADER_FIELDS = [('id', '---ID---', int), ('name', '---NAME---', str),
+                 ('created', '---CREATED---', int), ('updated', '---UPDATED---', int)]
+
+SECTIONS = [('description', '---DESCRIPTION---', '---END_OF_DESCRIPTION---', "Description"),
+            ('blockly_xml', '---BLOCKLY_XML---', '---END_OF_BLOCKLY_XML---', "Blockly XML"),
+            ('python_code', '---PYTHON_CODE---', '---END_OF_PYTHON_CODE---', "Python code")]
+
+"""
+Sequences are stored one per file. A persistent index (INDEX_FILENAME)
+keeps, for each file, header fields and (offset, size) of each section :
+- headers are read from the index, without opening sequence files
+- a section is read with one seek
+Index entries are checked against file mtime and size, a file changed
+by another program is indexed again.
+"""
+
+def to_str(value):
+    return value.encode('utf-8') if isinstance(value, unicode) else value
+
 class SequenceFileHandler:
 
     def __init__(self, sequences_dir):
@@ -20,91 +42,115 @@ class SequenceFileHandler:
         if not os.path.exists(self.base_dir):
             rospy.logwarn("Create sequences dir " + str(self.base_dir))
             os.makedirs(self.base_dir)
-        self.lock = Lock()
-    
+        self.lock = RLock()
+        # str(id) -> {'name', 'created', 'updated', 'mtime', 'size', 'sections': {name: [offset, size]}}
+        self.index = self.load_index()
+
+    def load_index(self):
+        try:
+            with open(self.base_dir + INDEX_FILENAME, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    # Caller holds the lock
+    def save_index(self):
+        try:
+            with open(self.base_dir + INDEX_FILENAME + '.tmp', 'w') as f:
+                json.dump(self.index, f)
+            os.rename(self.base_dir + INDEX_FILENAME + '.tmp', self.base_dir + INDEX_FILENAME)
+        except (IOError, OSError) as e:
+            rospy.logwarn("Could not save sequence index : " + str(e))
+
+    def index_file(self, filename):
+        """Header fields and sections (offset, size) of a sequence file."""
+        with open(self.base_dir + filename, 'rb') as f:
+            lines = f.read().splitlines(True)
+        entry = {'sections': {}}
+        offset = 0
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            offset += len(line)
+            i += 1
+            for name, marker, convert in HEADER_FIELDS:
+                if line.startswith(marker) and i < len(lines):
+                    entry[name] = convert(lines[i].rstrip())
+                    offset += len(lines[i])
+                    i += 1
+            for name, marker, end_marker, label in SECTIONS:
+                if line.startswith(marker):
+                    start = offset
+                    while i < len(lines) and not lines[i].startswith(end_marker):
+                        offset += len(lines[i])
+                        i += 1
+                    if i == len(lines):
+                        raise GaussFileException("Malformed file - " + label)
+                    entry['sections'][name] = [start, offset - start]
+        return entry
+
+    # Caller holds the lock
+    def get_index_entry(self, seq_id):
+        """Index entry of the sequence, indexed again if its file has changed."""
+        filename = self.filename_from_sequence_id(seq_id)
+        stat = os.stat(self.base_dir + filename)
+        entry = self.index.get(str(seq_id))
+        if entry is not None and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            return entry, False
+        entry = self.index_file(filename)
+        entry['mtime'] = stat.st_mtime
+        entry['size'] = stat.st_size
+        self.index[str(seq_id)] = entry
+        return entry, True
+
     def read_sequence(self, id, read_info_only=False):
         filename = self.filename_from_sequence_id(id)
         # Check if exists
-        if not self.does_file_exist(filename):
+        if not os.path.isfile(self.base_dir + filename):
             raise GaussFileException('Sequence for id ' + str(id) + ' does not exist')
         with self.lock:
             try:
-                with open(self.base_dir + filename, 'r') as f:
-                    seq = Sequence()
-                    for line in f:
-                        if line.startswith('---ID---'):
-                            seq.id = int(next(f).rstrip())
-                        if line.startswith('---NAME---'):
-                            seq.name = next(f).rstrip()
-                        if line.startswith('---CREATED---'):
-                            seq.created = int(next(f).rstrip())
-                        if line.startswith('---UPDATED---'):
-                            seq.updated = int(next(f).rstrip())
-                        if not read_info_only and line.startswith('---DESCRIPTION---'):
-                            read_next_line = True
-                            while read_next_line:
-                                try:
-                                    new_line = next(f)
-                                    if new_line.startswith('---END_OF_DESCRIPTION---'):
-                                        seq.description = seq.description.rstrip("\n")
-                                        read_next_line = False
-                                    else:
-                                        seq.description += new_line
-                                except StopIteration:
-                                    raise GaussFileException("Malformed file - Description")
-                        if not read_info_only and line.startswith('---BLOCKLY_XML---'):
-                            read_next_line = True
-                            while read_next_line:
-                                try:
-                                    new_line = next(f)
-                                    if new_line.startswith('---END_OF_BLOCKLY_XML---'):
-                                        seq.blockly_xml = seq.blockly_xml.rstrip("\n")
-                                        read_next_line = False
-                                    else:
-                                        seq.blockly_xml += new_line
-                                except StopIteration:
-                                    raise GaussFileException("Malformed file - Blockly XML")
-                        if not read_info_only and line.startswith('---PYTHON_CODE---'):
-                            read_next_line = True
-                            while read_next_line:
-                                try:
-                                    new_line = next(f)
-                                    if new_line.startswith('---END_OF_PYTHON_CODE---'):
-                                        seq.python_code = seq.python_code.rstrip("\n")
-                                        read_next_line = False
-                                    else:
-                                        seq.python_code += new_line
-                                except StopIteration:
-                                    raise GaussFileException("Malformed file - Python code")
-                    return seq
+                entry, changed = self.get_index_entry(id)
+                if changed:
+                    self.save_index()
+                seq = Sequence()
+                for name, marker, convert in HEADER_FIELDS:
+                    if name in entry:
+                        setattr(seq, name, to_str(entry[name]))
+                if not read_info_only:
+                    with open(self.base_dir + filename, 'rb') as f:
+                        for name, (offset, size) in entry['sections'].items():
+                            f.seek(offset)
+                            setattr(seq, name, f.read(size).rstrip("\n"))
+                return seq
             except Exception as e :
                 raise GaussFileException("Failed to open or read from file for sequence id : " + str(id) + str(e))
 
     def write_sequence(self, seq):
         filename = self.filename_from_sequence_id(seq.id)
+        entry = {'id': int(seq.id), 'name': str(seq.name).rstrip(), 'created': int(seq.created),
+                 'updated': int(seq.updated), 'sections': {}}
+        parts = ["---ID---\n", str(seq.id) + "\n",
+                 "---NAME---\n", str(seq.name) + "\n",
+                 "---CREATED---\n", str(seq.created) + "\n",
+                 "---UPDATED---\n", str(seq.updated) + "\n"]
+        offset = sum(len(part) for part in parts)
+        for name, marker, end_marker, label in SECTIONS:
+            value = str(getattr(seq, name)) + "\n"
+            parts += [marker + "\n", value, end_marker + "\n"]
+            entry['sections'][name] = [offset + len(marker) + 1, len(value)]
+            offset += len(marker) + 1 + len(value) + len(end_marker) + 1
         with self.lock:
             try:
                 with open(self.base_dir + filename, 'w') as f:
-                    f.write("---ID---\n")
-                    f.write(str(seq.id) + "\n")
-                    f.write("---NAME---\n")
-                    f.write(str(seq.name) + "\n")
-                    f.write("---CREATED---\n")
-                    f.write(str(seq.created) + "\n")
-                    f.write("---UPDATED---\n")
-                    f.write(str(seq.updated) + "\n")
-                    f.write("---DESCRIPTION---\n")
-                    f.write(str(seq.description) + "\n")
-                    f.write("---END_OF_DESCRIPTION---\n")
-                    f.write("---BLOCKLY_XML---\n")
-                    f.write(str(seq.blockly_xml) + "\n")
-                    f.write("---END_OF_BLOCKLY_XML---\n")
-                    f.write("---PYTHON_CODE---\n")
-                    f.write(str(seq.python_code) + "\n")
-                    f.write("---END_OF_PYTHON_CODE---\n")
+                    f.write(''.join(parts))
+                stat = os.stat(self.base_dir + filename)
             except Exception:
                 raise GaussFileException("Failed to write on file for sequence id : " + str(seq.id))
-
+            entry['mtime'] = stat.st_mtime
+            entry['size'] = stat.st_size
+            self.index[str(seq.id)] = entry
+            self.save_index()
 
     def get_all_filenames(self):
         filenames = []
@@ -116,6 +162,39 @@ class SequenceFileHandler:
         # Keep only correct filenames
         return filter(r.match, filenames)
 
+    # Index is brought up to date for all files, and saved once
+    def get_all_sequence_ids(self):
+        with self.lock:
+            ids = sorted(self.sequence_id_from_filename(f) for f in self.get_all_filenames())
+            changed = False
+            for seq_id in ids:
+                try:
+                    changed = self.get_index_entry(seq_id)[1] or changed
+                except (OSError, IOError, GaussFileException):
+                    pass
+            for key in self.index.keys():
+                if int(key) not in ids:
+                    del self.index[key]
+                    changed = True
+            if changed:
+                self.save_index()
+            return ids
+
+    # choose a non used, incremental id
+    def pick_new_id(self):
+        ids = self.get_all_sequence_ids()
+        return max(ids) + 1 if ids else 1
+
+    # Id is picked and written under the lock, sequences without a name are
+    # named after it
+    def create_sequence(self, seq):
+        with self.lock:
+            seq.id = self.pick_new_id()
+            if seq.name == "":
+                seq.name = self.filename_from_sequence_id(seq.id)
+            self.write_sequence(seq)
+        return seq.id
+
     def does_file_exist(self, filename):
         filenames = self.get_all_filenames()
         return filename in filenames
@@ -128,6 +207,8 @@ class SequenceFileHandler:
             except OSError as e:
                 raise GaussFileException("Could not remove sequence with id " 
                         + str(seq_id) + " : " + str(e))
+            if self.index.pop(str(seq_id), None) is not None:
+                self.save_index()
 
     def sequence_id_from_filename(self, filename):
         return int(filename.replace('sequence_', '')) 